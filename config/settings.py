@@ -58,11 +58,15 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.PrincipalMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "core.middleware.NoCacheForAuthMiddleware",
 ]
 
+# utilizatorul se incarca impreuna cu profilul de cetatean si primaria (request.citizen / request.municipality)
+AUTHENTICATION_BACKENDS = ["core.backends.PrincipalBackend"]
+
 ROOT_URLCONF = "config.urls"
 
 # -----------------------
@@ -127,6 +131,41 @@ STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# link-uri semnate (HMAC) cu expirare pentru documente generate si atasamente chat
+MEDIA_SIGNED_URL_TTL = int(os.getenv("MEDIA_SIGNED_URL_TTL", "300"))
+# link-urile din emailuri (copia conversatiei de chat) sunt deschise mai tarziu: 7 zile implicit
+MEDIA_SIGNED_EMAIL_URL_TTL = int(os.getenv("MEDIA_SIGNED_EMAIL_URL_TTL", str(7 * 24 * 3600)))
+# daca e setat (ex: "/protected-media/", location nginx marcat `internal`), Django doar valideaza
+# semnatura si raspunde cu X-Accel-Redirect; fisierul este livrat direct de nginx
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX", "")
+
+# pre-flight la salvarea template-urilor: peste WARN se afiseaza avertisment, peste LIMIT salvarea este refuzata
+TEMPLATE_PREFLIGHT_WARN = {
+    "render_ms": int(os.getenv("TEMPLATE_PREFLIGHT_WARN_MS", "2000")),
+    "pages": int(os.getenv("TEMPLATE_PREFLIGHT_WARN_PAGES", "10")),
+    "output_kb": int(os.getenv("TEMPLATE_PREFLIGHT_WARN_KB", "1024")),
+}
+TEMPLATE_PREFLIGHT_LIMIT = {
+    "render_ms": int(os.getenv("TEMPLATE_PREFLIGHT_LIMIT_MS", "10000")),
+    "pages": int(os.getenv("TEMPLATE_PREFLIGHT_LIMIT_PAGES", "50")),
+    "output_kb": int(os.getenv("TEMPLATE_PREFLIGHT_LIMIT_KB", "5120")),
+}
+# catalogul de campuri din editorul de template-uri; invalidat la modificari, TTL doar ca plasa de siguranta
+# (cu mai multe procese, foloseste un cache partajat ca invalidarea sa ajunga la toate)
+FIELD_CATALOG_CACHE_TTL = int(os.getenv("FIELD_CATALOG_CACHE_TTL", "3600"))
+
+# contoarele de necitite din meniu, per utilizator; invalidate la modificari, TTL scurt ca plasa de siguranta
+UNREAD_COUNTS_CACHE_TTL = int(os.getenv("UNREAD_COUNTS_CACHE_TTL", "30"))
+
+# importuri de cetateni in fundal: fisierele urcate se copiaza aici pana la finalizarea job-ului
+CITIZEN_IMPORT_SPOOL_DIR = Path(os.getenv("CITIZEN_IMPORT_SPOOL_DIR", BASE_DIR / "var" / "citizen_imports"))
+# "thread": job-ul porneste intr-un thread din procesul web; "command": doar `manage.py process_citizen_imports`
+CITIZEN_IMPORT_WORKER = os.getenv("CITIZEN_IMPORT_WORKER", "thread")
+# un job "running" fara heartbeat de atatea secunde este considerat intrerupt si se reia de la checkpoint
+CITIZEN_IMPORT_STALE_SECONDS = int(os.getenv("CITIZEN_IMPORT_STALE_SECONDS", "120"))
+
+# chei din Citizen.extra cu index pe expresie, create de `manage.py sync_citizen_extra_indexes`
+CITIZEN_EXTRA_INDEXED_KEYS = [k.strip() for k in os.getenv("CITIZEN_EXTRA_INDEXED_KEYS", "").split(",") if k.strip()]
 
 LOGIN_URL = "citizen_login"
 LOGIN_REDIRECT_URL = "citizen_dashboard"
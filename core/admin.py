@@ -1,9 +1,10 @@
 from django.contrib import admin
 from .models import (
     Citizen,
+    CitizenImportJob,
     DocumentTemplate,
+    DocumentTemplateRevision,
     ExtraFieldDefinition,
-    ExtraFieldValue,
     GeneratedDocument,
     WorkItem,
     DynamicFieldLibrary,
@@ -29,11 +30,36 @@ class DocumentTemplateAdmin(admin.ModelAdmin):
     list_display = ("name", "template_type", "output_type", "municipality_list", "created_at")
     search_fields = ("name", "slug", "municipalities__name")
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related("municipalities")
+
     @admin.display(description="Primarii")
     def municipality_list(self, obj):
-        names = obj.municipalities.values_list("name", flat=True)
+        # din prefetch: o singura interogare pentru toata pagina, nu una per rand
+        names = [m.name for m in obj.municipalities.all()]
         return ", ".join(names) if names else "Toate"
 
+    def save_model(self, request, obj, form, change):
+        # revizia noua apartine celui care a salvat, nu autorului initial
+        obj.save(revision_user=request.user)
+
+
+@admin.register(DocumentTemplateRevision)
+class DocumentTemplateRevisionAdmin(admin.ModelAdmin):
+    list_display = (
+        "template", "number", "content_hash", "source_size", "reduction",
+        "preflight_ms", "preflight_pages", "preflight_bytes", "created_at",
+    )
+    search_fields = ("template__name", "content_hash")
+    readonly_fields = (
+        "template", "number", "body_html", "dynamic_fields", "placeholders", "content_hash",
+        "source_size", "preflight_ms", "preflight_pages", "preflight_bytes", "created_by", "created_at",
+    )
+
+    @admin.display(description="Reducere HTML (%)")
+    def reduction(self, obj):
+        return obj.size_reduction
+
 
 @admin.register(ExtraFieldDefinition)
 class ExtraFieldDefinitionAdmin(admin.ModelAdmin):
@@ -41,12 +67,6 @@ class ExtraFieldDefinitionAdmin(admin.ModelAdmin):
     search_fields = ("name", "label")
 
 
-@admin.register(ExtraFieldValue)
-class ExtraFieldValueAdmin(admin.ModelAdmin):
-    list_display = ("citizen", "field_def", "value")
-    search_fields = ("citizen__full_name", "field_def__name")
-
-
 @admin.register(GeneratedDocument)
 class GeneratedDocumentAdmin(admin.ModelAdmin):
     list_display = ("template", "citizen", "output_type", "created_at")
@@ -113,3 +133,10 @@ class MessageAdmin(admin.ModelAdmin):
 class PasswordResetCodeAdmin(admin.ModelAdmin):
     list_display = ("user", "code", "used", "expires_at", "created_at")
     search_fields = ("user__username", "code")
+
+
+@admin.register(CitizenImportJob)
+class CitizenImportJobAdmin(admin.ModelAdmin):
+    list_display = ("file_name", "municipality", "status", "rows_done", "created_count", "updated_count", "error_count", "created_at")
+    list_filter = ("status",)
+    readonly_fields = ("spool_path", "worker_token", "heartbeat_at", "errors", "duplicates")
@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+# relatiile folosite aproape la fiecare cerere (vezi PrincipalMiddleware)
+PRINCIPAL_RELATED = ("citizen_profile__municipality", "municipality_admin__municipality")
+
+
+class PrincipalBackend(ModelBackend):
+    """ModelBackend care incarca utilizatorul impreuna cu profilul de cetatean si primaria, intr-o interogare."""
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related(*PRINCIPAL_RELATED).get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
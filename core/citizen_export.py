@@ -0,0 +1,89 @@
+import csv
+import json
+import zlib
+
+from .models import ExtraFieldDefinition
+
+CITIZEN_EXPORT_CHUNK_SIZE = 2000
+# randuri serializate inainte de a trimite o bucata catre client
+CITIZEN_EXPORT_FLUSH_ROWS = 500
+CITIZEN_EXPORT_COLUMNS = [
+    "full_name",
+    "identifier",
+    "nume",
+    "prenume",
+    "cnp",
+    "strada",
+    "nr",
+    "localitate",
+    "judet",
+    "telefon",
+    "email_recuperare",
+    "beneficiar",
+    "emitent",
+    "tip_document",
+    "numar_document_extern",
+    "data_emitere",
+]
+
+
+def _citizen_records(qs):
+    """(valori, extra) pentru fiecare cetatean, in ordinea id-urilor; extra-urile vin pe acelasi rand."""
+    rows = qs.order_by("id").values_list("id", *CITIZEN_EXPORT_COLUMNS, "extra")
+    for row in rows.iterator(chunk_size=CITIZEN_EXPORT_CHUNK_SIZE):
+        yield _export_values(row[1:-1]), row[-1] or {}
+
+
+def _export_values(row):
+    values = list(row)
+    values[-1] = values[-1].isoformat() if values[-1] else ""
+    return [v if v is not None else "" for v in values]
+
+
+def _batched(lines):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= CITIZEN_EXPORT_FLUSH_ROWS:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+class _Echo:
+    # csv.writer scrie aici si primim randul formatat inapoi
+    def write(self, value):
+        return value
+
+
+def iter_citizens_csv(qs):
+    extra_names = list(ExtraFieldDefinition.objects.order_by("name").values_list("name", flat=True))
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(CITIZEN_EXPORT_COLUMNS + extra_names)
+        for values, extra in _citizen_records(qs):
+            yield writer.writerow(values + [extra.get(name, "") for name in extra_names])
+
+    yield from _batched(lines())
+
+
+def iter_citizens_ndjson(qs):
+    def lines():
+        for values, extra in _citizen_records(qs):
+            record = dict(zip(CITIZEN_EXPORT_COLUMNS, values))
+            record["extra"] = extra
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    yield from _batched(lines())
+
+
+def gzip_stream(chunks):
+    """Comprima in flux (format gzip), fara sa tina tot fisierul in memorie."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
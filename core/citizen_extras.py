@@ -0,0 +1,83 @@
+import re
+
+from django.conf import settings
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+
+from .models import Citizen, ExtraFieldDefinition
+
+EXTRA_INDEX_PREFIX = "core_citizen_extra_"
+# cheia ajunge literal in SQL (expresia trebuie sa fie identica cu cea din index), deci fara ghilimele
+EXTRA_KEY_RE = re.compile(r"^[^\"'\\\x00-\x1f]{1,100}$")
+
+
+def _check_key(key: str):
+    if not EXTRA_KEY_RE.match(key or ""):
+        raise ValueError(f"Cheie extra invalida: {key!r}")
+
+
+def check_extra_keys(keys, known=None):
+    """
+    Cheile ajung in SQL: sunt acceptate doar numele din ExtraFieldDefinition, fara ghilimele.
+    `known` = numele definite, daca apelantul le are deja (altfel se citesc din baza).
+    """
+    keys = set(keys)
+    for key in keys:
+        _check_key(key)
+    if known is None:
+        known = ExtraFieldDefinition.objects.filter(name__in=keys).values_list("name", flat=True)
+    unknown = keys - set(known)
+    if unknown:
+        raise ValueError(f"Camp extra nedefinit: {', '.join(sorted(unknown))}")
+
+
+def extra_key_sql(key: str, column: str):
+    # apelantii verifica si ca cheia este definita (check_extra_keys); aici ramane doar formatul
+    _check_key(key)
+    if connection.vendor == "postgresql":
+        return f"({column} ->> '{key}')"
+    return f"json_extract({column}, '$.\"{key}\"')"
+
+
+def filter_by_extra(qs, key: str, value: str, known=None):
+    """Cetatenii cu extra[key] == value; interogarea poate folosi indexul pe expresie al cheii."""
+    check_extra_keys([key], known)
+    table = connection.ops.quote_name(Citizen._meta.db_table)
+    column = f"{table}.{connection.ops.quote_name('extra')}"
+    expr = RawSQL(extra_key_sql(key, column), [], output_field=models.TextField())
+    return qs.annotate(extra_match=expr).filter(extra_match=value)
+
+
+def extra_index_name(key: str):
+    slug = re.sub(r"[^a-z0-9]+", "_", key.lower()).strip("_")
+    return f"{EXTRA_INDEX_PREFIX}{slug}"[:60]
+
+
+def sync_extra_indexes(keys=None, dry_run=False):
+    """
+    Creeaza indexurile pe expresie pentru cheile cerute (implicit CITIZEN_EXTRA_INDEXED_KEYS) si le
+    sterge pe cele create anterior pentru chei care nu mai sunt in lista. Intoarce (create, sterse).
+    """
+    keys = settings.CITIZEN_EXTRA_INDEXED_KEYS if keys is None else keys
+    check_extra_keys(keys)
+    table = Citizen._meta.db_table
+    quote = connection.ops.quote_name
+    wanted = {
+        extra_index_name(key): f"CREATE INDEX {quote(extra_index_name(key))} ON {quote(table)} "
+        f"({extra_key_sql(key, quote('extra'))})"
+        for key in keys
+    }
+    with connection.cursor() as cursor:
+        existing = {
+            name
+            for name, info in connection.introspection.get_constraints(cursor, table).items()
+            if info["index"] and name.startswith(EXTRA_INDEX_PREFIX)
+        }
+        created = sorted(set(wanted) - existing)
+        dropped = sorted(existing - set(wanted))
+        if not dry_run:
+            for name in dropped:
+                cursor.execute(f"DROP INDEX {quote(name)}")
+            for name in created:
+                cursor.execute(wanted[name])
+    return created, dropped
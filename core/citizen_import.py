@@ -0,0 +1,339 @@
+import csv
+import io
+import itertools
+import os
+import secrets
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from .citizen_search import index_citizens
+from .models import CITIZEN_IMPORT_FIELDS, Citizen, CitizenImportJob, citizen_import_fingerprint
+
+CITIZEN_IMPORT_CHUNK_SIZE = 500
+# cate erori / CNP-uri duplicate pastram pe job pentru afisare (contorul le numara pe toate)
+JOB_LIST_LIMIT = 500
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return timezone.datetime.fromisoformat(value).date()
+    except Exception:
+        return None
+
+
+def _row_error(row: dict, values: dict):
+    if values["cnp"] and len(values["cnp"]) > Citizen._meta.get_field("cnp").max_length:
+        return f"CNP prea lung: {values['cnp']}"
+    if (row.get("data_emitere") or "").strip() and values["data_emitere"] is None:
+        return f"data_emitere invalida (YYYY-MM-DD): {row.get('data_emitere')}"
+    return None
+
+
+def iter_citizen_rows(file):
+    """
+    Parcurge CSV-ul rand cu rand (fara sa-l decodeze tot in memorie).
+    Intoarce (numar_linie, valori, eroare) cu valorile deja convertite pentru modelul Citizen;
+    randurile cu eroare nu se importa.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        for row in reader:
+            values = {field: (row.get(field) or "") for field in CITIZEN_IMPORT_FIELDS}
+            values["data_emitere"] = _parse_date(values["data_emitere"])
+            values["cnp"] = (row.get("cnp") or "").strip() or None
+            yield reader.line_num, values, _row_error(row, values)
+    finally:
+        # generator oprit dupa ce fisierul a fost inchis (ex: job intrerupt): nu mai avem ce detasa
+        if not text.closed:
+            text.detach()
+
+
+def iter_chunks(iterable, size: int):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def existing_cnps(rows, chunk_size: int = CITIZEN_IMPORT_CHUNK_SIZE):
+    """CNP-urile din fisier care exista deja, cu o interogare IN pe bucata."""
+    found = []
+    for chunk in iter_chunks(rows, chunk_size):
+        cnps = {values["cnp"] for _line, values, error in chunk if values["cnp"] and not error}
+        found.extend(sorted(Citizen.objects.filter(cnp__in=cnps).values_list("cnp", flat=True)))
+    return found
+
+
+def _apply_values(citizen: Citizen, values: dict, muni, fingerprint: str):
+    for field in CITIZEN_IMPORT_FIELDS:
+        setattr(citizen, field, values[field])
+    citizen.municipality = muni
+    # acelasi payload ca in Citizen.save(); extra-urile deja atasate raman in cache
+    citizen.data = {**(citizen.data or {}), **citizen.build_data_payload(include_extra=False)}
+    citizen.import_fingerprint = fingerprint
+
+
+def import_citizen_chunk(chunk: list, muni, mode: str, stats: dict, checkpoint=None, dry_run=False):
+    """
+    mode: "overwrite" rescrie existentii, "skip" ii omite, "sync" rescrie doar randurile al caror
+    fingerprint difera de cel salvat. Cu dry_run se numara doar, fara scriere.
+    """
+    # acelasi CNP de doua ori in bucata: ultimul rand castiga
+    by_cnp, without_cnp = {}, []
+    muni_id = muni.pk if muni else None
+    for line, values, error in chunk:
+        stats["rows"] += 1
+        if error:
+            stats["errors"].append({"line": line, "error": error})
+        elif values["cnp"]:
+            by_cnp.pop(values["cnp"], None)
+            by_cnp[values["cnp"]] = values
+        elif mode == "sync":
+            # fara CNP nu avem cu ce potrivi randul; la fiecare sincronizare ar aparea un cetatean nou
+            stats["errors"].append({"line": line, "error": "rand fara CNP, ignorat la sincronizare"})
+        else:
+            without_cnp.append(values)
+    fingerprints = {cnp: citizen_import_fingerprint(values, cnp, muni_id) for cnp, values in by_cnp.items()}
+
+    if mode == "sync":
+        # intai doar hash-urile; randurile complete se citesc numai pentru cele modificate
+        stored = dict(Citizen.objects.filter(cnp__in=by_cnp).values_list("cnp", "import_fingerprint"))
+        changed = [cnp for cnp, fp in stored.items() if fp != fingerprints[cnp]]
+        stats["unchanged"] += len(stored) - len(changed)
+        existing = {c.cnp: c for c in Citizen.objects.filter(cnp__in=changed)} if changed and not dry_run else {}
+        wanted = [cnp for cnp in by_cnp if cnp not in stored or cnp in existing or (dry_run and cnp in changed)]
+    else:
+        stored = set(Citizen.objects.filter(cnp__in=by_cnp).values_list("cnp", flat=True)) if dry_run else None
+        existing = {} if dry_run else {c.cnp: c for c in Citizen.objects.filter(cnp__in=by_cnp)}
+        wanted = list(by_cnp)
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    for cnp in wanted:
+        values = by_cnp[cnp]
+        if dry_run:
+            is_new = cnp not in stored
+            if not is_new and mode == "skip":
+                stats["skipped"] += 1
+            else:
+                stats["created" if is_new else "updated"] += 1
+            continue
+        citizen = existing.get(cnp)
+        if citizen is None:
+            citizen = Citizen(cnp=cnp)
+            to_create.append(citizen)
+        elif mode == "skip":
+            stats["skipped"] += 1
+            continue
+        else:
+            citizen.updated_at = now
+            to_update.append(citizen)
+        _apply_values(citizen, values, muni, fingerprints[cnp])
+    for values in without_cnp:
+        if dry_run:
+            stats["created"] += 1
+            continue
+        citizen = Citizen(cnp=None)
+        _apply_values(citizen, values, muni, citizen_import_fingerprint(values, None, muni_id))
+        to_create.append(citizen)
+
+    stats["created"] += len(to_create)
+    stats["updated"] += len(to_update)
+    with transaction.atomic():
+        Citizen.objects.bulk_create(to_create)
+        Citizen.objects.bulk_update(
+            to_update, CITIZEN_IMPORT_FIELDS + ["municipality", "data", "import_fingerprint", "updated_at"]
+        )
+        # bulk_create/bulk_update nu emit post_save: indexul de cautare se actualizeaza aici
+        index_citizens(to_create + to_update)
+        if checkpoint:
+            # in aceeasi tranzactie: dupa o intrerupere, bucata este fie scrisa si numarata, fie deloc
+            checkpoint(stats)
+
+
+def run_citizen_import(rows, muni=None, mode="overwrite", dry_run=False, chunk_size=CITIZEN_IMPORT_CHUNK_SIZE, progress=None):
+    """
+    Importa cetateni in bucati: o interogare IN pentru CNP-urile existente, apoi
+    bulk_create/bulk_update cu `data` precalculat, fiecare bucata in tranzactia ei.
+    `progress(stats)` este apelat dupa fiecare bucata.
+    """
+    stats = {"rows": 0, "created": 0, "updated": 0, "skipped": 0, "unchanged": 0, "errors": []}
+    started = time.perf_counter()
+    for chunk in iter_chunks(rows, chunk_size):
+        import_citizen_chunk(chunk, muni, mode, stats, checkpoint=progress, dry_run=dry_run)
+        stats["seconds"] = time.perf_counter() - started
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+# Job-uri in fundal ---------------------------------------------------------
+
+
+class _JobLost(Exception):
+    """Job-ul a fost anulat sau preluat de alt worker intre doua bucati."""
+
+
+def spool_upload(upload):
+    """Copiaza fisierul urcat pe disc, bucata cu bucata; intoarce calea."""
+    os.makedirs(settings.CITIZEN_IMPORT_SPOOL_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=settings.CITIZEN_IMPORT_SPOOL_DIR, prefix="citizens-", suffix=".csv", delete=False
+    ) as spool:
+        for chunk in upload.chunks():
+            spool.write(chunk)
+    return spool.name
+
+
+def create_import_job(upload, muni, user, mode="", dry_run=False):
+    return CitizenImportJob.objects.create(
+        municipality=muni,
+        created_by=user,
+        file_name=upload.name or "",
+        spool_path=spool_upload(upload),
+        mode=mode,
+        dry_run=dry_run,
+        status="queued" if mode else "pending",
+    )
+
+
+def _stale_before():
+    return timezone.now() - timedelta(seconds=settings.CITIZEN_IMPORT_STALE_SECONDS)
+
+
+def claimable_jobs():
+    """Job-uri noi sau intrerupte (fara heartbeat recent)."""
+    return CitizenImportJob.objects.filter(
+        models.Q(status__in=["pending", "queued"])
+        | models.Q(status="running", heartbeat_at__lt=_stale_before())
+        | models.Q(status="running", heartbeat_at__isnull=True)
+    )
+
+
+def claim_job(job_id):
+    token = secrets.token_hex(8)
+    claimed = claimable_jobs().filter(pk=job_id).update(
+        status="running", worker_token=token, heartbeat_at=timezone.now()
+    )
+    if not claimed:
+        return None
+    return CitizenImportJob.objects.select_related("municipality").get(pk=job_id)
+
+
+def _owned(job: CitizenImportJob):
+    return CitizenImportJob.objects.filter(pk=job.pk, worker_token=job.worker_token, status="running")
+
+
+def _scan_duplicates(job: CitizenImportJob):
+    with open(job.spool_path, "rb") as fh:
+        duplicates = existing_cnps(iter_citizen_rows(fh))
+    if not duplicates:
+        # nimic de confirmat: importul merge direct
+        _owned(job).update(mode="overwrite", heartbeat_at=timezone.now())
+        job.mode = "overwrite"
+        return True
+    _owned(job).update(
+        status="confirm",
+        duplicates=duplicates[:JOB_LIST_LIMIT],
+        duplicate_count=len(duplicates),
+        heartbeat_at=timezone.now(),
+    )
+    return False
+
+
+def _import_rows(job: CitizenImportJob):
+    errors = list(job.errors)
+    error_count = job.error_count
+
+    def checkpoint(stats):
+        nonlocal error_count
+        new_errors = stats["errors"]
+        error_count += len(new_errors)
+        errors.extend(new_errors[: max(0, JOB_LIST_LIMIT - len(errors))])
+        stats["errors"] = []
+        updated = _owned(job).update(
+            rows_done=job.rows_done + stats["rows"],
+            created_count=job.created_count + stats["created"],
+            updated_count=job.updated_count + stats["updated"],
+            skipped_count=job.skipped_count + stats["skipped"],
+            unchanged_count=job.unchanged_count + stats["unchanged"],
+            error_count=error_count,
+            errors=errors,
+            heartbeat_at=timezone.now(),
+        )
+        if not updated:
+            raise _JobLost()
+
+    with open(job.spool_path, "rb") as fh:
+        # reluare: randurile pana la checkpoint sunt deja scrise
+        rows = itertools.islice(iter_citizen_rows(fh), job.rows_done, None)
+        run_citizen_import(rows, muni=job.municipality, mode=job.mode, dry_run=job.dry_run, progress=checkpoint)
+
+
+def _remove_spool(job: CitizenImportJob):
+    try:
+        os.remove(job.spool_path)
+    except OSError:
+        pass
+
+
+def process_import_job(job_id):
+    """Ruleaza un job (verificare duplicate si/sau import) daca poate fi preluat. Intoarce job-ul sau None."""
+    job = claim_job(job_id)
+    if job is None:
+        return None
+    try:
+        if not job.mode and not _scan_duplicates(job):
+            return job
+        _import_rows(job)
+    except _JobLost:
+        return job
+    except Exception as exc:
+        _owned(job).update(status="failed", failure=str(exc), finished_at=timezone.now())
+        _remove_spool(job)
+        raise
+    _owned(job).update(status="done", finished_at=timezone.now())
+    _remove_spool(job)
+    return job
+
+
+def confirm_import_job(job: CitizenImportJob, mode: str):
+    updated = CitizenImportJob.objects.filter(pk=job.pk, status="confirm").update(mode=mode, status="queued")
+    return bool(updated)
+
+
+def cancel_import_job(job: CitizenImportJob):
+    updated = CitizenImportJob.objects.filter(pk=job.pk, status__in=["pending", "confirm", "queued", "running"]).update(
+        status="cancelled", finished_at=timezone.now()
+    )
+    if updated:
+        _remove_spool(job)
+    return bool(updated)
+
+
+def _run_in_thread(job_id):
+    try:
+        process_import_job(job_id)
+    finally:
+        connection.close()
+
+
+def start_import_job(job: CitizenImportJob):
+    """In modul "thread" porneste job-ul dupa commit; altfel il lasa pentru `process_citizen_imports`."""
+    if settings.CITIZEN_IMPORT_WORKER != "thread":
+        return
+    transaction.on_commit(
+        lambda: threading.Thread(target=_run_in_thread, args=(job.pk,), daemon=True).start()
+    )
@@ -0,0 +1,122 @@
+import re
+
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+
+from .models import Citizen
+
+CITIZEN_FTS_TABLE = "core_citizen_fts"
+# coloanele indexate; adresa este concatenata intr-o singura coloana
+CITIZEN_FTS_COLUMNS = ("full_name", "cnp", "identifier", "address")
+# ponderi bm25 in ordinea coloanelor: numele conteaza cel mai mult, adresa cel mai putin
+CITIZEN_FTS_WEIGHTS = (10.0, 5.0, 5.0, 1.0)
+CITIZEN_FTS_BATCH_SIZE = 500
+# coloanele din Citizen care ajung in index; save(update_fields=...) fara ele nu reindexeaza
+INDEXED_FIELDS = {"full_name", "cnp", "identifier", "strada", "nr", "localitate", "judet"}
+SEARCH_TERM_RE = re.compile(r"\w+")
+
+CREATE_FTS_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {CITIZEN_FTS_TABLE} USING fts5("
+    f"{', '.join(CITIZEN_FTS_COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+)
+# reconstruire dintr-o singura instructiune; spatiile in plus din adresa nu conteaza pentru tokenizer
+FILL_FTS_SQL = (
+    f"INSERT INTO {CITIZEN_FTS_TABLE} (rowid, {', '.join(CITIZEN_FTS_COLUMNS)}) "
+    "SELECT id, full_name, COALESCE(cnp, ''), identifier, strada || ' ' || nr || ' ' || localitate || ' ' || judet "
+    "FROM core_citizen"
+)
+
+
+def search_enabled():
+    # FTS5 exista doar pe SQLite; pe alte baze cautarea ramane pe icontains
+    return connection.vendor == "sqlite"
+
+
+def _address(citizen):
+    return " ".join(part for part in (citizen.strada, citizen.nr, citizen.localitate, citizen.judet) if part)
+
+
+def _batches(items, size=CITIZEN_FTS_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def remove_citizens(ids):
+    if not search_enabled():
+        return
+    ids = list(ids)
+    with connection.cursor() as cursor:
+        for batch in _batches(ids):
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(f"DELETE FROM {CITIZEN_FTS_TABLE} WHERE rowid IN ({placeholders})", batch)
+
+
+def index_citizens(citizens):
+    """Rescrie intrarile din index pentru cetatenii dati (dupa bulk_create/bulk_update, care nu emit semnale)."""
+    if not search_enabled():
+        return
+    citizens = [c for c in citizens if c.pk]
+    remove_citizens(c.pk for c in citizens)
+    rows = [(c.pk, c.full_name or "", c.cnp or "", c.identifier or "", _address(c)) for c in citizens]
+    with connection.cursor() as cursor:
+        for batch in _batches(rows):
+            cursor.executemany(
+                f"INSERT INTO {CITIZEN_FTS_TABLE} (rowid, {', '.join(CITIZEN_FTS_COLUMNS)}) VALUES (%s, %s, %s, %s, %s)",
+                batch,
+            )
+
+
+def rebuild_index():
+    """Reconstruieste tot indexul din tabela de cetateni; intoarce numarul de intrari."""
+    if not search_enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_FTS_SQL)
+        cursor.execute(f"DELETE FROM {CITIZEN_FTS_TABLE}")
+        cursor.execute(FILL_FTS_SQL)
+        total = cursor.rowcount
+        cursor.execute(f"INSERT INTO {CITIZEN_FTS_TABLE} ({CITIZEN_FTS_TABLE}) VALUES ('optimize')")
+    return total
+
+
+def match_expression(q: str):
+    """
+    Textul cautat -> interogare FTS5: fiecare cuvant ca prefix ("ion"* "pop"*), toate obligatorii.
+    Diacriticele sunt eliminate de tokenizer, la fel ca la indexare. None daca nu ramane niciun cuvant.
+    """
+    terms = SEARCH_TERM_RE.findall(q or "")
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_citizens(qs, q: str):
+    """
+    Filtreaza `qs` dupa textul cautat. Intoarce (qs, ordonat_dupa_relevanta); in modul FTS fiecare
+    rand are `search_rank` (bm25, mai mic = mai relevant).
+    """
+    if not search_enabled():
+        return (
+            qs.filter(
+                models.Q(full_name__icontains=q)
+                | models.Q(cnp__icontains=q)
+                | models.Q(identifier__icontains=q)
+                | models.Q(localitate__icontains=q)
+                | models.Q(strada__icontains=q)
+            ),
+            False,
+        )
+    match = match_expression(q)
+    if match is None:
+        # doar punctuatie: nimic de cautat, deci niciun rezultat (nu lista completa)
+        return qs.none(), False
+    table = connection.ops.quote_name(Citizen._meta.db_table)
+    weights = ", ".join(str(w) for w in CITIZEN_FTS_WEIGHTS)
+    rank = RawSQL(
+        f"SELECT bm25({CITIZEN_FTS_TABLE}, {weights}) FROM {CITIZEN_FTS_TABLE} "
+        f"WHERE {CITIZEN_FTS_TABLE} MATCH %s AND rowid = {table}.\"id\"",
+        [match],
+        output_field=models.FloatField(),
+    )
+    matching = RawSQL(f"SELECT rowid FROM {CITIZEN_FTS_TABLE} WHERE {CITIZEN_FTS_TABLE} MATCH %s", [match])
+    return qs.filter(pk__in=matching).annotate(search_rank=rank), True
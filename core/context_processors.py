@@ -1,27 +1,18 @@
-from .models import Notification, StaffNotification, Message, MunicipalityAdmin
+from django.utils.functional import SimpleLazyObject
+
+from .unread import user_counts
+
+EMPTY_COUNTS = {
+    "unread_citizen": 0,
+    "unread_staff": 0,
+    "unread_staff_leave": 0,
+    "unread_chat_staff": 0,
+}
+
 
 def unread_counts(request):
-    data = {
-        "unread_citizen": 0,
-        "unread_staff": 0,
-        "unread_staff_leave": 0,
-        "unread_chat_staff": 0,
-    }
     user = getattr(request, "user", None)
     if not user or not user.is_authenticated:
-        return {"unread_counts": data}
-    if hasattr(user, "citizen_profile"):
-        ctz = user.citizen_profile
-        data["unread_citizen"] = Notification.objects.filter(citizen=ctz, is_read=False).count()
-    if user.is_staff:
-        qs_staff = StaffNotification.objects.filter(user=user, is_read=False)
-        data["unread_staff"] = qs_staff.count()
-        data["unread_staff_leave"] = qs_staff.filter(work_item__isnull=True).count()
-        muni = None
-        if hasattr(user, "municipality_admin"):
-            muni = user.municipality_admin.municipality
-        chat_qs = Message.objects.filter(sender__is_staff=False, read_by_staff=False)
-        if muni:
-            chat_qs = chat_qs.filter(citizen__municipality=muni)
-        data["unread_chat_staff"] = chat_qs.count()
-    return {"unread_counts": data}
+        return {"unread_counts": EMPTY_COUNTS}
+    # calculat doar cand sablonul acceseaza contoarele, apoi servit din cache
+    return {"unread_counts": SimpleLazyObject(lambda: user_counts(user))}
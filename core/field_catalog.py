@@ -0,0 +1,78 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Citizen, DynamicFieldLibrary, ExtraFieldDefinition, Municipality
+
+FIELD_CATALOG_CACHE_KEY = "core.field_catalog"
+
+CITIZEN_EXCLUDE = {
+    "id",
+    "data",
+    "extra",
+    "import_fingerprint",
+    "user",
+    "created_at",
+    "updated_at",
+    "municipality",
+    "unread_chat",
+    "unread_staff_messages",
+    "unread_notifications",
+}
+MUNICIPALITY_EXCLUDE = {"id", "slug", "created_at", "templates", "citizens", "admins", "unread_chat"}
+MUNICIPALITY_CONTEXT_FIELDS = [
+    "municipality_name",
+    "municipality_cif",
+    "municipality_email",
+    "municipality_phone",
+    "municipality_mayor",
+    "municipality_address",
+    "municipality_header_logo",
+    "municipality_header_banner",
+]
+# campuri dinamice implicite (prefill)
+DEFAULT_DYNAMIC_FIELDS = [
+    {"name": "data", "placeholder": "{{ data }}", "label": "Data", "type": "date"},
+    {"name": "ora", "placeholder": "{{ ora }}", "label": "Ora", "type": "time"},
+    {"name": "data_si_ora", "placeholder": "{{ data_si_ora }}", "label": "Data si ora", "type": "datetime"},
+]
+
+
+def _field(name: str):
+    return {"name": name, "placeholder": "{{ " + name + " }}"}
+
+
+def _model_fields(model, exclude: set):
+    return [_field(f.name) for f in model._meta.get_fields() if getattr(f, "concrete", False) and f.name not in exclude]
+
+
+def build_field_catalog():
+    citizen_fields = _model_fields(Citizen, CITIZEN_EXCLUDE)
+    citizen_fields += [_field(name) for name in ExtraFieldDefinition.objects.values_list("name", flat=True)]
+    citizen_fields += DEFAULT_DYNAMIC_FIELDS
+    # includem si campuri brute din model pentru completare avansata
+    muni_fields = [_field(name) for name in MUNICIPALITY_CONTEXT_FIELDS]
+    muni_fields += _model_fields(Municipality, MUNICIPALITY_EXCLUDE)
+    library = list(DynamicFieldLibrary.objects.order_by("key").values("id", "key", "label", "length"))
+    catalog = {"citizen": citizen_fields, "muni": muni_fields, "dynamic_library": library}
+    payload = json.dumps(catalog, sort_keys=True).encode("utf-8")
+    catalog["version"] = hashlib.sha256(payload).hexdigest()[:16]
+    return catalog
+
+
+def field_catalog():
+    """
+    Campurile disponibile in editorul de template-uri, din cache. Versiunea este un hash al
+    continutului, deci se schimba doar cand se schimba campurile.
+    """
+    catalog = cache.get(FIELD_CATALOG_CACHE_KEY)
+    if catalog is None:
+        catalog = build_field_catalog()
+        cache.set(FIELD_CATALOG_CACHE_KEY, catalog, settings.FIELD_CATALOG_CACHE_TTL)
+    return catalog
+
+
+def invalidate_field_catalog():
+    cache.delete(FIELD_CATALOG_CACHE_KEY)
@@ -356,6 +356,16 @@ class ImportCitizensForm(forms.Form):
         label="Primarie (doar super admin)",
         widget=forms.Select(attrs={"class": "form-select"}),
     )
+    sync = forms.BooleanField(
+        required=False,
+        label="Sincronizare: scrie doar cetatenii noi si cei cu date modificate",
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        label="Simulare: doar raportul cu ce s-ar importa, fara modificari",
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop("user", None)
@@ -365,11 +375,11 @@ class ImportCitizensForm(forms.Form):
 
 
 class ImportTemplatesForm(forms.Form):
-    file = forms.FileField(label="Fisier CSV template-uri (UTF-8)")
+    file = forms.FileField(label="Fisier template-uri (CSV, JSONL sau ZIP)")
     municipality = forms.ModelChoiceField(
         queryset=Municipality.objects.all(),
         required=False,
-        label="Primarie (doar super admin; altfel se ia primaria curenta)",
+        label="Primarie (doar super admin; altfel primaria curenta, iar fara ea primariile din export JSONL/ZIP)",
         widget=forms.Select(attrs={"class": "form-select"}),
     )
 
@@ -0,0 +1,61 @@
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(raw: str, length: int):
+    if not raw:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(raw.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    return values
+
+
+def _seek(order, values, forward=True):
+    # (a, b, c) > (x, y, z) scris ca a>x OR (a=x AND b>y) OR (a=x AND b=y AND c>z), pe directia fiecarei coloane
+    clauses, equal = [], {}
+    for spec, value in zip(order, values):
+        field = spec.lstrip("-")
+        lookup = "lt" if spec.startswith("-") == forward else "gt"
+        clauses.append(Q(**equal, **{f"{field}__{lookup}": value}))
+        equal[field] = value
+    return reduce(or_, clauses)
+
+
+def keyset_page(qs, order, after=None, before=None, size=50):
+    """
+    O pagina ordonata dupa `order` (ultima coloana trebuie sa fie unica, ex. id), pornind dupa/inainte de
+    cursor. Costul nu depinde de cate randuri sunt inaintea paginii. Intoarce (randuri, cursor_inapoi,
+    cursor_inainte); cursoarele sunt None la capete.
+    """
+    fields = [spec.lstrip("-") for spec in order]
+    if before is not None:
+        reverse = [spec[1:] if spec.startswith("-") else f"-{spec}" for spec in order]
+        rows = list(qs.filter(_seek(order, before, forward=False)).order_by(*reverse)[: size + 1])
+        has_prev, has_next = len(rows) > size, True
+        rows = rows[:size][::-1]
+    else:
+        if after is not None:
+            qs = qs.filter(_seek(order, after))
+        rows = list(qs.order_by(*order)[: size + 1])
+        has_prev, has_next = after is not None, len(rows) > size
+        rows = rows[:size]
+    if not rows:
+        return rows, None, None
+
+    def cursor(row):
+        return encode_cursor([getattr(row, field) for field in fields])
+
+    return rows, cursor(rows[0]) if has_prev else None, cursor(rows[-1]) if has_next else None
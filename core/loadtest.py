@@ -0,0 +1,445 @@
+import http.cookiejar
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Citizen, MunicipalityAdmin, visible_templates
+from .synthetic import CHAT_LINES, FIRST_NAMES, LAST_NAMES, SYNTHETIC_DEFAULTS
+
+# Test de incarcare HTTP (manage.py load_test) pe un server pornit separat, pe datele din
+# generate_synthetic_data. Conturile si template-urile se citesc din baza o singura data, la pornire;
+# utilizatorii virtuali (cate un thread fiecare) fac doar cereri HTTP, cu sesiune si cookie CSRF
+# proprii, la fel ca browserul. Redirectionarile nu sunt urmate: fiecare cerere se masoara separat.
+
+LOAD_TEST_DEFAULTS = {
+    "base_url": "http://127.0.0.1:8000",
+    "citizens": 20,  # utilizatori virtuali cetateni
+    "staff": 2,  # utilizatori virtuali administratori de primarie
+    "duration": 60.0,  # secunde
+    "iterations": 0,  # iteratii per utilizator (0 = pana la expirarea duratei)
+    "ramp_up": 5.0,  # secunde in care pornesc toti utilizatorii
+    "think_time": 1.0,  # pauza medie intre cereri, in secunde
+    "keystrokes": 6,  # cereri de preview per document (cate una la fiecare tasta, fara debounce)
+    "timeout": 30.0,
+    "password": SYNTHETIC_DEFAULTS["password"],
+    "prefix": SYNTHETIC_DEFAULTS["prefix"],
+    "seed": 0,
+}
+PREVIEW_TEXT = "certificat de urbanism"
+PERCENTILES = (50, 90, 95, 99)
+
+
+class _KeepResponses(urllib.request.HTTPErrorProcessor):
+    # 3xx/4xx/5xx se intorc ca raspunsuri obisnuite: fara redirectionari urmate si fara HTTPError
+    def http_response(self, request, response):
+        return response
+
+    https_response = http_response
+
+
+def percentile(sorted_values, pct):
+    """Percentila prin rangul cel mai apropiat, pe o lista deja sortata."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class LoadTestStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def record(self, endpoint, seconds, status, ok):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds * 1000)
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + (0 if ok else 1)
+            codes = self.statuses.setdefault(endpoint, {})
+            codes[status] = codes.get(status, 0) + 1
+
+    def rows(self):
+        """Cate un rand per endpoint: numar de cereri, erori, procent de erori si latente (ms)."""
+        rows = []
+        with self.lock:
+            for endpoint in sorted(self.latencies):
+                values = sorted(self.latencies[endpoint])
+                count, errors = len(values), self.errors[endpoint]
+                rows.append(
+                    {
+                        "endpoint": endpoint,
+                        "requests": count,
+                        "errors": errors,
+                        "error_rate": 100.0 * errors / count,
+                        **{f"p{pct}": percentile(values, pct) for pct in PERCENTILES},
+                        "max": values[-1],
+                        "mean": sum(values) / count,
+                        "statuses": dict(sorted(self.statuses[endpoint].items())),
+                    }
+                )
+        return rows
+
+    def totals(self):
+        with self.lock:
+            requests = sum(len(v) for v in self.latencies.values())
+            return requests, sum(self.errors.values())
+
+
+class HttpSession:
+    """Un client cu cookie-uri proprii (sesiune + csrftoken); fiecare cerere este inregistrata in `stats`."""
+
+    def __init__(self, base_url, stats, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.stats = stats
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _KeepResponses())
+
+    def csrf_token(self):
+        return next((c.value for c in self.cookies if c.name == "csrftoken"), "")
+
+    def request(self, endpoint, path, data=None, expect=(200,), redirect_to=None):
+        """
+        GET (sau POST cu `data`) pe `path`. Cererea este eroare daca statusul nu este in `expect` sau daca
+        o redirectionare nu duce spre `redirect_to` (de ex. CSRF/sesiune expirata -> pagina de login).
+        Intoarce (ok, status, corp).
+        """
+        method = "POST" if data is not None else "GET"
+        headers = {"User-Agent": "citizen-doc-load-test"}
+        body = None
+        if data is not None:
+            body = urllib.parse.urlencode(data, doseq=True).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers["X-CSRFToken"] = self.csrf_token()
+            headers["Referer"] = self.base_url + path
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                content = response.read()
+                status = response.status
+                location = response.headers.get("Location", "")
+        except (urllib.error.URLError, OSError):
+            # conexiune refuzata, timeout: eroare cu status 0
+            content, status, location = b"", 0, ""
+        elapsed = time.perf_counter() - started
+        ok = status in expect
+        if ok and redirect_to and 300 <= status < 400:
+            ok = urllib.parse.urlsplit(location).path == redirect_to
+        self.stats.record(f"{method} {endpoint}", elapsed, status, ok)
+        return ok, status, content
+
+
+def _dynamic_values(fields, typed=None):
+    """Valori pentru campurile dinamice ale template-ului; primul camp text primeste textul `typed`."""
+    values, text_filled = {}, False
+    for field in fields:
+        key = field.get("key")
+        if not key:
+            continue
+        if field.get("type") == "date":
+            values[key] = timezone.now().date().isoformat()
+        elif field.get("type") == "select":
+            options = [o.strip() for o in (field.get("options") or "").split(",") if o.strip()]
+            values[key] = options[0] if options else ""
+        elif typed is not None and not text_filled:
+            values[key], text_filled = typed, True
+        else:
+            values[key] = PREVIEW_TEXT
+    return values
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, runner, account, index):
+        super().__init__(daemon=True)
+        self.runner = runner
+        self.account = account
+        self.options = runner.options
+        self.rng = random.Random(f"{self.options.seed}-{index}")
+        self.start_delay = self.options.ramp_up * index / max(1, runner.users_total)
+        self.http = HttpSession(self.options.base_url, runner.stats, self.options.timeout)
+        self.logged_in = None  # None = nu a apucat sa porneasca (oprire inainte de ramp-up)
+
+    def think(self):
+        if self.options.think_time > 0:
+            time.sleep(self.rng.uniform(0, 2 * self.options.think_time))
+
+    def running(self, iteration):
+        if self.runner.stop.is_set() or time.monotonic() >= self.runner.deadline:
+            return False
+        return not self.options.iterations or iteration < self.options.iterations
+
+    def run(self):
+        if self.runner.stop.wait(self.start_delay):
+            return
+        self.logged_in = self.login()
+        if not self.logged_in:
+            return
+        iteration = 0
+        while self.running(iteration):
+            self.scenario()
+            iteration += 1
+
+    def preview(self, citizen_id, template):
+        # previzualizarea se cere la fiecare tasta din primul camp text, ca in formularul de generare
+        for n in range(1, self.options.keystrokes + 1):
+            typed = PREVIEW_TEXT[: max(1, len(PREVIEW_TEXT) * n // self.options.keystrokes)]
+            data = {"citizen_id": citizen_id, "template_slug": template["slug"]}
+            data.update(_dynamic_values(template["dynamic_fields"], typed))
+            self.http.request("generate_preview", self.runner.urls["generate_preview"], data)
+            # tastarea este mai rapida decat pauza dintre pagini
+            time.sleep(self.rng.uniform(0, self.options.think_time / 5))
+
+
+class CitizenUser(VirtualUser):
+    def login(self):
+        url = self.runner.urls["citizen_login"]
+        self.http.request("citizen_login", url)
+        ok, _, _ = self.http.request(
+            "citizen_login",
+            url,
+            {"cnp": self.account.username, "password": self.options.password},
+            expect=(302,),
+            redirect_to=self.runner.urls["citizen_dashboard"],
+        )
+        return ok
+
+    def scenario(self):
+        urls, account = self.runner.urls, self.account
+        self.http.request("citizen_dashboard", urls["citizen_dashboard"])
+        self.think()
+
+        if account.templates:
+            template = self.rng.choice(account.templates)
+            self.http.request("citizen_request_document", urls["citizen_request_document"])
+            self.think()
+            self.preview(account.citizen_id, template)
+            self.http.request(
+                "generate_document",
+                reverse("generate_document", args=[account.citizen_id, template["slug"]]),
+                _dynamic_values(template["dynamic_fields"]),
+            )
+            self.think()
+
+        self.http.request("citizen_chat", urls["citizen_chat"])
+        self.think()
+        self.http.request("citizen_chat", urls["citizen_chat"], {"text": self.rng.choice(CHAT_LINES)}, expect=(302,))
+        self.think()
+
+        self.http.request("leave_citizen", urls["leave_citizen"])
+        self.think()
+        # cererile care se suprapun sau depasesc zilele disponibile sunt respinse tot cu 302 + mesaj
+        start = timezone.now().date() + timedelta(days=self.rng.randint(7, 300))
+        end = start + timedelta(days=self.rng.randint(0, 4))
+        self.http.request(
+            "leave_citizen",
+            urls["leave_citizen"],
+            {"action": "create", "start_date": start.isoformat(), "end_date": end.isoformat(), "note": "test"},
+            expect=(302,),
+        )
+        self.think()
+
+
+class StaffUser(VirtualUser):
+    def login(self):
+        url = self.runner.urls["staff_login"]
+        self.http.request("staff_login", url)
+        ok, _, _ = self.http.request(
+            "staff_login",
+            url,
+            {"username": self.account.username, "password": self.options.password},
+            expect=(302,),
+            redirect_to=self.runner.urls["admin_account"],
+        )
+        return ok
+
+    def scenario(self):
+        urls, account = self.runner.urls, self.account
+        term = self.rng.choice(LAST_NAMES + FIRST_NAMES).lower()
+        self.http.request("citizen_list", f"{urls['citizen_list']}?{urllib.parse.urlencode({'q': term})}")
+        self.think()
+        self.http.request("citizen_list", urls["citizen_list"])
+        self.think()
+
+        self.http.request("generate_select", urls["generate_select"])
+        # typeahead-ul de cetateni: o cerere la fiecare tasta, de la 2 caractere
+        for n in range(2, min(len(term), 5) + 1):
+            self.http.request("citizen_lookup", f"{urls['citizen_lookup']}?{urllib.parse.urlencode({'q': term[:n]})}")
+        self.think()
+        if account.citizen_ids and account.templates:
+            self.preview(self.rng.choice(account.citizen_ids), self.rng.choice(account.templates))
+            self.think()
+
+        if account.citizen_ids:
+            chat_url = reverse("admin_chat", args=[self.rng.choice(account.citizen_ids)])
+            self.http.request("admin_chat", chat_url)
+            self.think()
+            self.http.request("admin_chat", chat_url, {"text": self.rng.choice(CHAT_LINES)}, expect=(302,))
+            self.think()
+
+        self.http.request("work_item_list", urls["work_item_list"])
+        self.think()
+        self.http.request("leave_dashboard", urls["leave_dashboard"])
+        self.think()
+
+
+def _generate_templates(muni):
+    return list(
+        visible_templates(muni)
+        .filter(template_type="generate")
+        .order_by("slug")
+        .values("slug", "dynamic_fields")
+    )
+
+
+def load_accounts(prefix, citizens, staff, rng, sample_size=200):
+    """
+    Conturile folosite in test, din primariile generate cu `prefix`: cetateni cu cont si profil validat,
+    administratori de primarie, plus template-urile de generare vizibile fiecarei primarii.
+    """
+    templates = {}
+
+    def templates_for(muni):
+        if muni.pk not in templates:
+            templates[muni.pk] = _generate_templates(muni)
+        return templates[muni.pk]
+
+    citizen_ids = list(
+        Citizen.objects.filter(municipality__name__startswith=f"{prefix} ", user__isnull=False)
+        .exclude(profile_status="pending_validation")
+        .values_list("pk", flat=True)
+    )
+    citizen_accounts = []
+    chosen = rng.sample(citizen_ids, min(citizens, len(citizen_ids)))
+    for citizen in Citizen.objects.filter(pk__in=chosen).select_related("user", "municipality").order_by("pk"):
+        citizen_accounts.append(
+            SimpleNamespace(
+                username=citizen.user.username,
+                citizen_id=citizen.pk,
+                templates=templates_for(citizen.municipality),
+            )
+        )
+
+    staff_accounts = []
+    admins = list(
+        MunicipalityAdmin.objects.filter(municipality__name__startswith=f"{prefix} ", user__is_active=True)
+        .select_related("user", "municipality")
+        .order_by("pk")
+    )
+    for admin in rng.sample(admins, min(staff, len(admins))):
+        own = list(Citizen.objects.filter(municipality=admin.municipality).values_list("pk", flat=True))
+        staff_accounts.append(
+            SimpleNamespace(
+                username=admin.user.username,
+                citizen_ids=rng.sample(own, min(sample_size, len(own))),
+                templates=templates_for(admin.municipality),
+            )
+        )
+    return citizen_accounts, staff_accounts
+
+
+def external_service_warnings(base_url):
+    """
+    Setarile care ar trimite traficul testului in afara masinii: emailurile de notificare (SMTP) si
+    antetele din PDF, descarcate de xhtml2pdf de la SITE_BASE_URL. Serverul testat citeste aceleasi
+    variabile de mediu (.env), deci avertismentele se aplica si lui.
+    """
+    warnings = []
+    if "smtp" in settings.EMAIL_BACKEND.lower():
+        warnings.append(
+            "EMAIL_BACKEND este SMTP: notificarile create de test pleaca pe email. Porneste serverul cu "
+            "EMAIL_BACKEND=django.core.mail.backends.locmem.EmailBackend."
+        )
+    site = urllib.parse.urlsplit(settings.SITE_BASE_URL)
+    if site.netloc and site.netloc != urllib.parse.urlsplit(base_url).netloc:
+        warnings.append(
+            f"SITE_BASE_URL={settings.SITE_BASE_URL}: antetele documentelor se descarca de acolo. Porneste "
+            f"serverul cu SITE_BASE_URL={base_url.rstrip('/')}."
+        )
+    return warnings
+
+
+class LoadTestRunner:
+    def __init__(self, log=None, **options):
+        unknown = set(options) - set(LOAD_TEST_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Optiuni necunoscute: {', '.join(sorted(unknown))}")
+        self.options = SimpleNamespace(**{**LOAD_TEST_DEFAULTS, **options})
+        self.log = log or (lambda message: None)
+        self.stats = LoadTestStats()
+        self.stop = threading.Event()
+        self.users_total = 0
+        self.deadline = 0.0
+        self.urls = {
+            name: reverse(name)
+            for name in (
+                "citizen_login",
+                "citizen_dashboard",
+                "citizen_request_document",
+                "citizen_chat",
+                "leave_citizen",
+                "staff_login",
+                "admin_account",
+                "citizen_list",
+                "citizen_lookup",
+                "generate_select",
+                "generate_preview",
+                "work_item_list",
+                "leave_dashboard",
+            )
+        }
+
+    def run(self):
+        opts = self.options
+        citizens, staff = load_accounts(opts.prefix, opts.citizens, opts.staff, random.Random(opts.seed))
+        if not citizens and not staff:
+            raise ValueError(
+                f"Nu exista conturi in primariile '{opts.prefix} ...'; ruleaza intai generate_synthetic_data."
+            )
+        self.users_total = len(citizens) + len(staff)
+        users = [CitizenUser(self, account, n) for n, account in enumerate(citizens)]
+        users += [StaffUser(self, account, len(citizens) + n) for n, account in enumerate(staff)]
+        self.log(f"{len(citizens)} cetateni si {len(staff)} administratori, {opts.duration:g}s pe {opts.base_url}")
+
+        started = time.monotonic()
+        self.deadline = started + opts.ramp_up + opts.duration
+        for user in users:
+            user.start()
+        try:
+            for user in users:
+                # join cu timeout, ca Ctrl+C sa fie prins in thread-ul principal
+                while user.is_alive():
+                    user.join(0.5)
+        except KeyboardInterrupt:
+            self.log("Oprire ceruta; se asteapta cererile in curs...")
+            self.stop.set()
+            for user in users:
+                user.join(opts.timeout)
+        elapsed = time.monotonic() - started
+        requests, errors = self.stats.totals()
+        return SimpleNamespace(
+            rows=self.stats.rows(),
+            requests=requests,
+            errors=errors,
+            error_rate=100.0 * errors / requests if requests else 0.0,
+            seconds=elapsed,
+            throughput=requests / elapsed if elapsed else 0.0,
+            citizens=len(citizens),
+            staff=len(staff),
+            failed_logins=sum(1 for user in users if user.logged_in is False),
+        )
+
+
+def run_load_test(log=None, **options):
+    """Ruleaza testul (optiuni: LOAD_TEST_DEFAULTS); intoarce randurile per endpoint si totalurile."""
+    return LoadTestRunner(log=log, **options).run()
@@ -0,0 +1,169 @@
+import re
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Citizen, GeneratedDocument, LeaveRequest, Message, Notification, StaffNotification, WorkItem
+
+# Interogarile fierbinti din view-uri, construite la fel ca acolo. Valorile (id-uri, date) nu conteaza
+# pentru plan. UPDATE, exists() si aggregate() renunta la ordonarea implicita din Meta, de aici
+# order_by() gol pe acele interogari. Fiecare intrare: (nume, indexul asteptat pe tabela interogata,
+# QuerySet); None = orice index, cat timp tabela nu este citita integral.
+HOT_QUERIES = [
+    (
+        "chat: mesajele conversatiei active",
+        "msg_thread_created_idx",
+        lambda: Message.objects.filter(citizen_id=1, chat_thread_id=1).order_by("-created_at"),
+    ),
+    (
+        "chat: necitite de staff",
+        "msg_thread_created_idx",
+        lambda: Message.objects.filter(
+            citizen_id=1, chat_thread_id=1, sender__is_staff=False, read_by_staff=False
+        ).order_by(),
+    ),
+    (
+        "chat: necitite de cetatean",
+        "msg_thread_created_idx",
+        lambda: Message.objects.filter(
+            citizen_id=1, chat_thread_id=1, sender__is_staff=True, read_by_citizen=False
+        ).order_by(),
+    ),
+    (
+        "reconciliere: mesaje necitite de staff",
+        "msg_unread_staff_idx",
+        lambda: Message.objects.filter(citizen_id=1, read_by_staff=False).order_by(),
+    ),
+    (
+        "dashboard: notificari recente",
+        "notif_citizen_created_idx",
+        lambda: Notification.objects.filter(citizen_id=1)[:20],
+    ),
+    (
+        "notificari necitite",
+        "notif_citizen_unread_idx",
+        lambda: Notification.objects.filter(citizen_id=1, is_read=False).order_by(),
+    ),
+    (
+        "notificari staff necitite (lucrare)",
+        "staffnotif_user_unread_idx",
+        lambda: StaffNotification.objects.filter(user_id=1, is_read=False, work_item_id=1).order_by(),
+    ),
+    (
+        "notificari staff necitite (concedii)",
+        "staffnotif_user_unread_idx",
+        lambda: StaffNotification.objects.filter(user_id=1, is_read=False, work_item__isnull=True).order_by(),
+    ),
+    (
+        "dashboard: documente recente",
+        "gendoc_citizen_created_idx",
+        lambda: GeneratedDocument.objects.filter(citizen_id=1).order_by("-created_at")[:20],
+    ),
+    (
+        "cont primarie: documente recente",
+        None,
+        lambda: GeneratedDocument.objects.filter(citizen__municipality_id=1).order_by("-created_at")[:5],
+    ),
+    (
+        "lucrari: primarie + status",
+        "workitem_muni_status_idx",
+        lambda: WorkItem.objects.filter(municipality_id=1, status="pending").order_by("-created_at"),
+    ),
+    (
+        "lucrari: primarie",
+        "workitem_muni_created_idx",
+        lambda: WorkItem.objects.filter(municipality_id=1).order_by("-created_at"),
+    ),
+    (
+        "dashboard: lucrari recente",
+        "workitem_citizen_created_idx",
+        lambda: WorkItem.objects.filter(citizen_id=1).order_by("-created_at")[:20],
+    ),
+    (
+        "concedii: suprapuneri",
+        "leave_citizen_status_idx",
+        lambda: LeaveRequest.objects.filter(
+            citizen_id=1,
+            status__in=["pending", "approved"],
+            start_date__lte=date(2026, 12, 31),
+            end_date__gte=date(2026, 1, 1),
+        ).order_by(),
+    ),
+    (
+        "concedii: zile folosite pe an",
+        "leave_citizen_status_idx",
+        lambda: LeaveRequest.objects.filter(citizen_id=1, status="approved", start_date__year=2026).order_by(),
+    ),
+    (
+        "concedii: istoric",
+        "leave_citizen_created_idx",
+        lambda: LeaveRequest.objects.filter(citizen_id=1).order_by("-created_at")[:50],
+    ),
+    (
+        "cetateni: pagina din primarie",
+        "citizen_muni_name_idx",
+        lambda: Citizen.objects.filter(municipality_id=1).order_by("full_name", "id")[:51],
+    ),
+    (
+        "cetateni: total mesaje necitite",
+        "citizen_unread_chat_idx",
+        lambda: Citizen.objects.filter(unread_chat__gt=0).values("unread_chat"),
+    ),
+]
+
+
+def _sqlite_scan(plan, table):
+    # "SCAN core_message" (fara "USING INDEX") inseamna citirea intregii tabele
+    return re.search(rf"\bSCAN {re.escape(table)}\b(?! USING (COVERING )?INDEX)", plan) is not None
+
+
+def _postgres_scan(plan, table):
+    return re.search(rf"Seq Scan on {re.escape(table)}\b", plan) is not None
+
+
+def _indexes_used(plan):
+    return set(re.findall(r"(?:USING (?:COVERING )?INDEX|Index (?:Only )?Scan(?: Backward)? using) (\w+)", plan))
+
+
+class Command(BaseCommand):
+    help = (
+        "Ruleaza EXPLAIN pe interogarile fierbinti din view-uri si verifica faptul ca fiecare citeste "
+        "tabela principala prin indexul compus/partial gandit pentru ea, nu printr-o scanare completa."
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor == "sqlite":
+            is_scan = _sqlite_scan
+        elif connection.vendor == "postgresql":
+            is_scan = _postgres_scan
+        else:
+            raise CommandError(f"Baza de date {connection.vendor} nu este suportata.")
+
+        failed = []
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                # pe tabele mici planificatorul prefera oricum Seq Scan; verificam ca indexul este utilizabil
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, expected, build in HOT_QUERIES:
+                qs = build()
+                plan = qs.explain()
+                used = _indexes_used(plan)
+                if is_scan(plan, qs.model._meta.db_table):
+                    failed.append(name)
+                    self.stdout.write(self.style.ERROR(f"SCAN  {name} ({qs.model._meta.db_table})"))
+                elif expected and expected not in used:
+                    # indexul lipseste (migrarea nu a rulat) sau planificatorul a ales altul
+                    failed.append(name)
+                    self.stdout.write(self.style.ERROR(f"INDEX {name}: {', '.join(sorted(used))} in loc de {expected}"))
+                else:
+                    self.stdout.write(f"OK    {name}: {', '.join(sorted(used))}")
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"      {plan}".replace("\n", "\n      "))
+
+        if failed:
+            raise CommandError(f"{len(failed)} interogari nu folosesc indexul asteptat: {', '.join(failed)}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Toate cele {len(HOT_QUERIES)} interogari folosesc indexurile asteptate.")
+        )
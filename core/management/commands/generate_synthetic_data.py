@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.synthetic import SYNTHETIC_DEFAULTS, generate_synthetic_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Genereaza date sintetice pentru teste de incarcare: primarii cu antet, cetateni cu CNP valid si "
+        "campuri extra, template-uri, conversatii, concedii, lucrari si documente (bulk insert)."
+    )
+
+    def add_arguments(self, parser):
+        d = SYNTHETIC_DEFAULTS
+        parser.add_argument("--municipalities", type=int, default=d["municipalities"], help="Numar de primarii noi.")
+        parser.add_argument("--citizens", type=int, default=d["citizens"], help="Cetateni per primarie.")
+        parser.add_argument("--admins", type=int, default=d["admins"], help="Administratori per primarie.")
+        parser.add_argument(
+            "--user-ratio", type=float, default=d["user_ratio"], help="Ce parte din cetateni primeste cont (0-1)."
+        )
+        parser.add_argument("--templates", type=int, default=d["templates"], help="Template-uri noi.")
+        parser.add_argument(
+            "--extra-fields", default=",".join(d["extra_fields"]), help="Chei de campuri extra, separate prin virgula."
+        )
+        parser.add_argument("--threads", type=int, default=d["threads"], help="Conversatii per cetatean cu cont.")
+        parser.add_argument("--messages", type=int, default=d["messages"], help="Mesaje per conversatie.")
+        parser.add_argument(
+            "--attachment-every", type=int, default=d["attachment_every"], help="Al catelea mesaj are atasament."
+        )
+        parser.add_argument("--leave-requests", type=int, default=d["leave_requests"], help="Concedii per cetatean.")
+        parser.add_argument("--work-items", type=int, default=d["work_items"], help="Lucrari per cetatean.")
+        parser.add_argument("--documents", type=int, default=d["documents"], help="Documente generate per cetatean.")
+        parser.add_argument("--batch-size", type=int, default=d["batch_size"], help="Cetateni per tranzactie.")
+        parser.add_argument("--password", default=d["password"], help="Parola tuturor conturilor generate.")
+        parser.add_argument("--prefix", default=d["prefix"], help="Prefixul numelor de primarii / template-uri.")
+        parser.add_argument("--seed", type=int, default=d["seed"], help="Seed pentru generatorul aleator.")
+
+    def handle(self, *args, **options):
+        # CNP-urile unei bucati sunt verificate intr-un singur IN (limita de parametri SQLite)
+        if not 1 <= options["batch_size"] <= 10000:
+            raise CommandError("--batch-size trebuie sa fie intre 1 si 10000.")
+        if not 0 <= options["user_ratio"] <= 1:
+            raise CommandError("--user-ratio trebuie sa fie intre 0 si 1.")
+        params = {key: options[key] for key in SYNTHETIC_DEFAULTS}
+        params["extra_fields"] = tuple(k.strip() for k in options["extra_fields"].split(",") if k.strip())
+        stats = generate_synthetic_data(log=self.stdout.write, **params)
+        for key, value in stats.items():
+            self.stdout.write(f"{key}: {value}")
+        self.stdout.write(self.style.SUCCESS(f"Date generate. Parola conturilor: {options['password']}"))
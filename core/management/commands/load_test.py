@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.loadtest import LOAD_TEST_DEFAULTS, PERCENTILES, external_service_warnings, run_load_test
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de incarcare HTTP pe un server pornit separat (runserver, gunicorn): cetateni si administratori "
+        "din datele generate cu generate_synthetic_data parcurg fluxuri reale (dashboard, preview la fiecare "
+        "tasta, generare document, chat, concedii, cautare cetateni). Afiseaza latenta si erorile per endpoint. "
+        "Serverul se porneste fara servicii externe, de ex.: EMAIL_BACKEND=django.core.mail.backends.locmem."
+        "EmailBackend SITE_BASE_URL=http://127.0.0.1:8000 python manage.py runserver --noreload"
+    )
+
+    def add_arguments(self, parser):
+        d = LOAD_TEST_DEFAULTS
+        parser.add_argument("--base-url", default=d["base_url"], help="Adresa serverului testat.")
+        parser.add_argument("--citizens", type=int, default=d["citizens"], help="Cetateni simultani.")
+        parser.add_argument("--staff", type=int, default=d["staff"], help="Administratori de primarie simultani.")
+        parser.add_argument("--duration", type=float, default=d["duration"], help="Durata testului, in secunde.")
+        parser.add_argument(
+            "--iterations", type=int, default=d["iterations"], help="Iteratii per utilizator (0 = pana la final)."
+        )
+        parser.add_argument("--ramp-up", type=float, default=d["ramp_up"], help="Secunde pana pornesc toti.")
+        parser.add_argument(
+            "--think-time", type=float, default=d["think_time"], help="Pauza medie intre cereri (0 = fara pauze)."
+        )
+        parser.add_argument("--keystrokes", type=int, default=d["keystrokes"], help="Cereri de preview per document.")
+        parser.add_argument("--timeout", type=float, default=d["timeout"], help="Timeout per cerere, in secunde.")
+        parser.add_argument("--password", default=d["password"], help="Parola conturilor generate.")
+        parser.add_argument("--prefix", default=d["prefix"], help="Prefixul primariilor generate.")
+        parser.add_argument("--seed", type=int, default=d["seed"], help="Seed pentru alegerea conturilor.")
+        parser.add_argument(
+            "--max-error-rate",
+            type=float,
+            default=None,
+            help="Esueaza (cod de iesire 1) daca procentul total de erori il depaseste.",
+        )
+
+    def handle(self, *args, **options):
+        if options["citizens"] < 0 or options["staff"] < 0 or options["citizens"] + options["staff"] == 0:
+            raise CommandError("Este nevoie de cel putin un utilizator (--citizens / --staff).")
+        if options["keystrokes"] < 1:
+            raise CommandError("--keystrokes trebuie sa fie cel putin 1.")
+        params = {key: options[key] for key in LOAD_TEST_DEFAULTS}
+        for warning in external_service_warnings(options["base_url"]):
+            self.stdout.write(self.style.WARNING(warning))
+        try:
+            result = run_load_test(log=self.stdout.write, **params)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        columns = ["requests", "errors", "err%"] + [f"p{pct}" for pct in PERCENTILES] + ["max", "mean"]
+        width = max([len(row["endpoint"]) for row in result.rows] + [len("endpoint")])
+        self.stdout.write("")
+        self.stdout.write(f"{'endpoint':<{width}} " + " ".join(f"{c:>8}" for c in columns) + "  status")
+        for row in result.rows:
+            values = [row["requests"], row["errors"], f"{row['error_rate']:.1f}"]
+            values += [f"{row[f'p{pct}']:.0f}" for pct in PERCENTILES] + [f"{row['max']:.0f}", f"{row['mean']:.0f}"]
+            statuses = " ".join(f"{code}:{n}" for code, n in row["statuses"].items())
+            line = f"{row['endpoint']:<{width}} " + " ".join(f"{v:>8}" for v in values) + f"  {statuses}"
+            self.stdout.write(self.style.ERROR(line) if row["errors"] else line)
+        self.stdout.write("(latente in ms; status 0 = conexiune esuata sau timeout)")
+        self.stdout.write("")
+        self.stdout.write(
+            f"{result.requests} cereri in {result.seconds:.1f}s ({result.throughput:.1f} cereri/s), "
+            f"{result.errors} erori ({result.error_rate:.2f}%), "
+            f"{result.citizens} cetateni + {result.staff} administratori, "
+            f"{result.failed_logins} autentificari esuate."
+        )
+        if options["max_error_rate"] is not None and result.error_rate > options["max_error_rate"]:
+            raise CommandError(
+                f"Rata de erori {result.error_rate:.2f}% depaseste pragul de {options['max_error_rate']:g}%."
+            )
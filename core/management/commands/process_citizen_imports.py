@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.citizen_import import claimable_jobs, process_import_job
+
+
+class Command(BaseCommand):
+    help = "Proceseaza job-urile de import cetateni (noi sau intrerupte, reluate de la ultimul checkpoint)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Proceseaza ce este in coada si iese.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Secunde intre verificari.")
+
+    def handle(self, *args, **options):
+        while True:
+            job_ids = list(claimable_jobs().order_by("created_at").values_list("pk", flat=True))
+            for job_id in job_ids:
+                try:
+                    job = process_import_job(job_id)
+                except Exception as exc:
+                    self.stderr.write(f"Job {job_id} esuat: {exc}")
+                    continue
+                if job:
+                    job.refresh_from_db()
+                    self.stdout.write(
+                        f"Job {job.pk} ({job.file_name}): {job.get_status_display()} - {job.rows_done} randuri"
+                    )
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
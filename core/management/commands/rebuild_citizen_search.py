@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.citizen_search import rebuild_index, search_enabled
+
+
+class Command(BaseCommand):
+    help = "Reconstruieste indexul de cautare full-text al cetatenilor (SQLite FTS5)."
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError("Indexul FTS5 este disponibil doar pe SQLite.")
+        total = rebuild_index()
+        self.stdout.write(f"Index reconstruit: {total} cetateni.")
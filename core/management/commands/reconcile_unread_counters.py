@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.unread import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Recalculeaza contoarele de mesaje si notificari necitite din randurile sursa."
+
+    def handle(self, *args, **options):
+        changed = reconcile_counters()
+        self.stdout.write(f"Contoare corectate: {changed}.")
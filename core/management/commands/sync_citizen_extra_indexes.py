@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.citizen_extras import sync_extra_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Creeaza indexuri pe expresie pentru cheile din Citizen.extra (CITIZEN_EXTRA_INDEXED_KEYS) "
+        "si le sterge pe cele care nu mai sunt cerute."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("keys", nargs="*", help="Chei de indexat (implicit din setari).")
+        parser.add_argument("--dry-run", action="store_true", help="Afiseaza modificarile fara sa le aplice.")
+
+    def handle(self, *args, **options):
+        try:
+            created, dropped = sync_extra_indexes(options["keys"] or None, dry_run=options["dry_run"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        prefix = "[simulare] " if options["dry_run"] else ""
+        for name in created:
+            self.stdout.write(f"{prefix}Creat: {name}")
+        for name in dropped:
+            self.stdout.write(f"{prefix}Sters: {name}")
+        if not created and not dropped:
+            self.stdout.write("Indexurile sunt la zi.")
@@ -0,0 +1,46 @@
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+SIGNED_MEDIA_SALT = "core.media.signed_media"
+
+
+def _media_signature(path: str, expires: str, disposition: str, content_type: str = "", filename: str = ""):
+    value = f"{path}:{expires}:{disposition}:{content_type}:{filename}"
+    return salted_hmac(SIGNED_MEDIA_SALT, value, algorithm="sha256").hexdigest()
+
+
+def signed_media_url(
+    path: str,
+    disposition: str = "attachment",
+    ttl: int | None = None,
+    content_type: str = "",
+    filename: str = "",
+):
+    """
+    Link temporar catre un fisier din MEDIA_ROOT. Autorizarea se face inainte, in view;
+    link-ul doar dovedeste ca Django a permis accesul pana la momentul `exp`. Tipul de continut si
+    numele de descarcare (optionale) sunt semnate odata cu calea, deci nu pot fi schimbate din link.
+    """
+    ttl = settings.MEDIA_SIGNED_URL_TTL if ttl is None else ttl
+    expires = str(int(time.time()) + ttl)
+    params = {"exp": expires, "d": disposition}
+    if content_type:
+        params["ct"] = content_type
+    if filename:
+        params["fn"] = filename
+    params["sig"] = _media_signature(path, expires, disposition, content_type, filename)
+    return f"{reverse('signed_media', args=[path])}?{urlencode(params)}"
+
+
+def verify_media_signature(
+    path: str, expires: str, disposition: str, signature: str, content_type: str = "", filename: str = ""
+):
+    if disposition not in {"inline", "attachment"} or not expires.isdigit():
+        return False
+    if int(expires) < time.time():
+        return False
+    return constant_time_compare(_media_signature(path, expires, disposition, content_type, filename), signature)
@@ -1,5 +1,30 @@
+from django.contrib.auth import BACKEND_SESSION_KEY
 from django.utils.deprecation import MiddlewareMixin
 
+PRINCIPAL_BACKEND = "core.backends.PrincipalBackend"
+# sesiuni deschise inainte de PrincipalBackend; acelasi model de utilizator, deci doar schimbam calea
+LEGACY_BACKENDS = {"django.contrib.auth.backends.ModelBackend"}
+
+
+class PrincipalMiddleware(MiddlewareMixin):
+    """
+    Expune `request.citizen` si `request.municipality` (primaria adminului). Utilizatorul vine din
+    PrincipalBackend cu ambele relatii incarcate, deci nu costa interogari in plus.
+    Trebuie pus dupa AuthenticationMiddleware.
+    """
+
+    def process_request(self, request):
+        session = getattr(request, "session", None)
+        if session is not None and session.get(BACKEND_SESSION_KEY) in LEGACY_BACKENDS:
+            session[BACKEND_SESSION_KEY] = PRINCIPAL_BACKEND
+        user = request.user
+        request.citizen = None
+        request.municipality = None
+        if user.is_authenticated:
+            request.citizen = getattr(user, "citizen_profile", None)
+            admin = getattr(user, "municipality_admin", None)
+            request.municipality = admin.municipality if admin else None
+
 
 class NoCacheForAuthMiddleware(MiddlewareMixin):
     """
@@ -9,7 +34,8 @@ class NoCacheForAuthMiddleware(MiddlewareMixin):
 
     def process_response(self, request, response):
         # Aplicam pentru utilizatori autentificati sau pentru rutele cu sesiune
-        if request.user.is_authenticated:
+        # (exceptie: raspunsuri versionate marcate explicit ca sigure pentru cache-ul browserului)
+        if request.user.is_authenticated and not getattr(response, "client_cacheable", False):
             response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
             response.headers["Pragma"] = "no-cache"
             response.headers["Expires"] = "0"
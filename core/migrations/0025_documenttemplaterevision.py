@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:33
+
+import hashlib
+import json
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+PLACEHOLDER_RE = re.compile(r"{{\s*([\w.]+)")
+
+
+def template_revision_payload(body_html, dynamic_fields):
+    # copie inghetata a core.models.template_revision_payload, fara minificarea HTML (randarea e aceeasi);
+    # prima salvare a template-ului dupa migrare poate crea o revizie noua, minificata
+    body = (body_html or "").replace("\\{\\{", "{{").replace("\\}\\}", "}}").strip()
+    placeholders = sorted(set(PLACEHOLDER_RE.findall(body)))
+    digest = hashlib.sha256()
+    digest.update(body.encode("utf-8"))
+    digest.update(json.dumps(dynamic_fields or [], sort_keys=True).encode("utf-8"))
+    return body, placeholders, digest.hexdigest()
+
+
+def create_initial_revisions(apps, schema_editor):
+    DocumentTemplate = apps.get_model("core", "DocumentTemplate")
+    DocumentTemplateRevision = apps.get_model("core", "DocumentTemplateRevision")
+    WorkItem = apps.get_model("core", "WorkItem")
+    for tmpl in DocumentTemplate.objects.all().iterator():
+        body, placeholders, content_hash = template_revision_payload(tmpl.body_html, tmpl.dynamic_fields)
+        revision = DocumentTemplateRevision.objects.create(
+            template=tmpl,
+            number=1,
+            body_html=body,
+            dynamic_fields=tmpl.dynamic_fields or [],
+            placeholders=placeholders,
+            content_hash=content_hash,
+            created_by_id=tmpl.created_by_id,
+        )
+        DocumentTemplate.objects.filter(pk=tmpl.pk).update(current_revision=revision)
+        WorkItem.objects.filter(template=tmpl, revision__isnull=True).update(revision=revision)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_citizen_leave_enabled'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentTemplateRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('body_html', models.TextField()),
+                ('dynamic_fields', models.JSONField(blank=True, default=list)),
+                ('placeholders', models.JSONField(blank=True, default=list)),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='core.documenttemplate')),
+            ],
+            options={
+                'ordering': ['-number'],
+            },
+        ),
+        migrations.AddField(
+            model_name='documenttemplate',
+            name='current_revision',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.documenttemplaterevision'),
+        ),
+        migrations.AddField(
+            model_name='workitem',
+            name='revision',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='work_items', to='core.documenttemplaterevision'),
+        ),
+        migrations.AddConstraint(
+            model_name='documenttemplaterevision',
+            constraint=models.UniqueConstraint(fields=('template', 'number'), name='unique_revision_number_per_template'),
+        ),
+        migrations.RunPython(create_initial_revisions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:35
+
+from django.db import migrations, models
+
+
+def fill_source_size(apps, schema_editor):
+    DocumentTemplate = apps.get_model("core", "DocumentTemplate")
+    DocumentTemplateRevision = apps.get_model("core", "DocumentTemplateRevision")
+    for tmpl in DocumentTemplate.objects.filter(current_revision__isnull=False).iterator():
+        DocumentTemplateRevision.objects.filter(pk=tmpl.current_revision_id).update(
+            source_size=len(tmpl.body_html or "")
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_documenttemplaterevision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttemplaterevision',
+            name='source_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_source_size, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_documenttemplaterevision_source_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttemplaterevision',
+            name='preflight_bytes',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documenttemplaterevision',
+            name='preflight_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documenttemplaterevision',
+            name='preflight_pages',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
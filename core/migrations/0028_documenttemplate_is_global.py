@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:38
+
+from django.db import migrations, models
+
+
+def fill_is_global(apps, schema_editor):
+    DocumentTemplate = apps.get_model("core", "DocumentTemplate")
+    DocumentTemplate.objects.filter(municipalities__isnull=False).update(is_global=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_documenttemplaterevision_preflight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttemplate',
+            name='is_global',
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+        migrations.RunPython(fill_is_global, migrations.RunPython.noop),
+    ]
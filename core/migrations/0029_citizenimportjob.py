@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_documenttemplate_is_global'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CitizenImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('spool_path', models.CharField(max_length=500)),
+                ('mode', models.CharField(blank=True, choices=[('', 'Nestabilit'), ('overwrite', 'Rescrie existente'), ('skip', 'Omite existente')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Verificare duplicate'), ('confirm', 'Asteapta confirmare'), ('queued', 'In asteptare'), ('running', 'In lucru'), ('done', 'Finalizat'), ('failed', 'Esuat'), ('cancelled', 'Anulat')], db_index=True, default='pending', max_length=20)),
+                ('rows_done', models.PositiveIntegerField(default=0)),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('updated_count', models.PositiveIntegerField(default=0)),
+                ('skipped_count', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('duplicates', models.JSONField(blank=True, default=list)),
+                ('duplicate_count', models.PositiveIntegerField(default=0)),
+                ('failure', models.TextField(blank=True)),
+                ('worker_token', models.CharField(blank=True, max_length=32)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('municipality', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='citizen_imports', to='core.municipality')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
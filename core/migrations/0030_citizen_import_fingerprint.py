@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:51
+
+import hashlib
+
+from django.db import migrations, models
+
+# copie inghetata a core.models.CITIZEN_IMPORT_FIELDS / citizen_import_fingerprint la momentul migrarii
+CITIZEN_IMPORT_FIELDS = [
+    "full_name",
+    "identifier",
+    "nume",
+    "prenume",
+    "strada",
+    "nr",
+    "localitate",
+    "judet",
+    "telefon",
+    "email_recuperare",
+    "beneficiar",
+    "emitent",
+    "tip_document",
+    "numar_document_extern",
+    "data_emitere",
+]
+
+
+def citizen_import_fingerprint(values, cnp, municipality_id):
+    normalized = [str(values.get(field) or "") for field in CITIZEN_IMPORT_FIELDS]
+    normalized += [cnp or "", str(municipality_id or "")]
+    return hashlib.sha256("\x1f".join(normalized).encode("utf-8")).hexdigest()
+
+
+def fill_import_fingerprints(apps, schema_editor):
+    Citizen = apps.get_model("core", "Citizen")
+    batch = []
+    for citizen in Citizen.objects.only("id", "cnp", "municipality_id", *CITIZEN_IMPORT_FIELDS).iterator(chunk_size=2000):
+        values = {field: getattr(citizen, field) for field in CITIZEN_IMPORT_FIELDS}
+        citizen.import_fingerprint = citizen_import_fingerprint(values, citizen.cnp, citizen.municipality_id)
+        batch.append(citizen)
+        if len(batch) >= 2000:
+            Citizen.objects.bulk_update(batch, ["import_fingerprint"])
+            batch = []
+    Citizen.objects.bulk_update(batch, ["import_fingerprint"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_citizenimportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='citizen',
+            name='import_fingerprint',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.RunPython(fill_import_fingerprints, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='citizenimportjob',
+            name='dry_run',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='citizenimportjob',
+            name='unchanged_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='citizenimportjob',
+            name='mode',
+            field=models.CharField(blank=True, choices=[('', 'Nestabilit'), ('overwrite', 'Rescrie existente'), ('skip', 'Omite existente'), ('sync', 'Sincronizare (doar randurile modificate)')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+FOLD_BATCH_SIZE = 2000
+
+
+def fold_extra_values(apps, schema_editor):
+    # randurile ExtraFieldValue ordonate dupa cetatean -> un dict per cetatean, scris in bloc
+    Citizen = apps.get_model("core", "Citizen")
+    ExtraFieldValue = apps.get_model("core", "ExtraFieldValue")
+    rows = (
+        ExtraFieldValue.objects.order_by("citizen_id", "id")
+        .values_list("citizen_id", "field_def__name", "value")
+        .iterator(chunk_size=FOLD_BATCH_SIZE)
+    )
+    folded = {}
+
+    def flush():
+        citizens = list(Citizen.objects.filter(pk__in=folded).only("id", "data"))
+        for citizen in citizens:
+            citizen.extra = folded[citizen.pk]
+            citizen.data = {**(citizen.data or {}), **citizen.extra}
+        Citizen.objects.bulk_update(citizens, ["extra", "data"])
+        folded.clear()
+
+    for citizen_id, name, value in rows:
+        if citizen_id not in folded and len(folded) >= FOLD_BATCH_SIZE:
+            flush()
+        folded.setdefault(citizen_id, {})[name] = value
+    if folded:
+        flush()
+
+
+def unfold_extra_values(apps, schema_editor):
+    # la revenire, coloana dispare: rescriem randurile EAV din ea ca sa nu pierdem modificarile
+    Citizen = apps.get_model("core", "Citizen")
+    ExtraFieldDefinition = apps.get_model("core", "ExtraFieldDefinition")
+    ExtraFieldValue = apps.get_model("core", "ExtraFieldValue")
+    citizens = Citizen.objects.exclude(extra={}).values_list("id", "extra").iterator(chunk_size=FOLD_BATCH_SIZE)
+    defs = dict(ExtraFieldDefinition.objects.values_list("name", "id"))
+    batch = {}
+
+    def flush():
+        names = {name for extra in batch.values() for name in extra if name not in defs}
+        ExtraFieldDefinition.objects.bulk_create(
+            [ExtraFieldDefinition(name=name, label=name) for name in names], ignore_conflicts=True
+        )
+        defs.update(ExtraFieldDefinition.objects.filter(name__in=names).values_list("name", "id"))
+        ExtraFieldValue.objects.filter(citizen_id__in=batch).delete()
+        ExtraFieldValue.objects.bulk_create(
+            [
+                ExtraFieldValue(citizen_id=citizen_id, field_def_id=defs[name], value=value or "")
+                for citizen_id, extra in batch.items()
+                for name, value in extra.items()
+            ]
+        )
+        batch.clear()
+
+    for citizen_id, extra in citizens:
+        if isinstance(extra, dict) and extra:
+            batch[citizen_id] = extra
+        if len(batch) >= FOLD_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_citizen_import_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='citizen',
+            name='extra',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(fold_extra_values, unfold_extra_values),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_citizen_extra'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='citizen',
+            index=models.Index(fields=['municipality', 'full_name', 'id'], name='citizen_muni_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='citizen',
+            index=models.Index(fields=['full_name', 'id'], name='citizen_name_idx'),
+        ),
+    ]
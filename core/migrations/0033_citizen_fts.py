@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:05
+
+from django.db import migrations
+
+# copie inghetata a SQL-ului din core.citizen_search la momentul migrarii
+CITIZEN_FTS_TABLE = "core_citizen_fts"
+CREATE_FTS_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {CITIZEN_FTS_TABLE} USING fts5("
+    "full_name, cnp, identifier, address, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+)
+FILL_FTS_SQL = (
+    f"INSERT INTO {CITIZEN_FTS_TABLE} (rowid, full_name, cnp, identifier, address) "
+    "SELECT id, full_name, COALESCE(cnp, ''), identifier, strada || ' ' || nr || ' ' || localitate || ' ' || judet "
+    "FROM core_citizen"
+)
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 este specific SQLite; pe alte baze cautarea cetatenilor ramane pe icontains
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(CREATE_FTS_SQL)
+    schema_editor.execute(FILL_FTS_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {CITIZEN_FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_citizen_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def _count(qs, field):
+    return Coalesce(
+        models.Subquery(
+            qs.order_by().values(field).annotate(n=models.Count("pk")).values("n"),
+            output_field=models.IntegerField(),
+        ),
+        0,
+    )
+
+
+def fill_unread_counters(apps, schema_editor):
+    # aceeasi logica ca unread.reconcile_counters(), pe modelele istorice
+    Citizen = apps.get_model("core", "Citizen")
+    Municipality = apps.get_model("core", "Municipality")
+    Message = apps.get_model("core", "Message")
+    Notification = apps.get_model("core", "Notification")
+    StaffNotification = apps.get_model("core", "StaffNotification")
+    StaffUnreadCounter = apps.get_model("core", "StaffUnreadCounter")
+    outer = models.OuterRef("pk")
+    Citizen.objects.update(
+        unread_chat=_count(Message.objects.filter(citizen=outer, sender__is_staff=False, read_by_staff=False), "citizen"),
+        unread_staff_messages=_count(
+            Message.objects.filter(citizen=outer, sender__is_staff=True, read_by_citizen=False), "citizen"
+        ),
+        unread_notifications=_count(Notification.objects.filter(citizen=outer, is_read=False), "citizen"),
+    )
+    Municipality.objects.update(
+        unread_chat=_count(
+            Message.objects.filter(citizen__municipality=outer, sender__is_staff=False, read_by_staff=False),
+            "citizen__municipality",
+        )
+    )
+    rows = (
+        StaffNotification.objects.filter(is_read=False)
+        .order_by()
+        .values("user")
+        .annotate(total=models.Count("pk"), leave=models.Count("pk", filter=models.Q(work_item__isnull=True)))
+    )
+    StaffUnreadCounter.objects.bulk_create(
+        [StaffUnreadCounter(user_id=r["user"], notifications=r["total"], leave_notifications=r["leave"]) for r in rows]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0033_citizen_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffUnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('notifications', models.IntegerField(default=0)),
+                ('leave_notifications', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='citizen',
+            name='unread_chat',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='citizen',
+            name='unread_notifications',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='citizen',
+            name='unread_staff_messages',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='unread_chat',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='citizen',
+            index=models.Index(fields=['municipality', '-unread_chat', 'full_name', 'id'], name='citizen_muni_unread_idx'),
+        ),
+        migrations.RunPython(fill_unread_counters, migrations.RunPython.noop),
+    ]
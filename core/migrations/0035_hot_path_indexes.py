@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_unread_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='citizen',
+            index=models.Index(condition=models.Q(('unread_chat__gt', 0)), fields=['unread_chat'], name='citizen_unread_chat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generateddocument',
+            index=models.Index(fields=['citizen', '-created_at'], name='gendoc_citizen_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['citizen', 'status', 'start_date'], name='leave_citizen_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['citizen', '-created_at'], name='leave_citizen_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['citizen', 'chat_thread', '-created_at'], name='msg_thread_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('read_by_staff', False)), fields=['citizen'], name='msg_unread_staff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('read_by_citizen', False)), fields=['citizen'], name='msg_unread_citizen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['citizen', '-created_at'], name='notif_citizen_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['citizen'], name='notif_citizen_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='staffnotification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['user', 'work_item'], name='staffnotif_user_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workitem',
+            index=models.Index(fields=['municipality', 'status', '-created_at'], name='workitem_muni_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workitem',
+            index=models.Index(fields=['municipality', '-created_at'], name='workitem_muni_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workitem',
+            index=models.Index(fields=['citizen', '-created_at'], name='workitem_citizen_created_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:54
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def fold_eav_values(apps, schema_editor):
+    # randurile EAV ramase se muta in coloana `extra` inainte de stergerea tabelei
+    Citizen = apps.get_model("core", "Citizen")
+    ExtraFieldValue = apps.get_model("core", "ExtraFieldValue")
+    rows = (
+        ExtraFieldValue.objects.order_by("citizen_id", "id")
+        .values_list("citizen_id", "field_def__name", "value")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    folded = {}
+
+    def flush():
+        citizens = list(Citizen.objects.filter(pk__in=folded).only("id", "data"))
+        for citizen in citizens:
+            citizen.extra = folded[citizen.pk]
+            citizen.data = {**(citizen.data or {}), **citizen.extra}
+        Citizen.objects.bulk_update(citizens, ["extra", "data"])
+        folded.clear()
+
+    for citizen_id, name, value in rows:
+        if citizen_id not in folded and len(folded) >= BATCH_SIZE:
+            flush()
+        folded.setdefault(citizen_id, {})[name] = value
+    if folded:
+        flush()
+
+
+def unfold_extra_values(apps, schema_editor):
+    # la revenire tabela este recreata goala: o umplem din coloana `extra`
+    Citizen = apps.get_model("core", "Citizen")
+    ExtraFieldDefinition = apps.get_model("core", "ExtraFieldDefinition")
+    ExtraFieldValue = apps.get_model("core", "ExtraFieldValue")
+    rows = Citizen.objects.exclude(extra={}).values_list("id", "extra")
+    names = set()
+    for _citizen_id, extra in rows.iterator(chunk_size=BATCH_SIZE):
+        if isinstance(extra, dict):
+            names.update(extra)
+    defs = dict(ExtraFieldDefinition.objects.filter(name__in=names).values_list("name", "id"))
+    created = ExtraFieldDefinition.objects.bulk_create(
+        [ExtraFieldDefinition(name=name, label=name) for name in sorted(names - defs.keys())]
+    )
+    defs.update((field_def.name, field_def.pk) for field_def in created)
+    batch = []
+    for citizen_id, extra in rows.iterator(chunk_size=BATCH_SIZE):
+        if not isinstance(extra, dict):
+            continue
+        for name, value in extra.items():
+            batch.append(ExtraFieldValue(citizen_id=citizen_id, field_def_id=defs[name], value=value or ""))
+        if len(batch) >= BATCH_SIZE:
+            ExtraFieldValue.objects.bulk_create(batch)
+            batch = []
+    ExtraFieldValue.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0035_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fold_eav_values, unfold_extra_values),
+        migrations.DeleteModel(
+            name='ExtraFieldValue',
+        ),
+    ]
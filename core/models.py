@@ -1,8 +1,15 @@
+import hashlib
+import json
+import re
+
 from django.contrib.auth.models import User
 from django.db import models
 from django.utils import timezone
 from django.utils.text import slugify
 
+from .media import signed_media_url
+from .template_html import minify_template_html
+
 
 class Municipality(models.Model):
     name = models.CharField(max_length=200, unique=True)
@@ -24,6 +31,8 @@ class Municipality(models.Model):
     header_banner = models.ImageField(
         upload_to="municipality_headers/", null=True, blank=True
     )
+    # mesaje de la cetatenii primariei necitite de staff (vezi core.unread)
+    unread_chat = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -102,17 +111,44 @@ class Citizen(models.Model):
 
     # JSON automat (fallback)
     data = models.JSONField(default=dict, blank=True)
+    # hash al coloanelor importabile, mentinut de save() si de import (vezi citizen_import_fingerprint)
+    import_fingerprint = models.CharField(max_length=64, blank=True)
+    # campuri extra {nume: valoare}; numele sunt cele din ExtraFieldDefinition
+    extra = models.JSONField(default=dict, blank=True)
 
     profile_status = models.CharField(
         max_length=30, choices=STATUS_CHOICES, default="up_to_date"
     )
+    # contoare de necitite, mentinute de core.unread (reparare: `manage.py reconcile_unread_counters`)
+    unread_chat = models.IntegerField(default=0)  # mesaje de la cetatean necitite de staff
+    unread_staff_messages = models.IntegerField(default=0)  # mesaje de la staff necitite de cetatean
+    unread_notifications = models.IntegerField(default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # lista de cetateni pagineaza pe cursor dupa (full_name, id), in cadrul primariei sau global
+        indexes = [
+            models.Index(fields=["municipality", "full_name", "id"], name="citizen_muni_name_idx"),
+            models.Index(fields=["full_name", "id"], name="citizen_name_idx"),
+            # sortarea dupa mesaje necitite din lista de cetateni
+            models.Index(fields=["municipality", "-unread_chat", "full_name", "id"], name="citizen_muni_unread_idx"),
+            # totalul global de mesaje necitite (staff fara primarie) citeste doar cetatenii cu necitite
+            models.Index(fields=["unread_chat"], condition=models.Q(unread_chat__gt=0), name="citizen_unread_chat_idx"),
+        ]
+
     def __str__(self):
         return self.full_name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # primaria din baza: la mutarea cetateanului, contorul de necitite trece la noua primarie
+        # (semnalul post_save din core.signals); fara interogare in plus la salvare
+        instance._saved_municipality_id = instance.__dict__.get("municipality_id")
+        return instance
+
     def build_data_payload(self, include_extra=True):
         base = {
             "full_name": self.full_name,
@@ -133,21 +169,60 @@ class Citizen(models.Model):
             "data_emitere": str(self.data_emitere) if self.data_emitere else "",
         }
 
-        if include_extra and self.pk:
-            for val in self.extra_values.select_related("field_def").all():
-                base[val.field_def.name] = val.value
+        if include_extra:
+            base.update(self.get_extras())
         return base
 
+    def get_extras(self):
+        return dict(self.extra or {})
+
     def refresh_data_cache(self):
         self.data = self.build_data_payload(include_extra=True)
         super().save(update_fields=["data"])
 
+    def compute_import_fingerprint(self):
+        values = {field: getattr(self, field) for field in CITIZEN_IMPORT_FIELDS}
+        return citizen_import_fingerprint(values, self.cnp, self.municipality_id)
+
     def save(self, *args, **kwargs):
-        # generam JSON automat din campurile introduse; extra-urile se ataseaza separat
-        self.data = self.build_data_payload(include_extra=False)
+        # generam JSON automat din campurile introduse
+        self.data = self.build_data_payload(include_extra=True)
+        self.import_fingerprint = self.compute_import_fingerprint()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and FINGERPRINT_FIELDS.intersection(update_fields):
+            kwargs["update_fields"] = {*update_fields, "import_fingerprint"}
         super().save(*args, **kwargs)
 
 
+# coloanele din CSV-ul de import cetateni (in afara de cnp)
+CITIZEN_IMPORT_FIELDS = [
+    "full_name",
+    "identifier",
+    "nume",
+    "prenume",
+    "strada",
+    "nr",
+    "localitate",
+    "judet",
+    "telefon",
+    "email_recuperare",
+    "beneficiar",
+    "emitent",
+    "tip_document",
+    "numar_document_extern",
+    "data_emitere",
+]
+FINGERPRINT_FIELDS = {*CITIZEN_IMPORT_FIELDS, "cnp", "municipality", "municipality_id"}
+
+
+def citizen_import_fingerprint(values: dict, cnp, municipality_id):
+    """Hash al coloanelor importabile; importul in mod sincronizare scrie doar randurile cu hash diferit."""
+    # datele devin YYYY-MM-DD prin str(), la fel din CSV si din baza de date
+    normalized = [str(values.get(field) or "") for field in CITIZEN_IMPORT_FIELDS]
+    normalized += [cnp or "", str(municipality_id or "")]
+    return hashlib.sha256("\x1f".join(normalized).encode("utf-8")).hexdigest()
+
+
 class ExtraFieldDefinition(models.Model):
     name = models.CharField(max_length=100, unique=True)
     label = models.CharField(max_length=150, blank=True)
@@ -160,26 +235,6 @@ class ExtraFieldDefinition(models.Model):
         return self.label or self.name
 
 
-class ExtraFieldValue(models.Model):
-    citizen = models.ForeignKey(
-        Citizen, on_delete=models.CASCADE, related_name="extra_values"
-    )
-    field_def = models.ForeignKey(
-        ExtraFieldDefinition, on_delete=models.CASCADE, related_name="values"
-    )
-    value = models.TextField(blank=True)
-
-    class Meta:
-        constraints = [
-            models.UniqueConstraint(
-                fields=["citizen", "field_def"], name="unique_extra_per_citizen"
-            )
-        ]
-
-    def __str__(self):
-        return f"{self.citizen} - {self.field_def.name}"
-
-
 class DocumentTemplate(models.Model):
     OUTPUT_CHOICES = [
         ("pdf", "PDF"),
@@ -207,11 +262,17 @@ class DocumentTemplate(models.Model):
         related_name="templates",
         help_text="Lasa necompletat pentru a fi disponibil tuturor primariilor",
     )
+    # denormalizat din `municipalities` (fara primarii = global); mentinut de semnalul m2m_changed
+    is_global = models.BooleanField(default=True, db_index=True)
 
     created_by = models.ForeignKey(
         User, null=True, blank=True, on_delete=models.SET_NULL
     )
     dynamic_fields = models.JSONField(default=list, blank=True)
+    # ultima revizie imutabila; randarea, preview-ul si cache-urile se leaga de ea
+    current_revision = models.ForeignKey(
+        "DocumentTemplateRevision", null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -221,10 +282,101 @@ class DocumentTemplate(models.Model):
     def __str__(self):
         return self.name
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, revision_user=None, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
+        self.snapshot_revision(user=revision_user)
+
+    def snapshot_revision(self, user=None):
+        """Creeaza o revizie noua doar daca s-a schimbat continutul randabil; `user` este autorul modificarii."""
+        body, placeholders, content_hash = template_revision_payload(self.body_html, self.dynamic_fields)
+        current = self.current_revision
+        if current and current.content_hash == content_hash:
+            return current
+        last_number = self.revisions.aggregate(n=models.Max("number"))["n"] or 0
+        revision = DocumentTemplateRevision.objects.create(
+            template=self,
+            number=last_number + 1,
+            body_html=body,
+            dynamic_fields=self.dynamic_fields or [],
+            placeholders=placeholders,
+            content_hash=content_hash,
+            source_size=len(self.body_html or ""),
+            created_by=user,
+        )
+        self.current_revision = revision
+        DocumentTemplate.objects.filter(pk=self.pk).update(current_revision=revision)
+        return revision
+
+
+PLACEHOLDER_RE = re.compile(r"{{\s*([\w.]+)")
+
+
+def normalize_template_body(body_html: str):
+    # placeholdere scapate cu backslash din editor -> sintaxa Django, apoi HTML compact pentru randare
+    body = (body_html or "").replace("\\{\\{", "{{").replace("\\}\\}", "}}").strip()
+    return minify_template_html(body)
+
+
+def template_revision_payload(body_html: str, dynamic_fields: list | None):
+    body = normalize_template_body(body_html)
+    placeholders = sorted(set(PLACEHOLDER_RE.findall(body)))
+    digest = hashlib.sha256()
+    digest.update(body.encode("utf-8"))
+    digest.update(json.dumps(dynamic_fields or [], sort_keys=True).encode("utf-8"))
+    return body, placeholders, digest.hexdigest()
+
+
+class DocumentTemplateRevision(models.Model):
+    template = models.ForeignKey(DocumentTemplate, on_delete=models.CASCADE, related_name="revisions")
+    number = models.PositiveIntegerField()
+    body_html = models.TextField()
+    dynamic_fields = models.JSONField(default=list, blank=True)
+    placeholders = models.JSONField(default=list, blank=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    # lungimea HTML-ului original din editor; body_html este varianta optimizata pentru randare
+    source_size = models.PositiveIntegerField(default=0)
+    # cost masurat la salvare (pre-flight pe un cetatean exemplu)
+    preflight_ms = models.PositiveIntegerField(null=True, blank=True)
+    preflight_pages = models.PositiveIntegerField(null=True, blank=True)
+    preflight_bytes = models.PositiveIntegerField(null=True, blank=True)
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-number"]
+        constraints = [
+            models.UniqueConstraint(fields=["template", "number"], name="unique_revision_number_per_template")
+        ]
+
+    def __str__(self):
+        return f"{self.template.name} r{self.number}"
+
+    @property
+    def size_reduction(self):
+        if not self.source_size:
+            return 0
+        return round(100 * (1 - len(self.body_html) / self.source_size), 1)
+
+
+def visible_templates(muni: Municipality | None):
+    """Template-urile vizibile unei primarii: globale sau atribuite explicit (fara join + distinct)."""
+    qs = DocumentTemplate.objects.all()
+    if muni is None:
+        return qs
+    assigned = DocumentTemplate.municipalities.through.objects.filter(municipality=muni).values("documenttemplate_id")
+    return qs.filter(models.Q(is_global=True) | models.Q(pk__in=assigned))
+
+
+def template_visible_to(tmpl: DocumentTemplate, muni: Municipality | None):
+    if tmpl.is_global:
+        return True
+    if muni is None:
+        return False
+    return DocumentTemplate.municipalities.through.objects.filter(
+        documenttemplate_id=tmpl.pk, municipality_id=muni.pk
+    ).exists()
 
 
 class DynamicFieldLibrary(models.Model):
@@ -248,6 +400,8 @@ class WorkItem(models.Model):
     ]
     citizen = models.ForeignKey(Citizen, on_delete=models.CASCADE, related_name="work_items")
     template = models.ForeignKey(DocumentTemplate, on_delete=models.CASCADE, related_name="work_items")
+    # revizia template-ului de la creare; lucrarea se randeaza mereu cu ea, chiar daca template-ul e editat
+    revision = models.ForeignKey(DocumentTemplateRevision, null=True, blank=True, on_delete=models.SET_NULL, related_name="work_items")
     municipality = models.ForeignKey(Municipality, null=True, blank=True, on_delete=models.SET_NULL, related_name="work_items")
     created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name="work_items_created")
     output_type = models.CharField(max_length=10, choices=DocumentTemplate.OUTPUT_CHOICES, default="pdf")
@@ -263,6 +417,12 @@ class WorkItem(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        # lista de lucrari: pe primarie, optional pe status, cele mai noi primele
+        indexes = [
+            models.Index(fields=["municipality", "status", "-created_at"], name="workitem_muni_status_idx"),
+            models.Index(fields=["municipality", "-created_at"], name="workitem_muni_created_idx"),
+            models.Index(fields=["citizen", "-created_at"], name="workitem_citizen_created_idx"),
+        ]
 
     def __str__(self):
         return f"Lucru {self.template.name} pentru {self.citizen.full_name}"
@@ -278,11 +438,27 @@ class StaffNotification(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        # marcarea ca citite cauta doar printre necitite (user, optional work_item)
+        indexes = [
+            models.Index(
+                fields=["user", "work_item"], condition=models.Q(is_read=False), name="staffnotif_user_unread_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.user.username}"
 
 
+class StaffUnreadCounter(models.Model):
+    # notificari necitite per utilizator staff, mentinute de core.unread
+    user = models.OneToOneField(User, primary_key=True, on_delete=models.CASCADE, related_name="unread_counter")
+    notifications = models.IntegerField(default=0)
+    leave_notifications = models.IntegerField(default=0)  # fara lucrare asociata (concedii)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.notifications}"
+
+
 class LegalHoliday(models.Model):
     date = models.DateField()
     label = models.CharField(max_length=150)
@@ -320,6 +496,11 @@ class LeaveRequest(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # suprapuneri si zile folosite pe an: cetatean + status, interval pe start_date
+            models.Index(fields=["citizen", "status", "start_date"], name="leave_citizen_status_idx"),
+            models.Index(fields=["citizen", "-created_at"], name="leave_citizen_created_idx"),
+        ]
 
     def __str__(self):
         return f"Concediu {self.citizen.full_name} ({self.start_date} - {self.end_date})"
@@ -333,9 +514,30 @@ class GeneratedDocument(models.Model):
     output_type = models.CharField(max_length=10)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # documentele recente ale cetateanului (dashboard, cont primarie)
+        indexes = [models.Index(fields=["citizen", "-created_at"], name="gendoc_citizen_created_idx")]
+
     def __str__(self):
         return f"{self.template.name} pentru {self.citizen.full_name}"
 
+    def download_content_type(self):
+        return "application/pdf" if self.output_type == "pdf" else "application/msword"
+
+    def download_name(self):
+        ext = "pdf" if self.output_type == "pdf" else "doc"
+        return f"{self.template.slug}.{ext}"
+
+    def signed_file_url(self, disposition="attachment"):
+        if not self.file:
+            return ""
+        return signed_media_url(
+            self.file.name,
+            disposition=disposition,
+            content_type=self.download_content_type(),
+            filename=self.download_name(),
+        )
+
 
 class Notification(models.Model):
     citizen = models.ForeignKey(
@@ -348,6 +550,10 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["citizen", "-created_at"], name="notif_citizen_created_idx"),
+            models.Index(fields=["citizen"], condition=models.Q(is_read=False), name="notif_citizen_unread_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.citizen.full_name}"
@@ -373,10 +579,20 @@ class Message(models.Model):
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            # conversatia activa, cele mai noi primele
+            models.Index(fields=["citizen", "chat_thread", "-created_at"], name="msg_thread_created_idx"),
+            # marcari ca citite si reconcilierea contoarelor ating doar mesajele necitite
+            models.Index(fields=["citizen"], condition=models.Q(read_by_staff=False), name="msg_unread_staff_idx"),
+            models.Index(fields=["citizen"], condition=models.Q(read_by_citizen=False), name="msg_unread_citizen_idx"),
+        ]
 
     def __str__(self):
         return f"{self.sender} -> {self.citizen.full_name}"
 
+    def signed_attachment_url(self, ttl=None):
+        return signed_media_url(self.attachment.name, disposition="inline", ttl=ttl) if self.attachment else ""
+
 
 class ChatThread(models.Model):
     citizen = models.ForeignKey(
@@ -443,3 +659,58 @@ class SuperAdminCode(models.Model):
 
     def __str__(self):
         return f"SuperCode {self.code}"
+
+
+class CitizenImportJob(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Verificare duplicate"),
+        ("confirm", "Asteapta confirmare"),
+        ("queued", "In asteptare"),
+        ("running", "In lucru"),
+        ("done", "Finalizat"),
+        ("failed", "Esuat"),
+        ("cancelled", "Anulat"),
+    ]
+    MODE_CHOICES = [
+        ("", "Nestabilit"),
+        ("overwrite", "Rescrie existente"),
+        ("skip", "Omite existente"),
+        ("sync", "Sincronizare (doar randurile modificate)"),
+    ]
+
+    municipality = models.ForeignKey(
+        Municipality, null=True, blank=True, on_delete=models.SET_NULL, related_name="citizen_imports"
+    )
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    file_name = models.CharField(max_length=255, blank=True)
+    # copia fisierului urcat, in CITIZEN_IMPORT_SPOOL_DIR; stearsa la final
+    spool_path = models.CharField(max_length=500)
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending", db_index=True)
+    # simulare: se numara ce s-ar scrie, fara modificari in baza de date
+    dry_run = models.BooleanField(default=False)
+    # checkpoint: randuri din fisier deja scrise (in aceeasi tranzactie cu bucata respectiva)
+    rows_done = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    unchanged_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    duplicates = models.JSONField(default=list, blank=True)
+    duplicate_count = models.PositiveIntegerField(default=0)
+    failure = models.TextField(blank=True)
+    worker_token = models.CharField(max_length=32, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Import {self.file_name} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in {"done", "failed", "cancelled"}
@@ -0,0 +1,129 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .citizen_search import INDEXED_FIELDS, index_citizens, remove_citizens
+from .field_catalog import invalidate_field_catalog
+from .models import (
+    Citizen,
+    DocumentTemplate,
+    DynamicFieldLibrary,
+    ExtraFieldDefinition,
+    Message,
+    Municipality,
+    Notification,
+    StaffNotification,
+)
+from . import unread
+
+TemplateMunicipality = DocumentTemplate.municipalities.through
+
+
+def refresh_template_visibility(template_ids):
+    template_ids = list(template_ids)
+    if not template_ids:
+        return
+    assigned = set(
+        TemplateMunicipality.objects.filter(documenttemplate_id__in=template_ids).values_list(
+            "documenttemplate_id", flat=True
+        )
+    )
+    DocumentTemplate.objects.filter(pk__in=[t for t in template_ids if t in assigned]).update(is_global=False)
+    DocumentTemplate.objects.filter(pk__in=[t for t in template_ids if t not in assigned]).update(is_global=True)
+
+
+def _assigned_template_ids(muni_id):
+    return list(
+        TemplateMunicipality.objects.filter(municipality_id=muni_id).values_list("documenttemplate_id", flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=TemplateMunicipality)
+def sync_template_visibility(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in {"post_add", "post_remove", "post_clear"}:
+            refresh_template_visibility([instance.pk])
+            instance.is_global = DocumentTemplate.objects.filter(pk=instance.pk).values_list("is_global", flat=True).first()
+        return
+    # modificari facute din partea primariei (municipality.templates.add/remove/clear)
+    if action == "pre_clear":
+        instance._cleared_template_ids = _assigned_template_ids(instance.pk)
+    elif action == "post_clear":
+        refresh_template_visibility(getattr(instance, "_cleared_template_ids", []))
+    elif action in {"post_add", "post_remove"}:
+        refresh_template_visibility(pk_set or [])
+
+
+@receiver(pre_delete, sender=Municipality)
+def remember_municipality_templates(sender, instance, **kwargs):
+    instance._cleared_template_ids = _assigned_template_ids(instance.pk)
+
+
+@receiver(post_delete, sender=Municipality)
+def sync_visibility_after_municipality_delete(sender, instance, **kwargs):
+    refresh_template_visibility(getattr(instance, "_cleared_template_ids", []))
+
+
+@receiver(post_save, sender=ExtraFieldDefinition)
+@receiver(post_delete, sender=ExtraFieldDefinition)
+@receiver(post_save, sender=DynamicFieldLibrary)
+@receiver(post_delete, sender=DynamicFieldLibrary)
+def refresh_field_catalog(sender, **kwargs):
+    invalidate_field_catalog()
+
+
+@receiver(post_save, sender=Citizen)
+def sync_citizen_search(sender, instance, update_fields=None, **kwargs):
+    # importurile in bloc nu emit semnale si apeleaza index_citizens direct
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    index_citizens([instance])
+
+
+@receiver(post_save, sender=Citizen)
+def move_citizen_unread_chat(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not {"municipality", "municipality_id"}.intersection(update_fields):
+        return
+    old_muni_id = getattr(instance, "_saved_municipality_id", instance.municipality_id)
+    instance._saved_municipality_id = instance.municipality_id
+    if not created and old_muni_id != instance.municipality_id:
+        unread.citizen_moved(instance.pk, old_muni_id, instance.municipality_id)
+
+
+@receiver(post_delete, sender=Citizen)
+def remove_citizen_from_search(sender, instance, **kwargs):
+    remove_citizens([instance.pk])
+
+
+# contoare de necitite: crearile/stergerile individuale; marcarile ca citite si crearile in bloc
+# actualizeaza contoarele direct (vezi core.unread)
+@receiver(post_save, sender=Message)
+def count_new_message(sender, instance, created, **kwargs):
+    if created:
+        unread.message_added(instance)
+
+
+@receiver(post_delete, sender=Message)
+def uncount_deleted_message(sender, instance, **kwargs):
+    unread.message_removed(instance)
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    if created:
+        unread.notification_added(instance)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    unread.notification_removed(instance)
+
+
+@receiver(post_save, sender=StaffNotification)
+def count_new_staff_notification(sender, instance, created, **kwargs):
+    if created:
+        unread.staff_notifications_added([instance])
+
+
+@receiver(post_delete, sender=StaffNotification)
+def uncount_deleted_staff_notification(sender, instance, **kwargs):
+    unread.staff_notifications_added([instance], delta=-1)
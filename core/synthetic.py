@@ -0,0 +1,443 @@
+import io
+import random
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .citizen_search import rebuild_index
+from .models import (
+    ChatThread,
+    Citizen,
+    DocumentTemplate,
+    DynamicFieldLibrary,
+    ExtraFieldDefinition,
+    GeneratedDocument,
+    LeaveRequest,
+    LegalHoliday,
+    Message,
+    Municipality,
+    MunicipalityAdmin,
+    WorkItem,
+)
+from .unread import reconcile_counters
+
+# Date sintetice pentru teste de incarcare (manage.py generate_synthetic_data). Totul se scrie cu
+# bulk_create in bucati; semnalele nu ruleaza, deci indexul de cautare si contoarele de necitite
+# se reconstruiesc o singura data la final.
+
+CNP_CONTROL_KEY = "279146358279"
+CNP_COUNTIES = [f"{n:02d}" for n in range(1, 47)]
+CNP_BIRTH_START = date(1950, 1, 1)
+CNP_BIRTH_DAYS = 25000  # ~1950-2018; pasul 13 este prim cu 25000, deci indicii raman distincti
+
+FIRST_NAMES = [
+    "Ion", "Maria", "Andrei", "Elena", "Mihai", "Ioana", "Alexandru", "Ana", "Gheorghe", "Cristina",
+    "Vasile", "Mihaela", "Stefan", "Gabriela", "Florin", "Daniela", "Adrian", "Roxana", "Nicolae", "Alina",
+]
+LAST_NAMES = [
+    "Popescu", "Ionescu", "Popa", "Pop", "Radu", "Dumitru", "Stan", "Stoica", "Gheorghe", "Matei",
+    "Ciobanu", "Rusu", "Munteanu", "Constantin", "Marin", "Moldovan", "Lazar", "Florea", "Dinu", "Tudor",
+]
+STREETS = ["Principala", "Scolii", "Bisericii", "Morii", "Garii", "Libertatii", "Unirii", "Florilor"]
+COUNTIES = ["Alba", "Arges", "Bacau", "Bihor", "Brasov", "Cluj", "Dolj", "Iasi", "Prahova", "Timis"]
+VILLAGES = ["Deal", "Vale", "Lunca", "Poiana", "Campeni", "Salcia", "Izvoare", "Padureni"]
+JOBS = ["Referent", "Inspector", "Consilier", "Muncitor", "Sofer", "Asistent social", "Contabil"]
+CHAT_LINES = [
+    "Buna ziua, am nevoie de o adeverinta.",
+    "Documentul este gata, il gasiti in cont.",
+    "Cand pot trece pe la ghiseu?",
+    "Programul este luni-vineri, 8-16.",
+    "Multumesc frumos!",
+    "Va rog sa completati datele din profil.",
+]
+# sarbatori legale cu data fixa; cele mobile (Paste, Rusalii) nu conteaza pentru volum
+FIXED_HOLIDAYS = [
+    (1, 1, "Anul Nou"), (1, 2, "Anul Nou"), (1, 24, "Ziua Unirii Principatelor Romane"),
+    (5, 1, "Ziua Muncii"), (6, 1, "Ziua Copilului"), (8, 15, "Adormirea Maicii Domnului"),
+    (11, 30, "Sfantul Andrei"), (12, 1, "Ziua Nationala"), (12, 25, "Craciunul"), (12, 26, "Craciunul"),
+]
+TEMPLATE_DYNAMIC_FIELDS = [
+    {"key": "motiv", "label": "Motivul cererii", "length": 40, "type": "text", "options": ""},
+    {"key": "numar_inregistrare", "label": "Numar inregistrare", "length": 10, "type": "text", "options": ""},
+    {"key": "data_cererii", "label": "Data cererii", "length": 10, "type": "date", "options": ""},
+    {"key": "tip_act", "label": "Tip act", "length": 20, "type": "select", "options": "Adeverinta,Certificat"},
+]
+TEMPLATE_BODY = (
+    "<p>{{ municipality_name }}</p>"
+    "<h2>__NAME__</h2>"
+    "<p>Subsemnatul(a) {{ full_name }}, CNP {{ cnp }}, domiciliat(a) in {{ localitate }}, "
+    "str. {{ strada }} nr. {{ nr }}, judetul {{ judet }}, solicit {{ tip_act }} pentru {{ motiv }}.</p>"
+    "<p>Nr. {{ numar_inregistrare }} din {{ data_cererii }}</p>"
+    "<p>Data: {{ current_date }}</p>"
+)
+SAMPLE_DOCUMENT = "generated_docs/sintetic/document.pdf"
+SAMPLE_ATTACHMENT = "chat_attachments/sintetic/atasament.txt"
+
+
+def cnp_control_digit(first12: str):
+    total = sum(int(d) * int(k) for d, k in zip(first12, CNP_CONTROL_KEY)) % 11
+    return "1" if total == 10 else str(total)
+
+
+def synthetic_cnp(index: int):
+    """CNP cu format si cifra de control valide; indici diferiti dau CNP-uri diferite (pana la ~1 miliard)."""
+    serial = index % 999 + 1
+    rest = index // 999
+    county = CNP_COUNTIES[rest % len(CNP_COUNTIES)]
+    birth = CNP_BIRTH_START + timedelta(days=(rest // len(CNP_COUNTIES)) * 13 % CNP_BIRTH_DAYS)
+    male = index % 2 == 0
+    if birth.year < 2000:
+        sex = "1" if male else "2"
+    else:
+        sex = "5" if male else "6"
+    first12 = f"{sex}{birth:%y%m%d}{county}{serial:03d}"
+    return first12 + cnp_control_digit(first12)
+
+
+SYNTHETIC_DEFAULTS = {
+    "municipalities": 3,
+    "citizens": 1000,  # per primarie
+    "admins": 1,  # per primarie
+    "user_ratio": 1.0,  # ce parte din cetateni primeste cont de autentificare
+    "templates": 10,
+    "extra_fields": ("sat", "functie"),
+    "threads": 1,  # per cetatean cu cont
+    "messages": 4,  # per conversatie
+    "attachment_every": 10,  # al catelea mesaj are atasament (0 = niciunul)
+    "leave_requests": 2,  # per cetatean
+    "work_items": 1,
+    "documents": 2,
+    "batch_size": 2000,
+    "password": "parola-sintetica",
+    "prefix": "Sintetic",
+    "seed": 0,
+}
+
+
+def _header_image(text: str, size, color):
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", size, color)
+    ImageDraw.Draw(image).text((10, size[1] // 2 - 6), text, fill="white")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return ContentFile(buffer.getvalue())
+
+
+def _sample_files():
+    # un singur fisier pe disc, refolosit de toate documentele / atasamentele generate
+    if not default_storage.exists(SAMPLE_DOCUMENT):
+        from xhtml2pdf import pisa
+
+        pdf = io.BytesIO()
+        pisa.CreatePDF("<p>Document sintetic pentru teste de incarcare.</p>", dest=pdf)
+        default_storage.save(SAMPLE_DOCUMENT, ContentFile(pdf.getvalue()))
+    if not default_storage.exists(SAMPLE_ATTACHMENT):
+        default_storage.save(SAMPLE_ATTACHMENT, ContentFile(b"Atasament sintetic.\n"))
+
+
+class SyntheticDataGenerator:
+    def __init__(self, log=None, **options):
+        unknown = set(options) - set(SYNTHETIC_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Optiuni necunoscute: {', '.join(sorted(unknown))}")
+        options = SimpleNamespace(**{**SYNTHETIC_DEFAULTS, **options})
+        self.options = options
+        self.rng = random.Random(options.seed)
+        self.log = log or (lambda message: None)
+        # aceeasi parola pentru toate conturile: un singur hash (PBKDF2 per utilizator ar dura ore)
+        self.password_hash = make_password(options.password)
+        self.next_cnp_index = Citizen.objects.count()
+        self.stats = {}
+
+    def _count(self, key, n):
+        self.stats[key] = self.stats.get(key, 0) + n
+
+    def run(self):
+        started = time.perf_counter()
+        _sample_files()
+        self._holidays()
+        self._extra_definitions()
+        munis = self._municipalities()
+        templates, workflow_templates = self._templates(munis)
+        for muni in munis:
+            admins = self._admins(muni)
+            remaining = self.options.citizens
+            while remaining > 0:
+                size = min(self.options.batch_size, remaining)
+                with transaction.atomic():
+                    self._citizen_batch(muni, admins, size, templates, workflow_templates)
+                remaining -= size
+                self.log(f"{muni.name}: {self.options.citizens - remaining}/{self.options.citizens} cetateni")
+        self.log("Reconstruire index de cautare si contoare de necitite...")
+        rebuild_index()
+        reconcile_counters()
+        self.stats["seconds"] = round(time.perf_counter() - started, 1)
+        return self.stats
+
+    def _holidays(self):
+        year = timezone.now().year
+        wanted = {date(y, m, d): label for y in (year, year + 1) for m, d, label in FIXED_HOLIDAYS}
+        existing = set(LegalHoliday.objects.filter(municipality=None, date__in=wanted).values_list("date", flat=True))
+        rows = [LegalHoliday(date=day, label=label) for day, label in wanted.items() if day not in existing]
+        LegalHoliday.objects.bulk_create(rows)
+        self._count("holidays", len(rows))
+
+    def _extra_definitions(self):
+        existing = set(ExtraFieldDefinition.objects.values_list("name", flat=True))
+        ExtraFieldDefinition.objects.bulk_create(
+            [
+                ExtraFieldDefinition(name=key, label=key.title())
+                for key in self.options.extra_fields
+                if key not in existing
+            ]
+        )
+
+    def _municipalities(self):
+        prefix = self.options.prefix
+        start = Municipality.objects.filter(name__startswith=f"{prefix} ").count()
+        munis = []
+        for n in range(start + 1, start + self.options.municipalities + 1):
+            county = self.rng.choice(COUNTIES)
+            muni = Municipality.objects.create(
+                name=f"{prefix} {n:03d}",
+                street="Principala",
+                number=str(n),
+                city=f"Comuna {prefix} {n}",
+                county=county,
+                postal_code=f"{self.rng.randint(100000, 999999)}",
+                cif=f"RO{self.rng.randint(1000000, 99999999)}",
+                email=f"primaria{n}@{slugify(prefix)}.example",
+                phone=f"02{self.rng.randint(10000000, 99999999)}",
+                mayor_name=f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}",
+            )
+            color = tuple(self.rng.randint(0, 160) for _ in range(3))
+            muni.header_logo.save(f"{muni.slug}-logo.png", _header_image(muni.name, (120, 120), color), save=False)
+            muni.header_banner.save(f"{muni.slug}-banner.png", _header_image(muni.name, (800, 120), color), save=False)
+            muni.save(update_fields=["header_logo", "header_banner"])
+            munis.append(muni)
+        self._count("municipalities", len(munis))
+        return munis
+
+    def _templates(self, munis):
+        keys = [f["key"] for f in TEMPLATE_DYNAMIC_FIELDS]
+        library = set(DynamicFieldLibrary.objects.filter(key__in=keys).values_list("key", flat=True))
+        DynamicFieldLibrary.objects.bulk_create(
+            [
+                DynamicFieldLibrary(key=f["key"], label=f["label"], length=f["length"])
+                for f in TEMPLATE_DYNAMIC_FIELDS
+                if f["key"] not in library
+            ]
+        )
+        generate, workflow = [], []
+        # numele (si slug-ul, unic) include prima primarie a rularii, ca rularile repetate sa nu se ciocneasca
+        run = munis[0].name if munis else f"{self.options.prefix} {timezone.now():%Y%m%d%H%M%S}"
+        for n in range(1, self.options.templates + 1):
+            name = f"Document {run} {n}"
+            kind = "workflow" if n % 3 == 0 else "generate"
+            tmpl = DocumentTemplate.objects.create(
+                name=name,
+                body_html=TEMPLATE_BODY.replace("__NAME__", name),
+                template_type=kind,
+                output_type="word" if n % 4 == 0 else "pdf",
+                # 1-4 campuri dinamice, prin rotatie, ca fiecare tip de camp sa apara si la generare
+                dynamic_fields=[
+                    TEMPLATE_DYNAMIC_FIELDS[(n + k) % len(TEMPLATE_DYNAMIC_FIELDS)]
+                    for k in range(1 + n % len(TEMPLATE_DYNAMIC_FIELDS))
+                ],
+            )
+            # o parte sunt atribuite doar unor primarii, restul raman globale
+            if n % 2 == 0 and munis:
+                tmpl.municipalities.set(self.rng.sample(munis, max(1, len(munis) // 2)))
+            (workflow if kind == "workflow" else generate).append(tmpl)
+        self._count("templates", len(generate) + len(workflow))
+        return generate or workflow, workflow or generate
+
+    def _admins(self, muni):
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=f"{muni.slug}-admin{n}",
+                    email=f"{muni.slug}-admin{n}@example.com",
+                    password=self.password_hash,
+                    is_staff=True,
+                )
+                for n in range(1, self.options.admins + 1)
+            ]
+        )
+        MunicipalityAdmin.objects.bulk_create([MunicipalityAdmin(user=user, municipality=muni) for user in users])
+        self._count("admins", len(users))
+        return users
+
+    def _next_cnps(self, size):
+        # sar peste CNP-urile deja folosite (rulari anterioare sau date reale)
+        cnps = []
+        while len(cnps) < size:
+            candidates = [synthetic_cnp(self.next_cnp_index + n) for n in range(size - len(cnps))]
+            self.next_cnp_index += len(candidates)
+            taken = set(Citizen.objects.filter(cnp__in=candidates).values_list("cnp", flat=True))
+            taken |= set(User.objects.filter(username__in=candidates).values_list("username", flat=True))
+            cnps.extend(cnp for cnp in candidates if cnp not in taken)
+        return cnps
+
+    def _citizen_batch(self, muni, admins, size, templates, workflow_templates):
+        rng, opts = self.rng, self.options
+        cnps = self._next_cnps(size)
+        with_user = [rng.random() < opts.user_ratio for _ in cnps]
+        users = User.objects.bulk_create(
+            [
+                User(username=cnp, email=f"{cnp}@example.com", password=self.password_hash)
+                for cnp, has_user in zip(cnps, with_user)
+                if has_user
+            ]
+        )
+        users_by_cnp = {user.username: user for user in users}
+
+        citizens = []
+        for cnp in cnps:
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            extra = {key: self._extra_value(key) for key in opts.extra_fields}
+            citizen = Citizen(
+                full_name=f"{last} {first}",
+                nume=last,
+                prenume=first,
+                cnp=cnp,
+                identifier=f"{muni.slug[:10]}-{cnp[-6:]}",
+                municipality=muni,
+                user=users_by_cnp.get(cnp),
+                strada=rng.choice(STREETS),
+                nr=str(rng.randint(1, 250)),
+                localitate=muni.city,
+                judet=muni.county,
+                telefon=f"07{rng.randint(10000000, 99999999)}",
+                email_recuperare=f"{cnp}@example.com",
+                email_recuperare_verified=True,
+                contract_start=date(rng.randint(2010, 2024), rng.randint(1, 12), 1),
+                extra=extra,
+            )
+            # acelasi payload si fingerprint ca in Citizen.save()
+            citizen.data = {**citizen.build_data_payload(include_extra=False), **extra}
+            citizen.import_fingerprint = citizen.compute_import_fingerprint()
+            citizens.append(citizen)
+        Citizen.objects.bulk_create(citizens)
+        self._count("citizens", len(citizens))
+        self._count("users", len(users))
+
+        self._chat(citizens, admins)
+        self._leave_requests(citizens, muni)
+        if templates:
+            self._documents(citizens, templates)
+            self._work_items(citizens, muni, workflow_templates, admins)
+
+    def _extra_value(self, key):
+        if key == "sat":
+            return self.rng.choice(VILLAGES)
+        if key == "functie":
+            return self.rng.choice(JOBS)
+        return f"{key}-{self.rng.randint(1, 100)}"
+
+    def _chat(self, citizens, admins):
+        opts, rng = self.options, self.rng
+        citizens = [c for c in citizens if c.user_id]
+        if not (citizens and admins and opts.threads and opts.messages):
+            return
+        threads = ChatThread.objects.bulk_create(
+            [
+                ChatThread(citizen=c, created_by=c.user, title=f"Conversatie {n + 1}")
+                for c in citizens
+                for n in range(opts.threads)
+            ],
+            batch_size=opts.batch_size,
+        )
+        messages = []
+        for thread in threads:
+            # cine scrie primul alterneaza, deci ultimul mesaj ramane necitit fie de staff, fie de cetatean
+            first = rng.randint(0, 1)
+            for n in range(opts.messages):
+                from_citizen = (n + first) % 2 == 0
+                last = n == opts.messages - 1
+                message = Message(
+                    citizen_id=thread.citizen_id,
+                    chat_thread=thread,
+                    sender_id=thread.created_by_id if from_citizen else rng.choice(admins).pk,
+                    text=rng.choice(CHAT_LINES),
+                    # ultimul mesaj din conversatie ramane necitit de cealalta parte
+                    read_by_staff=not (from_citizen and last),
+                    read_by_citizen=from_citizen or not last,
+                )
+                if opts.attachment_every and (len(messages) + 1) % opts.attachment_every == 0:
+                    message.attachment = SAMPLE_ATTACHMENT
+                messages.append(message)
+        Message.objects.bulk_create(messages, batch_size=opts.batch_size)
+        self._count("chat_threads", len(threads))
+        self._count("messages", len(messages))
+
+    def _leave_requests(self, citizens, muni):
+        opts, rng = self.options, self.rng
+        year = timezone.now().year
+        rows = []
+        for citizen in citizens:
+            for _ in range(opts.leave_requests):
+                start = date(year, 1, 1) + timedelta(days=rng.randint(0, 350))
+                while start.weekday() >= 5:
+                    start += timedelta(days=1)
+                days = rng.randint(1, 5)
+                end = start + timedelta(days=days - 1)
+                rows.append(
+                    LeaveRequest(
+                        citizen=citizen,
+                        municipality=muni,
+                        created_by=citizen.user,
+                        start_date=start,
+                        end_date=end,
+                        days_requested=sum(1 for d in range(days) if (start + timedelta(days=d)).weekday() < 5),
+                        status=rng.choice(["pending", "approved", "approved", "rejected"]),
+                    )
+                )
+        LeaveRequest.objects.bulk_create(rows, batch_size=opts.batch_size)
+        self._count("leave_requests", len(rows))
+
+    def _documents(self, citizens, templates):
+        opts, rng = self.options, self.rng
+        rows = [
+            GeneratedDocument(citizen=c, template=rng.choice(templates), file=SAMPLE_DOCUMENT, output_type="pdf")
+            for c in citizens
+            for _ in range(opts.documents)
+        ]
+        GeneratedDocument.objects.bulk_create(rows, batch_size=opts.batch_size)
+        self._count("documents", len(rows))
+
+    def _work_items(self, citizens, muni, templates, admins):
+        opts, rng = self.options, self.rng
+        rows = []
+        for citizen in citizens:
+            for _ in range(opts.work_items):
+                tmpl = rng.choice(templates)
+                rows.append(
+                    WorkItem(
+                        citizen=citizen,
+                        template=tmpl,
+                        revision_id=tmpl.current_revision_id,
+                        municipality=muni,
+                        created_by=citizen.user or (rng.choice(admins) if admins else None),
+                        output_type=tmpl.output_type,
+                        dynamic_values={"motiv": "angajare"},
+                        rendered_html=f"<p>{citizen.full_name}</p>",
+                        status=rng.choice(["pending", "in_progress", "completed"]),
+                    )
+                )
+        WorkItem.objects.bulk_create(rows, batch_size=opts.batch_size)
+        self._count("work_items", len(rows))
+
+
+def generate_synthetic_data(log=None, **options):
+    """Genereaza setul de date (optiuni: SYNTHETIC_DEFAULTS); intoarce numarul de randuri pe tip."""
+    return SyntheticDataGenerator(log=log, **options).run()
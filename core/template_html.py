@@ -0,0 +1,269 @@
+import html
+import re
+from html.parser import HTMLParser
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "wbr"}
+RAW_TEXT_TAGS = {"pre", "textarea", "script", "style"}
+# elemente pe care le putem rescrie fara sa schimbam aspectul documentului
+MERGEABLE_ATTRS = {"style", "class"}
+# doar spatiile ASCII; \xa0 (nbsp) pastreaza alinierea din editor
+WHITESPACE_RE = re.compile(r"[ \t\r\n\f]+")
+# codul de template ({{ ... }}, {% ... %}, {# ... #}) ramane neatins; spatiile din filtre pot conta
+TEMPLATE_CODE_RE = re.compile(r"(\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\})", re.S)
+# proprietati mostenite care, cu valori absolute, dau acelasi rezultat pe un span sau pe doua imbricate
+NESTABLE_STYLE_PROPS = {"color", "font-family", "font-size", "font-style", "font-weight"}
+ABSOLUTE_FONT_SIZE_RE = re.compile(r"^\d+(\.\d+)?(px|pt|mm|cm|in)$")
+RELATIVE_VALUES = {"inherit", "initial", "unset", "revert", "currentcolor", "bolder", "lighter"}
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "raw_start", "raw_end", "children", "dirty")
+
+    def __init__(self, tag, attrs=None, raw_start="", raw_end=""):
+        self.tag = tag
+        self.attrs = attrs or []
+        self.raw_start = raw_start
+        self.raw_end = raw_end
+        self.children = []
+        self.dirty = False
+
+    def get(self, name):
+        for key, value in self.attrs:
+            if key == name:
+                return value
+        return None
+
+    def set(self, name, value):
+        self.attrs = [(k, v) for k, v in self.attrs if k != name]
+        if value:
+            self.attrs.append((name, value))
+        self.dirty = True
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.root = _Node(None)
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = _Node(tag, attrs, raw_start=self.get_starttag_text())
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.stack[-1].children.append(_Node(tag, attrs, raw_start=self.get_starttag_text()))
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        # HTML ne-echilibrat (ex: tag-uri deschise/inchise in ramuri {% if %}) -> nu optimizam
+        if len(self.stack) < 2 or self.stack[-1].tag != tag:
+            raise _Unsupported(tag)
+        self.stack.pop().raw_end = f"</{tag}>"
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+    def handle_entityref(self, name):
+        self.stack[-1].children.append(f"&{name};")
+
+    def handle_charref(self, name):
+        self.stack[-1].children.append(f"&#{name};")
+
+    def handle_comment(self, data):
+        # comentariile CKEditor/Word nu ajung in document
+        pass
+
+    def handle_decl(self, decl):
+        self.stack[-1].children.append(f"<!{decl}>")
+
+    def handle_pi(self, data):
+        self.stack[-1].children.append(f"<?{data}>")
+
+    def unknown_decl(self, data):
+        self.stack[-1].children.append(f"<![{data}]>")
+
+
+def _split_declarations(style: str):
+    """
+    Imparte un atribut style in declaratii, doar pe ";" din afara parantezelor si a ghilimelelor
+    (url(data:image/png;base64,...), font-family: "a;b"). None daca stilul nu este echilibrat.
+    """
+    parts, current, depth, quote = [], [], 0, None
+    for char in style:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            if depth == 0:
+                return None
+            depth -= 1
+        elif char == ";" and depth == 0:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    if quote or depth:
+        return None
+    parts.append("".join(current))
+    return parts
+
+
+def _normalize_style(style: str):
+    parts = _split_declarations(style)
+    if parts is None:
+        return style
+    declarations = {}
+    for part in parts:
+        if ":" not in part:
+            continue
+        prop, value = part.split(":", 1)
+        prop = prop.strip().lower()
+        value = value.strip()
+        if not any(q in value for q in "\"'("):
+            # in siruri si url(...) spatiile pot conta; in rest sunt doar separatori
+            value = WHITESPACE_RE.sub(" ", value)
+        if not (prop and value):
+            continue
+        previous = declarations.get(prop)
+        if previous and previous.lower().endswith("!important") and not value.lower().endswith("!important"):
+            continue  # declaratia !important castiga oricum, indiferent de ordine
+        declarations.pop(prop, None)
+        declarations[prop] = value
+    return ";".join(f"{p}:{v}" for p, v in declarations.items())
+
+
+def _collapse_whitespace(text: str):
+    parts = TEMPLATE_CODE_RE.split(text)
+    if any("{{" in part or "{%" in part for part in parts[::2]):
+        return text  # cod de template neinchis in acest text -> nu riscam
+    parts[::2] = [WHITESPACE_RE.sub(" ", part) for part in parts[::2]]
+    return "".join(parts)
+
+
+def _nestable_style(style: str, outer=False):
+    """
+    Daca doua span-uri imbricate pot deveni unul: doar proprietati mostenite cu valori absolute
+    (2em in 2em inseamna 4em, padding-ul dublat inseamna doua chenare), fara !important pe cel exterior.
+    """
+    parts = _split_declarations(style or "")
+    if parts is None:
+        return False
+    for part in parts:
+        if not part.strip():
+            continue
+        if ":" not in part:
+            return False
+        prop, value = (x.strip().lower() for x in part.split(":", 1))
+        if prop not in NESTABLE_STYLE_PROPS or value in RELATIVE_VALUES:
+            return False
+        if value.endswith("!important"):
+            if outer:
+                return False
+            value = value[: -len("!important")].strip()
+        if prop == "font-size" and not ABSOLUTE_FONT_SIZE_RE.match(value):
+            return False
+    return True
+
+
+def _is_templated(node: _Node):
+    return any(v and "{" in v for _k, v in node.attrs)
+
+
+def _only_mergeable_attrs(node: _Node):
+    return all(k in MERGEABLE_ATTRS for k, _v in node.attrs)
+
+
+def _simplify(node: _Node, in_raw_text=False):
+    children = []
+    for child in node.children:
+        if isinstance(child, str):
+            if children and isinstance(children[-1], str):
+                children[-1] += child
+            elif child:
+                children.append(child)
+            continue
+        _simplify(child, in_raw_text or child.tag in RAW_TEXT_TAGS)
+        if child.tag == "span" and not _is_templated(child):
+            if not child.children and _only_mergeable_attrs(child):
+                continue  # span gol
+            if not child.attrs:
+                # <span>text</span> fara atribute -> doar continutul
+                for grandchild in child.children:
+                    if isinstance(grandchild, str) and children and isinstance(children[-1], str):
+                        children[-1] += grandchild
+                    else:
+                        children.append(grandchild)
+                continue
+            if (
+                len(child.children) == 1
+                and isinstance(child.children[0], _Node)
+                and child.children[0].tag == "span"
+                and all(k == "style" for k, _v in child.attrs + child.children[0].attrs)
+                and not _is_templated(child.children[0])
+                and _nestable_style(child.get("style"), outer=True)
+                and _nestable_style(child.children[0].get("style"))
+            ):
+                # <span a><span b>x</span></span> -> <span a;b>x</span> (stilul interior castiga)
+                inner = child.children[0]
+                inner.set("style", ";".join(s for s in (child.get("style"), inner.get("style")) if s))
+                child = inner
+        if child.tag == "p" and not child.children and _only_mergeable_attrs(child):
+            continue  # <p></p> fara continut nu ocupa spatiu
+        if child.get("style") is not None and not _is_templated(child):
+            child.set("style", _normalize_style(child.get("style")))
+        children.append(child)
+    if not in_raw_text:
+        # textul se comprima dupa unire: entitatile si span-urile scoase il impart in bucati
+        children = [_collapse_whitespace(c) if isinstance(c, str) else c for c in children]
+    node.children = children
+
+
+def _serialize(node: _Node, out: list):
+    for child in node.children:
+        if isinstance(child, str):
+            out.append(child)
+            continue
+        if child.dirty:
+            attrs = "".join(
+                f" {k}" if v is None else f' {k}="{html.escape(v, quote=True)}"' for k, v in child.attrs
+            )
+            out.append(f"<{child.tag}{attrs}>")
+        else:
+            out.append(child.raw_start)
+        _serialize(child, out)
+        out.append(child.raw_end)
+
+
+def minify_template_html(body: str):
+    """
+    Curata HTML-ul produs de CKEditor inainte de randare: comentarii, span-uri goale sau
+    imbricate, paragrafe goale, spatii multiple, declaratii duplicate din style. Stilurile raman
+    inline (o clasa ar pierde in cascada fata de alte reguli). Daca HTML-ul nu este echilibrat,
+    se intoarce neschimbat.
+    """
+    if not body:
+        return body or ""
+    builder = _TreeBuilder()
+    try:
+        builder.feed(body)
+        builder.close()
+    except _Unsupported:
+        return body
+    if len(builder.stack) != 1:
+        return body
+    root = builder.root
+    _simplify(root)
+    out = []
+    _serialize(root, out)
+    return "".join(out).strip()
@@ -1,3 +1,1108 @@
-from django.test import TestCase
+import base64
+import csv
+import html
+import io
+import json
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import date
+from html.parser import HTMLParser
+from unittest import mock
+from urllib.parse import parse_qs, urlencode, urlsplit
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, models, transaction
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import (
+    AdminInvite,
+    ChatThread,
+    Citizen,
+    CitizenImportJob,
+    DocumentTemplate,
+    DocumentTemplateRevision,
+    DynamicFieldLibrary,
+    ExtraFieldDefinition,
+    GeneratedDocument,
+    LeaveRequest,
+    Message,
+    Municipality,
+    MunicipalityAdmin,
+    Notification,
+    StaffNotification,
+    WorkItem,
+    normalize_template_body,
+    visible_templates,
+)
+from .citizen_import import (
+    _import_rows,
+    _JobLost,
+    _owned,
+    claim_job,
+    create_import_job,
+    iter_citizen_rows,
+    process_import_job,
+    run_citizen_import,
+)
+from .citizen_search import search_citizens
+from .media import signed_media_url
+from .template_html import minify_template_html
+from .views import TEMPLATE_BUNDLE_BODY_MAX_BYTES
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix="citizen-doc-tests-")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class QueryBudgetTests(TestCase):
+    """
+    Numarul de interogari per cerere, pentru fiecare URL din core/urls.py si fiecare rol (plus lista
+    de template-uri din admin). Fiecare pagina se masoara pe setul initial si din nou dupa ce fiecare
+    tabela primeste mai multe randuri: numarul nu are voie sa creasca (N+1) si ramane sub buget.
+    """
+
+    # randuri adaugate per primarie la fiecare crestere a setului de date
+    BATCH = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.munis = [Municipality.objects.create(name=f"Primaria {n}") for n in (1, 2)]
+        cls.muni = cls.munis[0]
+        cls.superadmin = User.objects.create_superuser("root", "root@example.com", "x")
+        cls.staff = User.objects.create_user("admin1", "admin1@example.com", "x", is_staff=True)
+        MunicipalityAdmin.objects.create(user=cls.staff, municipality=cls.muni)
+        for muni in cls.munis[1:]:
+            other = User.objects.create_user(f"admin-{muni.slug}", is_staff=True)
+            MunicipalityAdmin.objects.create(user=other, municipality=muni)
+        ExtraFieldDefinition.objects.create(name="sat", label="Sat")
+        DynamicFieldLibrary.objects.create(key="motiv", label="Motiv", length=20)
+
+        cls.template = DocumentTemplate.objects.create(
+            name="Adeverinta", body_html="<p>{{ full_name }} {{ cnp }} {{ motiv }}</p>", created_by=cls.superadmin
+        )
+        cls.workflow_template = DocumentTemplate.objects.create(
+            name="Cerere", body_html="<p>{{ full_name }}</p>", template_type="workflow"
+        )
+        cls.workflow_template.municipalities.set(cls.munis)
+        # formularul de completare si preview-ul cu campuri dinamice de tip select
+        cls.select_template = DocumentTemplate.objects.create(
+            name="Cerere motiv",
+            body_html="<p>{{ full_name }}: {{ motiv }} ({{ tip_act }})</p>",
+            dynamic_fields=[
+                {"key": "motiv", "label": "Motiv", "length": 20, "type": "select", "options": "Concediu, Angajare"},
+                {"key": "tip_act", "label": "Tip act", "length": 20, "type": "select", "options": "Adeverinta,Certificat"},
+            ],
+        )
+        DynamicFieldLibrary.objects.create(key="tip_act", label="Tip act", length=20)
+
+        cls.citizen_user = User.objects.create_user("1900101000001", "c@example.com", "x")
+        cls.citizen = Citizen.objects.create(
+            full_name="Ion Popescu",
+            nume="Popescu",
+            prenume="Ion",
+            cnp="1900101000001",
+            identifier="C-0",
+            municipality=cls.muni,
+            user=cls.citizen_user,
+            contract_start=date(2020, 1, 1),
+        )
+        cls.thread = ChatThread.objects.create(citizen=cls.citizen, created_by=cls.citizen_user, title="Intrebare")
+        cls.document = GeneratedDocument.objects.create(
+            citizen=cls.citizen, template=cls.template, file="generated_docs/adeverinta.pdf", output_type="pdf"
+        )
+        # fisierul livrat prin link semnat (signed_media)
+        default_storage.save(cls.document.file.name, ContentFile(b"%PDF-1.4\n"))
+        cls.work_item = WorkItem.objects.create(
+            citizen=cls.citizen,
+            template=cls.workflow_template,
+            revision=cls.workflow_template.current_revision,
+            municipality=cls.muni,
+            created_by=cls.citizen_user,
+            rendered_html="<p>Ion Popescu</p>",
+        )
+        cls.import_job = CitizenImportJob.objects.create(
+            municipality=cls.muni, created_by=cls.staff, file_name="cetateni.csv", spool_path="", status="done"
+        )
+        cls.invite = AdminInvite.objects.create(email="nou@example.com", municipality=cls.muni, token="invite-token")
+        cls.serial = 0
+        cls.grow()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def grow(cls):
+        """Adauga BATCH randuri per primarie in fiecare tabela afisata de pagini."""
+        for muni in cls.munis:
+            admin = muni.admins.get().user
+            for _ in range(cls.BATCH):
+                cls.serial += 1
+                n = cls.serial
+                user = User.objects.create_user(f"cetatean{n}", f"c{n}@example.com", "x")
+                citizen = Citizen.objects.create(
+                    full_name=f"Cetatean {n:04d}",
+                    cnp=f"2{n:012d}",
+                    identifier=f"C-{n}",
+                    localitate="Sat",
+                    municipality=muni,
+                    user=user,
+                    extra={"sat": "Deal"},
+                )
+                thread = ChatThread.objects.create(citizen=citizen, created_by=user, title=f"Chat {n}")
+                Message.objects.create(citizen=citizen, chat_thread=thread, sender=user, text="Buna ziua")
+                Message.objects.create(citizen=citizen, chat_thread=thread, sender=admin, text="Raspuns")
+                GeneratedDocument.objects.create(
+                    citizen=citizen, template=cls.template, file=f"generated_docs/doc{n}.pdf", output_type="pdf"
+                )
+                work_item = WorkItem.objects.create(
+                    citizen=citizen,
+                    template=cls.workflow_template,
+                    revision=cls.workflow_template.current_revision,
+                    municipality=muni,
+                    created_by=user,
+                )
+                StaffNotification.objects.create(user=admin, work_item=work_item, title="Document nou in lucru")
+                StaffNotification.objects.create(user=cls.superadmin, work_item=work_item, title="Document nou")
+                LeaveRequest.objects.create(
+                    citizen=citizen,
+                    municipality=muni,
+                    start_date=date(2026, 3, n % 28 + 1),
+                    end_date=date(2026, 3, n % 28 + 1),
+                    days_requested=1,
+                )
+                Notification.objects.create(citizen=citizen, title="Bun venit")
+                CitizenImportJob.objects.create(municipality=muni, file_name=f"import{n}.csv", spool_path="")
+                AdminInvite.objects.create(email=f"invite{n}@example.com", municipality=muni, token=f"token-{n}")
+
+            # cetateanul de test primeste si el randuri noi pe fiecare relatie
+            if muni == cls.muni:
+                for i in range(cls.BATCH):
+                    Message.objects.create(citizen=cls.citizen, chat_thread=cls.thread, sender=admin, text="Mesaj")
+                    Message.objects.create(
+                        citizen=cls.citizen, chat_thread=cls.thread, sender=cls.citizen_user, text="Intrebare"
+                    )
+                    Notification.objects.create(citizen=cls.citizen, title="Document disponibil")
+                    GeneratedDocument.objects.create(
+                        citizen=cls.citizen, template=cls.template, file="generated_docs/x.pdf", output_type="pdf"
+                    )
+                    LeaveRequest.objects.create(
+                        citizen=cls.citizen,
+                        municipality=muni,
+                        start_date=date(2026, 4, 1),
+                        end_date=date(2026, 4, 2),
+                        days_requested=2,
+                        status="approved",
+                    )
+                    DocumentTemplate.objects.create(name=f"Template {cls.serial}-{i}", body_html="<p>x</p>")
+
+    def count_queries(self, user, method, url, data=None):
+        # url poate fi o functie, pentru cereri care consuma randul (ex: stergeri): apelata la fiecare masurare
+        url = url() if callable(url) else url
+        cache.clear()
+        self.client.logout()
+        if user is not None:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data or {})
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 500, url)
+        return len(ctx.captured_queries)
+
+    def assertQueryBudget(self, user, pages):
+        """pages: (metoda, url, date, buget maxim de interogari)."""
+        before = [self.count_queries(user, method, url, data) for method, url, data, _ in pages]
+        self.grow()
+        for (method, url, data, budget), first in zip(pages, before):
+            with self.subTest(method=method, url=getattr(url, "__name__", url)):
+                after = self.count_queries(user, method, url, data)
+                self.assertLessEqual(after, first, "numarul de interogari creste odata cu datele")
+                self.assertLessEqual(after, budget)
+
+    def test_anonymous(self):
+        self.assertQueryBudget(
+            None,
+            [
+                ("get", reverse("citizen_login"), None, 0),
+                ("get", reverse("citizen_logout"), None, 0),
+                ("get", reverse("staff_login"), None, 0),
+                ("get", reverse("superadmin_request_code"), None, 0),
+                ("get", reverse("superadmin_verify_code"), None, 0),
+                ("get", reverse("admin_invite_accept", args=[self.invite.token]), None, 2),
+                ("get", reverse("forgot_password_request"), None, 0),
+                ("get", reverse("forgot_password_verify"), None, 0),
+                ("get", reverse("confirm_email"), None, 0),
+                ("get", reverse("home"), None, 0),
+                ("get", self.document.signed_file_url(disposition="inline"), None, 0),
+            ],
+        )
+
+    def test_citizen(self):
+        self.assertQueryBudget(
+            self.citizen_user,
+            [
+                ("get", reverse("home"), None, 2),
+                ("get", reverse("citizen_dashboard"), None, 5),
+                ("get", reverse("citizen_self_edit"), None, 2),
+                ("get", reverse("citizen_request_document"), None, 3),
+                ("get", reverse("citizen_chat"), None, 10),
+                ("get", reverse("citizen_chat"), {"thread": self.thread.pk}, 10),
+                ("get", reverse("leave_citizen"), None, 9),
+                ("get", reverse("document_preview", args=[self.document.pk]), None, 3),
+                (
+                    "post",
+                    reverse("generate_preview"),
+                    {"template_slug": self.workflow_template.slug, "citizen_id": self.citizen.pk},
+                    6,
+                ),
+                ("post", reverse("citizen_send_email_code"), {"email_recuperare": "nou@example.com"}, 6),
+            ],
+        )
+
+    def test_municipality_admin(self):
+        c = self.citizen
+        self.assertQueryBudget(
+            self.staff,
+            [
+                ("get", reverse("home"), None, 5),
+                ("get", reverse("generate_select"), None, 5),
+                ("get", reverse("admin_account"), None, 7),
+                ("get", reverse("admin_chat", args=[c.pk]), None, 15),
+                ("get", reverse("citizen_list"), None, 6),
+                ("get", reverse("citizen_list"), {"q": "cetatean"}, 6),
+                ("get", reverse("citizen_list"), {"sort": "messages"}, 6),
+                ("get", reverse("citizen_list"), {"extra_key": "sat", "extra_value": "Deal"}, 6),
+                ("get", reverse("citizen_lookup"), {"q": "cet"}, 3),
+                ("get", reverse("citizen_lookup"), {"q": "", "leave": "1"}, 3),
+                ("get", reverse("citizen_create"), None, 4),
+                ("get", reverse("citizen_edit", args=[c.pk]), None, 6),
+                ("get", reverse("citizen_delete", args=[c.pk]), None, 6),
+                ("get", reverse("template_list"), None, 5),
+                ("get", reverse("template_create"), None, 6),
+                ("get", reverse("template_edit", args=[self.workflow_template.slug]), None, 9),
+                ("get", reverse("template_delete", args=[self.workflow_template.slug]), None, 6),
+                ("get", reverse("template_field_catalog"), None, 4),
+                ("get", reverse("export_citizens"), None, 4),
+                ("get", reverse("import_citizens"), None, 4),
+                ("get", reverse("citizen_import_job", args=[self.import_job.pk]), None, 5),
+                ("get", reverse("citizen_import_job_progress", args=[self.import_job.pk]), None, 3),
+                ("get", reverse("export_templates"), None, 3),
+                ("get", reverse("import_templates"), None, 4),
+                ("get", reverse("document_preview", args=[self.document.pk]), None, 5),
+                ("get", reverse("documents_export"), None, 3),
+                ("get", reverse("work_item_list"), None, 5),
+                ("get", reverse("work_item_list"), {"status": "pending"}, 5),
+                ("get", reverse("work_item_detail", args=[self.work_item.pk]), None, 10),
+                ("get", reverse("work_item_delete", args=[self.work_item.pk]), None, 3),
+                ("get", reverse("leave_dashboard"), None, 15),
+                ("get", reverse("leave_dashboard"), {"citizen": c.pk}, 13),
+                ("get", reverse("generate_document", args=[c.pk, self.template.slug]), None, 13),
+                ("get", reverse("generate_document", args=[c.pk, self.select_template.slug]), None, 7),
+                (
+                    "post",
+                    reverse("generate_preview"),
+                    {"template_slug": self.template.slug, "citizen_id": c.pk},
+                    5,
+                ),
+                (
+                    "post",
+                    reverse("generate_preview"),
+                    {"template_slug": self.select_template.slug, "citizen_id": c.pk, "motiv": "Concediu"},
+                    5,
+                ),
+            ],
+        )
+
+    def test_fill_form_lists_select_options(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("generate_document", args=[self.citizen.pk, self.select_template.slug]))
+        self.assertContains(response, '<option value="Concediu">Concediu</option>', html=True)
+        self.assertContains(response, '<option value="Angajare">Angajare</option>', html=True)
+
+    def test_punctuation_only_search_matches_nothing(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("citizen_lookup"), {"q": "-- !"})
+        self.assertEqual(response.json()["results"], [])
+
+    def test_citizen_save_queries_do_not_grow_with_extras(self):
+        self.client.force_login(self.staff)
+
+        def save(citizen, count):
+            data = {
+                "full_name": citizen.full_name,
+                "identifier": citizen.identifier,
+                "cnp": citizen.cnp,
+                "profile_status": citizen.profile_status,
+                "extra-TOTAL_FORMS": count,
+                "extra-INITIAL_FORMS": 0,
+            }
+            for n in range(count):
+                data[f"extra-{n}-field_name"] = f"camp_{citizen.pk}_{n}"
+                data[f"extra-{n}-field_value"] = f"valoare {n}"
+            return self.client.post(reverse("citizen_edit", args=[citizen.pk]), data)
+
+        one, twenty = Citizen.objects.filter(municipality=self.muni).exclude(pk=self.citizen.pk).order_by("pk")[:2]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertRedirects(save(one, 1), reverse("citizen_list"), fetch_redirect_response=False)
+        with self.assertNumQueries(len(queries)):
+            self.assertRedirects(save(twenty, 20), reverse("citizen_list"), fetch_redirect_response=False)
+        self.assertEqual(len(Citizen.objects.get(pk=twenty.pk).extra), 20)
+
+    def test_superadmin(self):
+        c = self.citizen
+        self.assertQueryBudget(
+            self.superadmin,
+            [
+                ("get", reverse("home"), None, 6),
+                ("get", reverse("superadmin_overview"), None, 9),
+                ("get", reverse("superadmin_data_room"), None, 12),
+                ("get", reverse("superadmin_admins"), None, 7),
+                ("get", reverse("municipality_create"), None, 4),
+                ("get", reverse("superadmin_send_test_email"), None, 4),
+                ("get", reverse("admin_invite_create"), None, 5),
+                ("get", reverse("admin_chat", args=[c.pk]), None, 14),
+                ("get", reverse("citizen_list"), None, 6),
+                ("get", reverse("citizen_list"), {"sort": "messages"}, 6),
+                ("get", reverse("template_list"), None, 5),
+                ("get", reverse("template_field_catalog"), None, 4),
+                ("get", reverse("export_citizens"), None, 4),
+                ("get", reverse("export_templates"), None, 3),
+                ("get", reverse("documents_export"), None, 3),
+                ("get", reverse("work_item_list"), None, 5),
+                ("get", reverse("work_item_detail", args=[self.work_item.pk]), None, 10),
+                ("get", reverse("leave_dashboard"), None, 15),
+                ("get", reverse("admin:core_documenttemplate_changelist"), None, 6),
+                ("post", self.library_field_delete_url, None, 4),
+            ],
+        )
+
+    def library_field_delete_url(self):
+        # fiecare masurare sterge un camp nou din biblioteca
+        self.serial += 1
+        field = DynamicFieldLibrary.objects.create(key=f"camp_{self.serial}", label="Camp")
+        return reverse("dynamic_field_delete", args=[field.pk])
+
+
+class _RenderedShape(HTMLParser):
+    """
+    Forma vizibila a unui HTML: elementele (fara span-uri, pe care minificarea le poate uni), stilul
+    efectiv al fiecaruia ca dictionar si textul cu spatiile comprimate, ca la afisare.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.items = []
+        self.spans = []
+
+    @staticmethod
+    def declarations(style):
+        result = {}
+        for part in re.split(r";(?![^(]*\))", style or ""):
+            if ":" in part:
+                prop, value = part.split(":", 1)
+                result[prop.strip().lower()] = " ".join(value.split())
+        return result
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        style = self.declarations(attrs.pop("style", ""))
+        if tag == "span":
+            self.spans.append(style)
+            return
+        # stilul span-urilor deschise se aplica textului din ele
+        self.items.append((tag, tuple(sorted(attrs.items())), tuple(sorted(style.items()))))
+
+    def handle_endtag(self, tag):
+        if tag == "span":
+            self.spans.pop()
+        else:
+            self.items.append(f"/{tag}")
+
+    def handle_data(self, data):
+        style = {}
+        for span in self.spans:
+            style.update(span)
+        self.items.append([data, tuple(sorted(style.items()))])
+
+    def shape(self):
+        # textele alaturate cu acelasi stil formeaza un singur text; paragrafele goale nu ocupa spatiu
+        items = []
+        for item in self.items:
+            if isinstance(item, list) and items and isinstance(items[-1], list) and items[-1][1] == item[1]:
+                items[-1][0] += item[0]
+            else:
+                items.append(item)
+        result = []
+        for item in items:
+            if isinstance(item, list):
+                text = " ".join(item[0].split())
+                if text:
+                    result.append((text, item[1]))
+            elif item == "/p" and result and isinstance(result[-1], tuple) and result[-1][0] == "p":
+                result.pop()
+            else:
+                result.append(item)
+        return result
+
+
+class MinifyTemplateHtmlTests(SimpleTestCase):
+    CONTEXT = {"full_name": "Popescu Ion", "cnp": "1900101221234", "motiv": "angajare"}
+
+    def rendered(self, body):
+        output = Template(body).render(Context(self.CONTEXT))
+        shape = _RenderedShape()
+        shape.feed(output)
+        shape.close()
+        return shape.shape()
+
+    def assertSameRendering(self, body):
+        source = body.replace("\\{\\{", "{{").replace("\\}\\}", "}}")
+        self.assertEqual(self.rendered(source), self.rendered(normalize_template_body(body)))
+
+    def test_repeated_styles_stay_inline(self):
+        cell = '<td style="border: 1px solid #000;  padding: 4px">{{ full_name }}</td>'
+        body = f"<style>td {{ padding: 0 }}</style><table><tr>{cell}{cell}{cell}</tr></table>"
+        minified = minify_template_html(body)
+        # o clasa ar pierde in fata regulii "td" de mai sus; stilul inline castiga
+        self.assertEqual(minified.count('style="border:1px solid #000;padding:4px"'), 3)
+        self.assertNotIn("class=", minified)
+        self.assertSameRendering(body)
+
+    def test_semicolons_inside_parentheses_and_strings_are_kept(self):
+        image = "url(data:image/png;base64,iVBORw0KGgo=)"
+        body = (
+            f'<div style="background: {image} no-repeat; width: 10mm">x</div>'
+            '<p style="font-family: \'A;B\', serif; color: red; color: blue">{{ cnp }}</p>'
+        )
+        minified = minify_template_html(body)
+        self.assertIn(f"background:{image} no-repeat;width:10mm", minified)
+        self.assertIn("font-family:'A;B', serif;color:blue", html.unescape(minified))
+        self.assertSameRendering(body)
+
+    def test_unbalanced_style_is_left_alone(self):
+        body = '<p style="width: calc(1px ; color: red">x</p>'
+        self.assertIn('style="width: calc(1px ; color: red"', minify_template_html(body))
+
+    def test_ckeditor_markup_renders_the_same(self):
+        body = (
+            "<!-- generat de CKEditor -->"
+            '<p style="text-align: center"><span style="font-size:14pt"><span style="font-weight: bold">'
+            "CERERE</span></span></p>"
+            "<p></p>"
+            "<p>Subsemnatul(a)   <span>\\{\\{ full_name \\}\\}</span>,\n  CNP <span></span>{{ cnp }},</p>"
+            '<p style="margin-left: 10mm; text-indent: 5mm">solicit eliberarea pentru {{ motiv }}.</p>'
+            '<p style="text-align: right; color: #333">Data: ______</p>'
+            '<p style="text-align: right; color: #333">Semnatura: ______</p>'
+        )
+        minified = normalize_template_body(body)
+        self.assertLess(len(minified), len(body))
+        self.assertNotIn("<style", minified)
+        self.assertSameRendering(body)
+
+    def test_nested_absolute_spans_are_merged(self):
+        body = '<span style="font-size: 12pt"><span style="color: red">x</span></span>'
+        self.assertEqual(minify_template_html(body), '<span style="font-size:12pt;color:red">x</span>')
+
+    def test_relative_font_sizes_are_not_merged(self):
+        # 2em in 2em inseamna 4em; acelasi lucru pentru procente
+        for size in ("2em", "150%"):
+            body = f'<span style="font-size: {size}"><span style="font-size: {size}">x</span></span>'
+            self.assertEqual(minify_template_html(body).count(f"font-size:{size}"), 2, size)
+
+    def test_box_properties_are_not_merged(self):
+        for style in ("padding: 2px", "border: 1px solid #000"):
+            body = f'<span style="{style}"><span style="{style}">x</span></span>'
+            self.assertEqual(minify_template_html(body).count("<span"), 2, style)
+
+    def test_outer_important_is_not_merged(self):
+        # in sursa declaratia span-ului interior castiga: textul ramane albastru
+        body = '<span style="color: red !important"><span style="color: blue">x</span></span>'
+        minified = minify_template_html(body)
+        self.assertIn('<span style="color:blue">x</span>', minified)
+        self.assertEqual(minified.count("<span"), 2)
+
+    def test_template_code_whitespace_is_kept(self):
+        body = '<p>Motiv:   {{ motiv|default:"x   y" }}  {% if cnp %}{{ cnp|cut:"  " }}{% endif %}</p>'
+        minified = minify_template_html(body)
+        self.assertIn('Motiv: {{ motiv|default:"x   y" }} {% if cnp %}{{ cnp|cut:"  " }}{% endif %}', minified)
+
+    def test_template_code_split_by_entities_is_kept(self):
+        body = '<p>{{ motiv|default:"a &amp;   b" }}</p>'
+        self.assertIn('"a &amp;   b"', minify_template_html(body))
+
+
+class TemplateBundleTests(TestCase):
+    """Exportul JSONL refacut prin import: atribuirile pe primarii si doar imaginile de antet valide."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.munis = [Municipality.objects.create(name=f"Primaria {n}") for n in (1, 2)]
+        cls.superadmin = User.objects.create_superuser("root", "root@example.com", "x")
+        cls.local = DocumentTemplate.objects.create(name="Local", body_html="<p>{{ full_name }}</p>")
+        cls.local.municipalities.set(cls.munis)
+        DocumentTemplate.objects.create(name="Global", body_html="<p>{{ cnp }}</p>")
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(prefix="citizen-doc-bundle-")
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.client.force_login(self.superadmin)
+
+    def png(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (2, 2)).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def export(self):
+        response = self.client.get(reverse("export_templates"), {"format": "jsonl"})
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+    def import_lines(self, lines):
+        content = "\n".join(json.dumps(line) for line in lines).encode()
+        upload = SimpleUploadedFile("templates.jsonl", content, content_type="application/x-ndjson")
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("import_templates"), {"file": upload})
+
+    def test_municipality_assignment_round_trip(self):
+        lines = self.export()
+        records = {line["name"]: line for line in lines if line["type"] == "template"}
+        self.assertEqual(records["Local"]["municipalities"], sorted(m.slug for m in self.munis))
+        self.assertFalse(records["Local"]["is_global"])
+        self.assertTrue(records["Global"]["is_global"])
+
+        self.local.municipalities.set(self.munis[:1])
+        self.import_lines(lines)
+        self.local.refresh_from_db()
+        self.assertFalse(self.local.is_global)
+        self.assertEqual(set(self.local.municipalities.all()), set(self.munis))
+        self.assertTrue(DocumentTemplate.objects.get(name="Global").is_global)
+
+    def test_unknown_municipalities_are_not_imported_as_global(self):
+        lines = [line for line in self.export() if line.get("name") != "Global"]
+        for line in lines:
+            if line["type"] == "template":
+                line.update(name="Altundeva", slug="altundeva", municipalities=["primaria-x"])
+        self.import_lines(lines)
+        self.assertFalse(DocumentTemplate.objects.filter(name="Altundeva").exists())
+
+    def test_only_header_images_are_restored_after_commit(self):
+        png = base64.b64encode(self.png()).decode()
+        fake = base64.b64encode(b"<script>alert(1)</script>").decode()
+        lines = self.export() + [
+            {"type": "media", "path": "municipality_headers/sigla.png", "content": png},
+            {"type": "media", "path": "municipality_headers/fals.png", "content": fake},
+            {"type": "media", "path": "municipality_headers/pagina.html", "content": png},
+            {"type": "media", "path": "generated_docs/sigla.png", "content": png},
+            {"type": "media", "path": "municipality_headers/../sigla.png", "content": png},
+        ]
+        self.import_lines(lines)
+        self.assertTrue(default_storage.exists("municipality_headers/sigla.png"))
+        for path in ("municipality_headers/fals.png", "municipality_headers/pagina.html", "generated_docs/sigla.png",
+                     "sigla.png"):
+            self.assertFalse(default_storage.exists(path), path)
+
+    def test_oversized_zip_body_is_refused_before_reading(self):
+        response = self.client.get(reverse("export_templates"), {"format": "zip"})
+        source = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        manifest = json.loads(source.read("manifest.json"))
+        body_path = next(t["body"] for t in manifest["templates"] if t["name"] == "Local")
+        manifest["templates"] = [
+            dict(t, body=body_path + ".mare", name="Uriasa", slug="uriasa") if t["name"] == "Local" else t
+            for t in manifest["templates"]
+        ]
+        bundle = io.BytesIO()
+        with zipfile.ZipFile(bundle, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("manifest.json", json.dumps(manifest))
+            for info in source.infolist():
+                if info.filename != "manifest.json":
+                    archive.writestr(info.filename, source.read(info))
+            # comprimat ocupa cativa KB; necomprimat trece de limita
+            archive.writestr(body_path + ".mare", "x" * (TEMPLATE_BUNDLE_BODY_MAX_BYTES + 1))
+
+        upload = SimpleUploadedFile("templates.zip", bundle.getvalue(), content_type="application/zip")
+        with mock.patch.object(zipfile.ZipFile, "read", autospec=True, side_effect=zipfile.ZipFile.read) as read:
+            response = self.client.post(reverse("import_templates"), {"file": upload}, follow=True)
+        errors = [str(m) for m in response.context["messages"] if m.level_tag == "error"]
+        self.assertEqual(len(errors), 1)
+        self.assertIn("'Uriasa' depaseste 2 MB", errors[0])
+        self.assertNotIn(body_path + ".mare", [getattr(c.args[1], "filename", c.args[1]) for c in read.call_args_list])
+        self.assertFalse(DocumentTemplate.objects.filter(name="Uriasa").exists())
+
+
+class TemplateRevisionTests(TestCase):
+    """Reviziile de template: autorul modificarii si lucrarile fixate pe revizia de la creare."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.muni = Municipality.objects.create(name="Primaria 1")
+        cls.author = User.objects.create_superuser("root", "root@example.com", "x")
+        cls.editor = User.objects.create_superuser("editor", "editor@example.com", "x")
+        cls.template = DocumentTemplate.objects.create(
+            name="Cerere",
+            body_html="<p>Versiunea unu: {{ full_name }} {{ motiv }}</p>",
+            template_type="workflow",
+            dynamic_fields=[{"key": "motiv", "label": "Motiv", "length": 20, "type": "text", "options": ""}],
+            created_by=cls.author,
+        )
+        cls.citizen = Citizen.objects.create(
+            full_name="Ion Popescu", cnp="1900101000001", identifier="C-0", municipality=cls.muni
+        )
+        cls.work_item = WorkItem.objects.create(
+            citizen=cls.citizen,
+            template=cls.template,
+            revision=cls.template.current_revision,
+            municipality=cls.muni,
+            dynamic_values={"motiv": "angajare"},
+        )
+
+    def setUp(self):
+        self.client.force_login(self.editor)
+
+    def edit(self, body, dynamic_fields_raw="motiv|Motiv|20"):
+        return self.client.post(
+            reverse("template_edit", args=[self.template.slug]),
+            {
+                "name": self.template.name,
+                "description": "",
+                "template_type": "workflow",
+                "output_type": "pdf",
+                "body_html": body,
+                "dynamic_fields_raw": dynamic_fields_raw,
+            },
+        )
+
+    def test_work_item_keeps_pinned_revision(self):
+        first = self.template.current_revision
+        response = self.edit("<p>Versiunea doi: {{ full_name }} {{ termen }}</p>", "termen|Termen|10")
+        self.assertRedirects(response, reverse("template_list"))
+
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.current_revision.number, 2)
+        self.assertEqual(self.template.current_revision.created_by, self.editor)
+        self.assertIn("Versiunea unu", DocumentTemplateRevision.objects.get(pk=first.pk).body_html)
+
+        response = self.client.get(reverse("work_item_detail", args=[self.work_item.pk]))
+        self.assertIn("Versiunea unu: Ion Popescu angajare", response.context["preview_html"])
+        self.assertNotIn("Versiunea doi", response.context["preview_html"])
+        self.assertEqual([item["key"] for item in response.context["dyn_fields"]], ["motiv"])
+
+    def test_unchanged_save_keeps_revision(self):
+        self.edit(self.template.body_html)
+        self.assertEqual(self.template.revisions.count(), 1)
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.current_revision.number, 1)
+
+
+@override_settings(
+    TEMPLATE_PREFLIGHT_WARN={"render_ms": 60000, "pages": 1, "output_kb": 10240},
+    TEMPLATE_PREFLIGHT_LIMIT={"render_ms": 60000, "pages": 2, "output_kb": 10240},
+)
+class TemplatePreflightTests(TestCase):
+    """Pre-flight-ul de cost la salvare si la import: peste LIMIT se respinge, intre WARN si LIMIT se avertizeaza."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superadmin = User.objects.create_superuser("root", "root@example.com", "x")
+        cls.template = DocumentTemplate.objects.create(name="Adeverinta", body_html="<p>{{ full_name }}</p>")
+
+    def setUp(self):
+        self.client.force_login(self.superadmin)
+
+    @staticmethod
+    def body(pages):
+        page = '<div style="page-break-after: always">{{ full_name }}</div>'
+        return page * (pages - 1) + "<div>{{ cnp }}</div>"
+
+    def form_data(self, name, pages):
+        return {"name": name, "template_type": "generate", "output_type": "pdf", "body_html": self.body(pages)}
+
+    def test_body_over_limit_is_not_saved(self):
+        response = self.client.post(reverse("template_create"), self.form_data("Lung", 3))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("depaseste limitele de cost", str(response.context["form"].non_field_errors()))
+        self.assertFalse(DocumentTemplate.objects.filter(name="Lung").exists())
+
+        response = self.client.post(
+            reverse("template_edit", args=[self.template.slug]), self.form_data(self.template.name, 3)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.body_html, "<p>{{ full_name }}</p>")
+        self.assertEqual(self.template.revisions.count(), 1)
+
+    def test_import_over_limit_is_not_imported(self):
+        content = io.StringIO()
+        writer = csv.writer(content)
+        writer.writerow(["name", "output_type", "body_html"])
+        writer.writerow(["Lung", "pdf", self.body(3)])
+        writer.writerow(["Scurt", "pdf", self.body(1)])
+        upload = SimpleUploadedFile("templates.csv", content.getvalue().encode(), content_type="text/csv")
+        response = self.client.post(reverse("import_templates"), {"file": upload}, follow=True)
+        errors = [str(m) for m in response.context["messages"] if m.level_tag == "error"]
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith("Neimportat - Lung: Template-ul depaseste limitele de cost"))
+        self.assertEqual(set(DocumentTemplate.objects.values_list("name", flat=True)), {"Adeverinta", "Scurt"})
+
+    def test_body_between_warn_and_limit_is_saved_with_warning(self):
+        response = self.client.post(reverse("template_create"), self.form_data("Doua pagini", 2), follow=True)
+        warnings = [str(m) for m in response.context["messages"] if m.level_tag == "warning"]
+        self.assertEqual(len(warnings), 1)
+        self.assertIn("Template costisitor: 2 pagini (buget 1)", warnings[0])
+        revision = DocumentTemplate.objects.get(name="Doua pagini").current_revision
+        self.assertEqual(revision.preflight_pages, 2)
+        self.assertGreater(revision.preflight_bytes, 0)
+        self.assertIsNotNone(revision.preflight_ms)
+
+
+class TemplateVisibilityTests(TestCase):
+    """is_global urmeaza atribuirile pe primarii, din ambele parti ale relatiei si la stergerea primariei."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.munis = [Municipality.objects.create(name=f"Primaria {n}") for n in (1, 2, 3)]
+        cls.templates = [DocumentTemplate.objects.create(name=f"Template {n}", body_html="<p>x</p>") for n in (1, 2, 3)]
+
+    def assertVisibility(self):
+        for tmpl in DocumentTemplate.objects.all():
+            self.assertEqual(tmpl.is_global, not tmpl.municipalities.exists(), tmpl.name)
+        for muni in Municipality.objects.all():
+            # interogarea de dinainte de is_global: join pe atribuiri + distinct
+            expected = DocumentTemplate.objects.filter(
+                models.Q(municipalities=muni) | models.Q(municipalities__isnull=True)
+            ).distinct()
+            self.assertEqual(set(visible_templates(muni)), set(expected), muni.name)
+
+    def test_template_side_add_remove_clear(self):
+        first, second = self.templates[:2]
+        first.municipalities.add(*self.munis[:2])
+        self.assertFalse(first.is_global)
+        self.assertVisibility()
+        first.municipalities.remove(self.munis[0])
+        self.assertVisibility()
+        first.municipalities.remove(self.munis[1])
+        self.assertTrue(first.is_global)
+        self.assertVisibility()
+        second.municipalities.set(self.munis[1:])
+        self.assertVisibility()
+        second.municipalities.clear()
+        self.assertTrue(second.is_global)
+        self.assertVisibility()
+
+    def test_municipality_side_clear(self):
+        muni = self.munis[0]
+        muni.templates.add(*self.templates[:2])
+        self.templates[1].municipalities.add(self.munis[1])
+        self.assertVisibility()
+        muni.templates.clear()
+        self.assertVisibility()
+        self.assertTrue(DocumentTemplate.objects.get(pk=self.templates[0].pk).is_global)
+        self.assertFalse(DocumentTemplate.objects.get(pk=self.templates[1].pk).is_global)
+
+    def test_municipality_delete(self):
+        self.templates[0].municipalities.add(self.munis[0])
+        self.templates[1].municipalities.add(*self.munis[:2])
+        self.munis[0].delete()
+        self.assertVisibility()
+        self.assertTrue(DocumentTemplate.objects.get(pk=self.templates[0].pk).is_global)
+        self.assertFalse(DocumentTemplate.objects.get(pk=self.templates[1].pk).is_global)
+
+
+class SignedMediaTests(TestCase):
+    """Link-urile semnate: tipul si numele semnate, expirarea, orice parametru schimbat si accesul staff."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.munis = [Municipality.objects.create(name=f"Primaria {n}") for n in (1, 2)]
+        cls.staff = User.objects.create_user("admin1", "admin1@example.com", "x", is_staff=True)
+        MunicipalityAdmin.objects.create(user=cls.staff, municipality=cls.munis[0])
+        cls.other_staff = User.objects.create_user("admin2", "admin2@example.com", "x", is_staff=True)
+        MunicipalityAdmin.objects.create(user=cls.other_staff, municipality=cls.munis[1])
+        template = DocumentTemplate.objects.create(name="Adeverinta", body_html="<p>{{ full_name }}</p>")
+        citizen = Citizen.objects.create(
+            full_name="Ion Popescu", cnp="1900101000001", identifier="C-0", municipality=cls.munis[0]
+        )
+        # fara extensie: tipul livrat nu poate veni decat din link
+        cls.document = GeneratedDocument.objects.create(
+            citizen=citizen, template=template, file="generated_docs/document-1", output_type="pdf"
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(prefix="citizen-doc-media-")
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root, MEDIA_ACCEL_REDIRECT_PREFIX=""))
+        default_storage.save(self.document.file.name, ContentFile(b"%PDF-1.4\n"))
+
+    def get(self, url, **changes):
+        parts = urlsplit(url)
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        params.update(changes)
+        return self.client.get(parts.path, params)
+
+    def test_valid_link_uses_signed_type_and_name(self):
+        response = self.get(self.document.signed_file_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="adeverinta.pdf"')
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-1.4\n")
+
+    def test_expired_link_is_rejected(self):
+        self.assertEqual(self.get(signed_media_url(self.document.file.name, ttl=-1)).status_code, 403)
+
+    def test_tampered_link_is_rejected(self):
+        url = self.document.signed_file_url()
+        changes = {"d": "inline", "ct": "text/html", "fn": "adeverinta.html"}
+        for param, value in changes.items():
+            with self.subTest(param=param):
+                self.assertEqual(self.get(url, **{param: value}).status_code, 403)
+        with self.subTest(param="path"):
+            other = url.replace("document-1", "document-2")
+            default_storage.save("generated_docs/document-2", ContentFile(b"alt"))
+            self.assertEqual(self.get(other).status_code, 403)
+
+    def test_preview_is_forbidden_to_other_municipality(self):
+        self.client.force_login(self.other_staff)
+        self.assertEqual(self.client.get(reverse("document_preview", args=[self.document.pk])).status_code, 403)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("document_preview", args=[self.document.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.get(response["Location"])["Content-Disposition"], 'inline; filename="adeverinta.pdf"')
+
+
+class UnreadCounterTests(TestCase):
+    """Contoarele de mesaje necitite raman egale cu cele recalculate din mesaje (reconcile_counters)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.munis = [Municipality.objects.create(name=f"Primaria {n}") for n in (1, 2)]
+        cls.user = User.objects.create_user("1900101000001", "c@example.com", "x")
+        cls.citizen = Citizen.objects.create(
+            full_name="Ion Popescu", cnp="1900101000001", municipality=cls.munis[0], user=cls.user
+        )
+        for text in ("a", "b"):
+            Message.objects.create(citizen=cls.citizen, sender=cls.user, text=text)
+
+    def unread_chat(self):
+        return [m.unread_chat for m in Municipality.objects.filter(pk__in=[m.pk for m in self.munis]).order_by("pk")]
+
+    def test_message_counters_do_not_load_sender_or_citizen(self):
+        self.assertEqual(self.unread_chat(), [2, 0])
+        with CaptureQueriesContext(connection) as ctx:
+            Message.objects.create(citizen=self.citizen, sender=self.user, text="c")
+        self.assertEqual([q["sql"] for q in ctx.captured_queries if q["sql"].startswith("SELECT")], [])
+        self.assertEqual(self.unread_chat(), [3, 0])
+        message = Message.objects.get(text="a")
+        with CaptureQueriesContext(connection) as ctx:
+            message.delete()
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        # doar coloanele necesare, dupa sender_id / citizen_id, nu randurile intregi
+        self.assertNotIn('"auth_user"."password"', sql)
+        self.assertNotIn('"core_citizen"."full_name"', sql)
+        self.assertEqual(self.unread_chat(), [2, 0])
+
+    def test_moving_citizen_moves_unread_chat(self):
+        citizen = Citizen.objects.get(pk=self.citizen.pk)
+        citizen.municipality = self.munis[1]
+        citizen.save()
+        self.assertEqual(self.unread_chat(), [0, 2])
+        citizen.save()
+        self.assertEqual(self.unread_chat(), [0, 2])
+        citizen.municipality = self.munis[0]
+        citizen.save(update_fields=["municipality"])
+        self.assertEqual(self.unread_chat(), [2, 0])
+
+
+class CitizenKeysetTests(TestCase):
+    """Paginarea pe cursor din lista de cetateni: inainte si inapoi, pe fiecare sortare, cu egalitati."""
+
+    # nume si contoare repetate: egalitatile se departajeaza doar dupa id
+    NAMES = ["Ana Pop", "Ana Ionescu", "Ana Pop", "Ana Maria Pop", "Ana Ionescu Pop"]
+    UNREAD = [0, 2, 0, 1]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.muni = Municipality.objects.create(name="Primaria 1")
+        other = Municipality.objects.create(name="Primaria 2")
+        cls.staff = User.objects.create_user("admin1", "admin1@example.com", "x", is_staff=True)
+        MunicipalityAdmin.objects.create(user=cls.staff, municipality=cls.muni)
+        for n in range(35):
+            citizen = Citizen.objects.create(
+                full_name=cls.NAMES[n % len(cls.NAMES)], cnp=f"1900101{n:06d}", identifier="K", municipality=cls.muni
+            )
+            Citizen.objects.filter(pk=citizen.pk).update(unread_chat=cls.UNREAD[n % len(cls.UNREAD)])
+        Citizen.objects.create(full_name="Ana Pop", cnp="2900101000001", identifier="K", municipality=other)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def page(self, query):
+        context = self.client.get(reverse("citizen_list") + query).context
+        return [c.pk for c in context["citizens"]], context["prev_url"], context["next_url"]
+
+    def walk(self, params, order):
+        query = "?" + urlencode({**params, "page_size": 10})
+        forward = []
+        while query:
+            pks, _prev, query_next = self.page(query)
+            forward.append(pks)
+            last_query, query = query, query_next
+        # inapoi, de pe ultima pagina pana la prima
+        backward = []
+        query = last_query
+        while query:
+            pks, query, _next = self.page(query)
+            backward.append(pks)
+
+        qs = Citizen.objects.filter(municipality=self.muni)
+        if "q" in params:
+            qs, _ranked = search_citizens(qs, params["q"])
+        expected = list(qs.order_by(*order).values_list("pk", flat=True))
+        self.assertEqual(len(expected), 35)
+        self.assertEqual([pk for pks in forward for pk in pks], expected)
+        self.assertEqual(len(forward), 4)
+        self.assertEqual(backward[::-1], forward)
+
+    def test_alphabetical(self):
+        self.walk({}, ["full_name", "id"])
+
+    def test_messages(self):
+        self.walk({"sort": "messages"}, ["-unread_chat", "full_name", "id"])
+
+    def test_search_rank(self):
+        self.walk({"q": "ana"}, ["search_rank", "id"])
+
+
+class CitizenImportTests(TestCase):
+    """Importul de cetateni in bucati, direct si prin job-uri cu checkpoint."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.munis = [Municipality.objects.create(name=f"Primaria {n}") for n in (1, 2)]
+        Citizen.objects.create(full_name="Vechi 1", cnp="1900101000001", identifier="V-1", municipality=cls.munis[1])
+        Citizen.objects.create(full_name="Vechi 2", cnp="1900101000002", identifier="V-2", municipality=cls.munis[1])
+        cls.staff = User.objects.create_user("admin1", "admin1@example.com", "x", is_staff=True)
+        MunicipalityAdmin.objects.create(user=cls.staff, municipality=cls.munis[0])
+
+    def setUp(self):
+        spool_dir = tempfile.mkdtemp(prefix="citizen-doc-spool-")
+        self.addCleanup(shutil.rmtree, spool_dir, ignore_errors=True)
+        self.enterContext(override_settings(CITIZEN_IMPORT_SPOOL_DIR=spool_dir, CITIZEN_IMPORT_WORKER="command"))
+
+    @staticmethod
+    def csv_bytes(rows):
+        lines = ["full_name,cnp,identifier,data_emitere"]
+        lines += [",".join(row) for row in rows]
+        return ("\n".join(lines) + "\n").encode()
+
+    def rows(self, count=7):
+        # primele doua CNP-uri exista deja, restul sunt noi
+        return [(f"Cetatean {n}", f"19001010000{n:02d}", f"C-{n}", "2020-01-02") for n in range(1, count + 1)]
+
+    def run_import(self, rows, **kwargs):
+        return run_citizen_import(iter_citizen_rows(io.BytesIO(self.csv_bytes(rows))), **kwargs)
+
+    def test_counts_across_chunks(self):
+        stats = self.run_import(self.rows(), muni=self.munis[0], chunk_size=3)
+        self.assertEqual((stats["rows"], stats["created"], stats["updated"], stats["errors"]), (7, 5, 2, []))
+        self.assertEqual(Citizen.objects.count(), 7)
+        self.assertEqual(Citizen.objects.get(cnp="1900101000001").full_name, "Cetatean 1")
+        self.assertEqual(Citizen.objects.get(cnp="1900101000007").data_emitere, date(2020, 1, 2))
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        rows = self.rows(4)
+        rows[2] = ("CNP lung", "19001010000031", "C-3", "")
+        rows[3] = ("Data gresita", "1900101000004", "C-4", "02.01.2020")
+        stats = self.run_import(rows, muni=self.munis[0], chunk_size=3)
+        self.assertEqual([error["line"] for error in stats["errors"]], [4, 5])
+        self.assertIn("CNP prea lung", stats["errors"][0]["error"])
+        self.assertIn("data_emitere invalida", stats["errors"][1]["error"])
+        self.assertEqual((stats["created"], stats["updated"]), (0, 2))
+        self.assertFalse(Citizen.objects.filter(identifier__in=["C-3", "C-4"]).exists())
+
+    def test_rows_move_to_the_import_municipality(self):
+        self.run_import(self.rows(3), muni=self.munis[0], chunk_size=2)
+        self.assertEqual(set(Citizen.objects.values_list("municipality", flat=True)), {self.munis[0].pk})
+        self.run_import(self.rows(3), chunk_size=2)
+        self.assertEqual(Citizen.objects.filter(municipality__isnull=True).count(), 3)
+
+    def job(self, rows, **fields):
+        upload = SimpleUploadedFile("cetateni.csv", self.csv_bytes(rows))
+        job = create_import_job(upload, self.munis[0], self.staff, mode="overwrite")
+        if fields:
+            CitizenImportJob.objects.filter(pk=job.pk).update(**fields)
+            job.refresh_from_db()
+        return job
+
+    def test_interrupted_job_resumes_from_checkpoint(self):
+        # fara CNP fiecare rand importat de doua ori ar deveni un cetatean in plus
+        rows = [(f"Fara CNP {n}", "", f"F-{n}", "") for n in range(1, 8)]
+        self.run_import(rows[:3], muni=self.munis[0])
+        job = self.job(rows, status="running", rows_done=3, created_count=3, heartbeat_at=None)
+
+        self.assertEqual(process_import_job(job.pk).pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_done, job.created_count), ("done", 7, 7))
+        identifiers = list(Citizen.objects.filter(identifier__startswith="F-").values_list("identifier", flat=True))
+        self.assertCountEqual(identifiers, [f"F-{n}" for n in range(1, 8)])
+
+    def test_worker_with_stale_token_cannot_write(self):
+        job = claim_job(self.job(self.rows()).pk)
+        # alt worker a preluat job-ul intre timp
+        CitizenImportJob.objects.filter(pk=job.pk).update(worker_token="alt-worker")
+        with self.assertRaises(_JobLost):
+            _import_rows(job)
+        self.assertEqual(Citizen.objects.count(), 2)
+        self.assertEqual(Citizen.objects.get(cnp="1900101000001").full_name, "Vechi 1")
+        job.refresh_from_db()
+        self.assertEqual((job.worker_token, job.rows_done, job.created_count), ("alt-worker", 0, 0))
+
+    def test_cancel_stops_the_job(self):
+        job = claim_job(self.job(self.rows()).pk)
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse("citizen_import_job", args=[job.pk]), {"choice": "cancel"})
+        self.assertRedirects(response, reverse("import_citizens"))
+
+        # worker-ul pornit nu mai detine job-ul: urmatorul checkpoint ridica _JobLost
+        self.assertFalse(_owned(job).exists())
+        self.assertIsNone(process_import_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_done), ("cancelled", 0))
+        self.assertEqual(Citizen.objects.count(), 2)
+
+    def test_sync_of_identical_file_writes_nothing(self):
+        self.run_import(self.rows(), muni=self.munis[0], mode="sync", chunk_size=3)
+        before = list(Citizen.objects.order_by("pk").values_list("pk", "updated_at", "data"))
+        with CaptureQueriesContext(connection) as queries:
+            stats = self.run_import(self.rows(), muni=self.munis[0], mode="sync", chunk_size=3)
+        self.assertEqual((stats["unchanged"], stats["created"], stats["updated"]), (7, 0, 0))
+        statements = [q["sql"].lstrip().split(None, 1)[0].upper() for q in queries]
+        self.assertEqual(set(statements) - {"SELECT", "SAVEPOINT", "RELEASE"}, set())
+        self.assertEqual(list(Citizen.objects.order_by("pk").values_list("pk", "updated_at", "data")), before)
+
+    def test_dry_run_reports_the_real_numbers(self):
+        rows = self.rows()
+        rows[4] = ("Data gresita", "1900101000005", "C-5", "02.01.2020")
+        rows.append(("Fara CNP", "", "C-8", ""))
+        for mode in ("overwrite", "skip", "sync"):
+            with self.subTest(mode=mode):
+                before = list(Citizen.objects.order_by("pk").values_list("pk", "full_name", "import_fingerprint"))
+                dry = self.run_import(rows, muni=self.munis[0], mode=mode, dry_run=True, chunk_size=3)
+                self.assertEqual(
+                    list(Citizen.objects.order_by("pk").values_list("pk", "full_name", "import_fingerprint")), before
+                )
+                sid = transaction.savepoint()
+                real = self.run_import(rows, muni=self.munis[0], mode=mode, chunk_size=3)
+                transaction.savepoint_rollback(sid)
+                dry.pop("seconds"), real.pop("seconds")
+                self.assertEqual(dry, real)
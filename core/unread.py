@@ -0,0 +1,267 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Citizen, Message, Municipality, Notification, StaffNotification, StaffUnreadCounter
+
+# Contoarele de necitite sunt mentinute aici. Crearile si stergerile individuale trec prin semnale
+# (core.signals); marcarile ca citite (QuerySet.update) si crearile in bloc apeleaza direct functiile
+# de mai jos, in aceeasi tranzactie cu modificarea. Valorile din cache (context processor) se
+# invalideaza dupa commit.
+
+USER_COUNTS_CACHE_KEY = "core.unread.user.{}"
+CHAT_COUNT_CACHE_KEY = "core.unread.chat.{}"
+
+
+def _invalidate(keys):
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_user_counts(*user_ids):
+    _invalidate(USER_COUNTS_CACHE_KEY.format(user_id) for user_id in user_ids if user_id)
+
+
+def invalidate_chat_count(muni_id):
+    # totalul global (staff fara primarie) depinde de toate primariile
+    _invalidate([CHAT_COUNT_CACHE_KEY.format(muni_id or "all"), CHAT_COUNT_CACHE_KEY.format("all")])
+
+
+def _add(qs, **deltas):
+    # delta negativ nu coboara sub 0; eventualele abateri le corecteaza reconcile_counters()
+    changes = {field: Greatest(models.F(field) + delta, 0) for field, delta in deltas.items() if delta}
+    if changes:
+        qs.update(**changes)
+
+
+def _related_value(instance, field: str, attr: str):
+    """`instance.<field>.<attr>`, fara a incarca obiectul legat daca nu este deja in cache."""
+    descriptor = getattr(type(instance), field)
+    if descriptor.is_cached(instance):
+        related = getattr(instance, field)
+        return getattr(related, attr) if related is not None else None
+    pk = getattr(instance, descriptor.field.attname)
+    return descriptor.field.related_model.objects.filter(pk=pk).values_list(attr, flat=True).first()
+
+
+def message_added(message: Message, delta=1):
+    if _related_value(message, "sender", "is_staff"):
+        if not message.read_by_citizen:
+            _add(Citizen.objects.filter(pk=message.citizen_id), unread_staff_messages=delta)
+    elif not message.read_by_staff:
+        _add(Citizen.objects.filter(pk=message.citizen_id), unread_chat=delta)
+        muni_id = _related_value(message, "citizen", "municipality_id")
+        if muni_id:
+            _add(Municipality.objects.filter(pk=muni_id), unread_chat=delta)
+        invalidate_chat_count(muni_id)
+
+
+def message_removed(message: Message):
+    message_added(message, delta=-1)
+
+
+def mark_chat_read_by_staff(citizen: Citizen, messages):
+    with transaction.atomic():
+        count = messages.filter(sender__is_staff=False, read_by_staff=False).update(read_by_staff=True)
+        if count:
+            _add(Citizen.objects.filter(pk=citizen.pk), unread_chat=-count)
+            if citizen.municipality_id:
+                _add(Municipality.objects.filter(pk=citizen.municipality_id), unread_chat=-count)
+            invalidate_chat_count(citizen.municipality_id)
+    return count
+
+
+def citizen_moved(citizen_id, old_muni_id, new_muni_id):
+    """Cetatean mutat in alta primarie: mesajele lui necitite trec in contorul noii primarii."""
+    with transaction.atomic():
+        count = Citizen.objects.filter(pk=citizen_id).values_list("unread_chat", flat=True).first()
+        if not count:
+            return
+        if old_muni_id:
+            _add(Municipality.objects.filter(pk=old_muni_id), unread_chat=-count)
+        if new_muni_id:
+            _add(Municipality.objects.filter(pk=new_muni_id), unread_chat=count)
+        invalidate_chat_count(old_muni_id)
+        invalidate_chat_count(new_muni_id)
+
+
+def mark_chat_read_by_citizen(citizen: Citizen, messages):
+    with transaction.atomic():
+        count = messages.filter(sender__is_staff=True, read_by_citizen=False).update(read_by_citizen=True)
+        if count:
+            _add(Citizen.objects.filter(pk=citizen.pk), unread_staff_messages=-count)
+    return count
+
+
+def notification_added(notification: Notification, delta=1):
+    if not notification.is_read:
+        _add(Citizen.objects.filter(pk=notification.citizen_id), unread_notifications=delta)
+        invalidate_user_counts(_related_value(notification, "citizen", "user_id"))
+
+
+def notification_removed(notification: Notification):
+    notification_added(notification, delta=-1)
+
+
+def mark_notifications_read(citizen: Citizen):
+    with transaction.atomic():
+        count = Notification.objects.filter(citizen=citizen, is_read=False).update(is_read=True)
+        if count:
+            _add(Citizen.objects.filter(pk=citizen.pk), unread_notifications=-count)
+            invalidate_user_counts(citizen.user_id)
+    return count
+
+
+def _add_staff(user_id, notifications=0, leave_notifications=0):
+    if not (notifications or leave_notifications):
+        return
+    invalidate_user_counts(user_id)
+    counters = StaffUnreadCounter.objects.filter(user_id=user_id)
+    if counters.exists():
+        _add(counters, notifications=notifications, leave_notifications=leave_notifications)
+        return
+    try:
+        with transaction.atomic():
+            StaffUnreadCounter.objects.create(
+                user_id=user_id, notifications=max(notifications, 0), leave_notifications=max(leave_notifications, 0)
+            )
+    except IntegrityError:
+        # creat intre timp de alta cerere
+        _add(counters, notifications=notifications, leave_notifications=leave_notifications)
+
+
+def staff_notifications_added(notifications, delta=1):
+    """Dupa crearea (sau, cu delta=-1, stergerea) unor notificari staff; grupeaza pe utilizator."""
+    per_user = {}
+    for item in notifications:
+        if item.is_read:
+            continue
+        total, leave = per_user.get(item.user_id, (0, 0))
+        per_user[item.user_id] = (total + delta, leave + (delta if item.work_item_id is None else 0))
+    for user_id, (total, leave) in per_user.items():
+        _add_staff(user_id, total, leave)
+
+
+def mark_staff_notifications_read(user, work_item=None):
+    qs = StaffNotification.objects.filter(user=user, is_read=False)
+    with transaction.atomic():
+        if work_item is not None:
+            count, leave = qs.filter(work_item=work_item).update(is_read=True), 0
+        else:
+            leave = qs.filter(work_item__isnull=True).update(is_read=True)
+            count = leave + qs.update(is_read=True)
+        _add_staff(user.pk, -count, -leave)
+    return count
+
+
+def staff_unread(user):
+    """(notificari, notificari concedii) necitite ale utilizatorului staff; o interogare pe cheia primara."""
+    row = StaffUnreadCounter.objects.filter(user=user).values_list("notifications", "leave_notifications").first()
+    return row or (0, 0)
+
+
+def unread_chat_for(muni):
+    # staff fara primarie (superadmin) vede toate mesajele; insumam doar cetatenii cu mesaje necitite
+    if muni is not None:
+        return muni.unread_chat
+    return Citizen.objects.filter(unread_chat__gt=0).aggregate(n=Coalesce(models.Sum("unread_chat"), 0))["n"]
+
+
+def user_counts(user):
+    """
+    Contoarele afisate in meniu pentru utilizator, din cache (TTL scurt, invalidat la modificari).
+    Mesajele necitite de staff sunt per primarie, deci au o intrare separata in cache.
+    """
+    key = USER_COUNTS_CACHE_KEY.format(user.pk)
+    counts = cache.get(key)
+    if counts is None:
+        counts = {"unread_citizen": 0, "unread_staff": 0, "unread_staff_leave": 0, "muni": None}
+        citizen = getattr(user, "citizen_profile", None)
+        if citizen is not None:
+            counts["unread_citizen"] = citizen.unread_notifications
+        if user.is_staff:
+            counts["unread_staff"], counts["unread_staff_leave"] = staff_unread(user)
+            admin = getattr(user, "municipality_admin", None)
+            counts["muni"] = admin.municipality_id if admin else None
+        cache.set(key, counts, settings.UNREAD_COUNTS_CACHE_TTL)
+    counts = dict(counts)
+    muni_id = counts.pop("muni")
+    counts["unread_chat_staff"] = 0
+    if user.is_staff:
+        chat_key = CHAT_COUNT_CACHE_KEY.format(muni_id or "all")
+        chat = cache.get(chat_key)
+        if chat is None:
+            chat = unread_chat_for(Municipality.objects.filter(pk=muni_id).first() if muni_id else None)
+            cache.set(chat_key, chat, settings.UNREAD_COUNTS_CACHE_TTL)
+        counts["unread_chat_staff"] = chat
+    return counts
+
+
+def reconcile_counters():
+    """
+    Recalculeaza toate contoarele din randurile sursa; intoarce cate randuri de contor s-au schimbat.
+    Valorile din cache se actualizeaza la expirarea TTL-ului (UNREAD_COUNTS_CACHE_TTL).
+    """
+    outer = models.OuterRef("pk")
+    chat = Message.objects.filter(citizen=outer, sender__is_staff=False, read_by_staff=False)
+    staff_msgs = Message.objects.filter(citizen=outer, sender__is_staff=True, read_by_citizen=False)
+    notes = Notification.objects.filter(citizen=outer, is_read=False)
+
+    def count(qs, field):
+        return Coalesce(
+            models.Subquery(
+                qs.order_by().values(field).annotate(n=models.Count("pk")).values("n"),
+                output_field=models.IntegerField(),
+            ),
+            0,
+        )
+
+    changed = 0
+    with transaction.atomic():
+        citizens = Citizen.objects.annotate(
+            real_chat=count(chat, "citizen"),
+            real_staff=count(staff_msgs, "citizen"),
+            real_notes=count(notes, "citizen"),
+        )
+        changed += citizens.exclude(
+            unread_chat=models.F("real_chat"),
+            unread_staff_messages=models.F("real_staff"),
+            unread_notifications=models.F("real_notes"),
+        ).update(
+            unread_chat=count(chat, "citizen"),
+            unread_staff_messages=count(staff_msgs, "citizen"),
+            unread_notifications=count(notes, "citizen"),
+        )
+
+        muni_chat = Message.objects.filter(citizen__municipality=outer, sender__is_staff=False, read_by_staff=False)
+        changed += (
+            Municipality.objects.annotate(real_chat=count(muni_chat, "citizen__municipality"))
+            .exclude(unread_chat=models.F("real_chat"))
+            .update(unread_chat=count(muni_chat, "citizen__municipality"))
+        )
+
+        unread = StaffNotification.objects.filter(is_read=False).order_by()
+        totals = {
+            row["user"]: row
+            for row in unread.values("user").annotate(
+                total=models.Count("pk"), leave=models.Count("pk", filter=models.Q(work_item__isnull=True))
+            )
+        }
+        existing = {c.pk: c for c in StaffUnreadCounter.objects.all()}
+        to_update, to_create = [], []
+        for user_id in set(totals) | set(existing):
+            row = totals.get(user_id, {"total": 0, "leave": 0})
+            counter = existing.get(user_id)
+            if counter is None:
+                to_create.append(
+                    StaffUnreadCounter(user_id=user_id, notifications=row["total"], leave_notifications=row["leave"])
+                )
+            elif (counter.notifications, counter.leave_notifications) != (row["total"], row["leave"]):
+                counter.notifications, counter.leave_notifications = row["total"], row["leave"]
+                to_update.append(counter)
+        StaffUnreadCounter.objects.bulk_create(to_create)
+        StaffUnreadCounter.objects.bulk_update(to_update, ["notifications", "leave_notifications"])
+        changed += len(to_create) + len(to_update)
+    return changed
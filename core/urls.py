@@ -31,6 +31,7 @@ urlpatterns = [
 
     # cetateni (administrare)
     path("citizens/", views.citizen_list, name="citizen_list"),
+    path("citizens/lookup/", views.citizen_lookup, name="citizen_lookup"),
     path("citizens/new/", views.citizen_create, name="citizen_create"),
     path("citizens/<int:pk>/edit/", views.citizen_edit, name="citizen_edit"),
     path("citizens/<int:pk>/delete/", views.citizen_delete, name="citizen_delete"),
@@ -40,12 +41,17 @@ urlpatterns = [
     path("templates/new/", views.template_create, name="template_create"),
     path("templates/<slug:slug>/edit/", views.template_edit, name="template_edit"),
     path("templates/<slug:slug>/delete/", views.template_delete, name="template_delete"),
+    path("templates/fields/", views.template_field_catalog, name="template_field_catalog"),
     path("templates/fields/<int:pk>/delete/", views.dynamic_field_delete, name="dynamic_field_delete"),
     path("export/citizens/", views.export_citizens, name="export_citizens"),
     path("import/citizens/", views.import_citizens, name="import_citizens"),
+    path("import/citizens/<int:pk>/", views.citizen_import_job, name="citizen_import_job"),
+    path("import/citizens/<int:pk>/progress/", views.citizen_import_job_progress, name="citizen_import_job_progress"),
     path("export/templates/", views.export_templates, name="export_templates"),
     path("import/templates/", views.import_templates, name="import_templates"),
     path("documents/<int:doc_id>/preview/", views.document_preview, name="document_preview"),
+    path("export/documents/", views.documents_export, name="documents_export"),
+    path("media-signed/<path:path>", views.signed_media, name="signed_media"),
     path("work-items/", views.work_item_list, name="work_item_list"),
     path("work-items/<int:pk>/", views.work_item_detail, name="work_item_detail"),
     path("work-items/<int:pk>/delete/", views.work_item_delete, name="work_item_delete"),
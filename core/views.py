@@ -1,6 +1,16 @@
+import base64
+import hashlib
 import io
+import json
+import mimetypes
+import os
+import posixpath
+import re
 import secrets
 import csv
+import time
+import zipfile
+from urllib.parse import quote, unquote
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
@@ -8,13 +18,17 @@ from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.mail import send_mail
-from django.db import models
-from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import models, transaction
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.template import Context, Template
+from django.template import Context, Template, TemplateSyntaxError
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.html import escape
+from django.utils.http import content_disposition_header
+from django.utils.text import slugify
 from django.views.decorators.http import require_POST
 from xhtml2pdf import pisa
 
@@ -38,11 +52,26 @@ from .forms import (
     ImportTemplatesForm,
     parse_dynamic_fields,
 )
+from .citizen_extras import filter_by_extra
+from .citizen_search import search_citizens
+from .keyset import decode_cursor, keyset_page
+from . import unread
+from .citizen_export import gzip_stream, iter_citizens_csv, iter_citizens_ndjson
+from .citizen_import import (
+    cancel_import_job,
+    claimable_jobs,
+    confirm_import_job,
+    create_import_job,
+    iter_chunks,
+    start_import_job,
+)
+from .field_catalog import field_catalog, invalidate_field_catalog
+from .media import verify_media_signature
 from .models import (
     Citizen,
+    CitizenImportJob,
     DocumentTemplate,
     ExtraFieldDefinition,
-    ExtraFieldValue,
     GeneratedDocument,
     WorkItem,
     DynamicFieldLibrary,
@@ -58,6 +87,11 @@ from .models import (
     EmailVerificationCode,
     LeaveRequest,
     LegalHoliday,
+    DocumentTemplateRevision,
+    normalize_template_body,
+    template_revision_payload,
+    template_visible_to,
+    visible_templates,
 )
 
 
@@ -90,48 +124,35 @@ def _sync_user_account(citizen: Citizen, password: str | None = None):
     return citizen
 
 
-def _user_municipality(user):
-    if not user.is_authenticated:
-        return None
-    if hasattr(user, "municipality_admin"):
-        return user.municipality_admin.municipality
-    return None
+# ---- Cetateni -----------------------------------------------------------
 
+CITIZEN_PAGE_SIZE = 50
 
-# ---- Cetateni -----------------------------------------------------------
 
 @user_passes_test(lambda u: u.is_staff)
 def citizen_list(request):
-    muni = _user_municipality(request.user)
+    muni = request.municipality
     qs = Citizen.objects.all().select_related("user")
-    # adnotari pentru numarul de mesaje ne-citite trimise de cetatean
-    qs = qs.annotate(
-        msg_from_citizen=models.Count(
-            "messages",
-            filter=models.Q(messages__sender=models.F("user"), messages__read_by_staff=False),
-        )
-    )
     if muni:
         qs = qs.filter(municipality=muni)
 
     # filtre simple
     q = request.GET.get("q", "").strip()
     status_f = request.GET.get("status", "").strip()
+    ranked = False
     if q:
-        qs = qs.filter(
-            models.Q(full_name__icontains=q)
-            | models.Q(cnp__icontains=q)
-            | models.Q(identifier__icontains=q)
-        )
+        # index full-text: prefixe, fara diacritice, pe nume, CNP, identificator si adresa
+        qs, ranked = search_citizens(qs, q)
     if status_f:
         qs = qs.filter(profile_status=status_f)
-
-    # sortare
-    sort = request.GET.get("sort", "")
-    if sort == "messages":
-        qs = qs.order_by("-msg_from_citizen", "full_name")
-    else:
-        qs = qs.order_by("full_name")
+    extra_key = request.GET.get("extra_key", "").strip()
+    extra_value = request.GET.get("extra_value", "").strip()
+    extra_names = list(ExtraFieldDefinition.objects.values_list("name", flat=True))
+    if extra_key and extra_value:
+        try:
+            qs = filter_by_extra(qs, extra_key, extra_value, known=extra_names)
+        except ValueError:
+            messages.error(request, "Camp extra invalid.")
 
     if request.method == "POST":
         citizen_id = request.POST.get("citizen_id")
@@ -146,8 +167,41 @@ def citizen_list(request):
                 f"Statusul profilului tau este acum: {ctz.get_profile_status_display()}",
             )
             messages.success(request, "Status actualizat.")
-            return redirect("citizen_list")
-    citizens = qs
+            return redirect(request.get_full_path())
+
+    # sortare + paginare pe cursor (keyset): fiecare pagina costa la fel, oricat de departe ar fi
+    sort = request.GET.get("sort", "")
+    if sort == "messages":
+        order = ["-unread_chat", "full_name", "id"]
+    elif ranked:
+        order = ["search_rank", "id"]
+    else:
+        order = ["full_name", "id"]
+    page_size = _citizen_page_size(request)
+    citizens, prev_cursor, next_cursor = keyset_page(
+        qs,
+        order,
+        after=decode_cursor(request.GET.get("after", ""), len(order)),
+        before=decode_cursor(request.GET.get("before", ""), len(order)),
+        size=page_size,
+    )
+    # totalul cere o numarare completa, deci doar la cerere (sau cand incape intr-o pagina)
+    first_page = not request.GET.get("after") and not request.GET.get("before")
+    if first_page and next_cursor is None:
+        total = len(citizens)
+    elif request.GET.get("count") == "1":
+        total = qs.count()
+    else:
+        total = None
+    base_query = request.GET.copy()
+    for key in ("after", "before", "count"):
+        base_query.pop(key, None)
+
+    def page_url(**params):
+        query = base_query.copy()
+        query.update(params)
+        return "?" + query.urlencode()
+
     status_choices = Citizen.STATUS_CHOICES
     return render(
         request,
@@ -158,13 +212,30 @@ def citizen_list(request):
             "q": q,
             "status_f": status_f,
             "sort": sort,
+            "extra_key": extra_key,
+            "extra_value": extra_value,
+            "extra_names": extra_names,
+            "page_size": page_size,
+            "total": total,
+            "count_url": page_url(count="1"),
+            "prev_url": page_url(before=prev_cursor) if prev_cursor else "",
+            "next_url": page_url(after=next_cursor) if next_cursor else "",
+            "first_url": page_url() if not first_page else "",
         },
     )
 
 
+def _citizen_page_size(request):
+    try:
+        size = int(request.GET.get("page_size") or CITIZEN_PAGE_SIZE)
+    except ValueError:
+        size = CITIZEN_PAGE_SIZE
+    return min(max(size, 10), 500)
+
+
 @user_passes_test(lambda u: u.is_staff)
 def citizen_create(request):
-    muni = _user_municipality(request.user)
+    muni = request.municipality
     form = CitizenForm(request.POST or None, user=request.user)
     formset = ExtraFieldFormSet(request.POST or None, prefix="extra")
 
@@ -189,14 +260,11 @@ def citizen_create(request):
 @user_passes_test(lambda u: u.is_staff)
 def citizen_edit(request, pk):
     citizen = get_object_or_404(Citizen, pk=pk)
-    muni = _user_municipality(request.user)
+    muni = request.municipality
     if muni and citizen.municipality != muni:
         return HttpResponse(status=403)
     old_status = citizen.profile_status
-    initial_extra = [
-        {"field_name": val.field_def.name, "field_value": val.value}
-        for val in citizen.extra_values.select_related("field_def")
-    ]
+    initial_extra = [{"field_name": name, "field_value": value} for name, value in citizen.get_extras().items()]
     form = CitizenForm(request.POST or None, instance=citizen, user=request.user)
     formset = ExtraFieldFormSet(
         request.POST or None, prefix="extra", initial=initial_extra
@@ -235,7 +303,7 @@ def citizen_edit(request, pk):
 @user_passes_test(lambda u: u.is_staff)
 def citizen_delete(request, pk):
     citizen = get_object_or_404(Citizen, pk=pk)
-    muni = _user_municipality(request.user)
+    muni = request.municipality
     if muni and citizen.municipality != muni:
         return HttpResponse(status=403)
     if request.method == "POST":
@@ -621,9 +689,49 @@ def superadmin_data_room(request):
     )
 
 
+@user_passes_test(lambda u: u.is_staff)
+def documents_export(request):
+    """
+    Arhiva ZIP (streaming) cu documentele generate, filtrate pe primarie/template/interval.
+    Intrarile sunt ordonate dupa id si prefixate cu id-ul documentului; daca descarcarea
+    se intrerupe, se reia cu ?after=<id-ul ultimului fisier complet>.
+    """
+    muni = request.municipality
+    if request.user.is_superuser and request.GET.get("municipality_id"):
+        muni = Municipality.objects.filter(pk=request.GET.get("municipality_id")).first() or muni
+
+    qs = GeneratedDocument.objects.select_related("citizen", "template").order_by("id")
+    if muni:
+        qs = qs.filter(citizen__municipality=muni)
+    template_slug = request.GET.get("template", "").strip()
+    if template_slug:
+        qs = qs.filter(template__slug=template_slug)
+    for param, lookup in (("date_from", "created_at__date__gte"), ("date_to", "created_at__date__lte")):
+        raw = request.GET.get(param, "").strip()
+        if not raw:
+            continue
+        try:
+            qs = qs.filter(**{lookup: timezone.datetime.fromisoformat(raw).date()})
+        except ValueError:
+            return HttpResponse(f"Data invalida pentru {param}.", status=400)
+    try:
+        after = int(request.GET.get("after") or 0)
+    except ValueError:
+        return HttpResponse("Cursor invalid.", status=400)
+    if after:
+        qs = qs.filter(id__gt=after)
+
+    filename = f"documente_{muni.slug if muni else 'toate'}"
+    if after:
+        filename += f"_dupa_{after}"
+    resp = StreamingHttpResponse(_zip_documents_iter(qs), content_type="application/zip")
+    resp["Content-Disposition"] = f'attachment; filename="{filename}.zip"'
+    return resp
+
+
 @login_required
 def admin_account(request):
-    muni = _user_municipality(request.user)
+    muni = request.municipality
     if not muni:
         messages.error(request, "Nu exista o primarie asociata contului.")
         return redirect("home")
@@ -736,7 +844,7 @@ def forgot_password_verify(request):
 
 @login_required
 def citizen_send_email_code(request):
-    citizen = getattr(request.user, "citizen_profile", None)
+    citizen = request.citizen
     if not citizen:
         return HttpResponse(status=403)
     email = request.POST.get("email_recuperare", "").strip()
@@ -764,7 +872,7 @@ def citizen_send_email_code(request):
 
 
 def confirm_email(request):
-    citizen = getattr(request.user, "citizen_profile", None)
+    citizen = request.citizen
     if not citizen:
         return HttpResponse(status=403)
 
@@ -836,11 +944,11 @@ def chat_thread(request, citizen_id=None):
     # determinam profilul cetateanului
     if request.user.is_staff:
         citizen = get_object_or_404(Citizen, id=citizen_id) if citizen_id else None
-        muni = _user_municipality(request.user)
+        muni = request.municipality
         if citizen and muni and citizen.municipality != muni:
             return HttpResponse(status=403)
     else:
-        citizen = getattr(request.user, "citizen_profile", None)
+        citizen = request.citizen
         if not citizen:
             return HttpResponse(status=403)
 
@@ -879,9 +987,9 @@ def chat_thread(request, citizen_id=None):
 
     # marcheaza ca citite
     if request.user.is_staff:
-        msgs.filter(sender__is_staff=False, read_by_staff=False).update(read_by_staff=True)
+        unread.mark_chat_read_by_staff(citizen, msgs)
     else:
-        msgs.filter(sender__is_staff=True, read_by_citizen=False).update(read_by_citizen=True)
+        unread.mark_chat_read_by_citizen(citizen, msgs)
 
     if request.method == "POST":
         # creare thread nou
@@ -928,9 +1036,13 @@ def chat_thread(request, citizen_id=None):
                         f"{text.replace(chr(10), '<br>')}</div>"
                     )
                     if m.attachment:
-                        history_plain.append(f"  Attachment: {m.attachment.url}")
+                        # /media/ nu mai este servit direct; link semnat, valabil cat sa poata fi deschis din email
+                        attachment_url = _absolute_url(
+                            m.signed_attachment_url(ttl=settings.MEDIA_SIGNED_EMAIL_URL_TTL), request=request
+                        )
+                        history_plain.append(f"  Attachment: {attachment_url}")
                         history_html_parts.append(
-                            f"<div style='margin:4px 0 8px;'><a href='{m.attachment.url}'>Attachment</a></div>"
+                            f"<div style='margin:4px 0 8px;'><a href='{escape(attachment_url)}'>Attachment</a></div>"
                         )
                 history_html_parts.append("</div>")
                 history_text = "\n".join(history_plain) if history_plain else "Conversatie goala."
@@ -963,13 +1075,14 @@ def chat_thread(request, citizen_id=None):
         text = request.POST.get("text", "").strip()
         attachment = request.FILES.get("attachment")
         if text or attachment:
-            Message.objects.create(
-                citizen=citizen,
-                chat_thread=active_thread,
-                sender=request.user,
-                text=text,
-                attachment=attachment,
-            )
+            with transaction.atomic():
+                Message.objects.create(
+                    citizen=citizen,
+                    chat_thread=active_thread,
+                    sender=request.user,
+                    text=text,
+                    attachment=attachment,
+                )
             return redirect(request.path + f"?thread={active_thread.id}")
 
     return render(
@@ -987,16 +1100,14 @@ def chat_thread(request, citizen_id=None):
 
 @login_required
 def citizen_dashboard(request):
-    citizen = getattr(request.user, "citizen_profile", None)
+    citizen = request.citizen
     if not citizen:
         messages.error(request, "Nu exista un profil de cetatean asociat.")
         return redirect("home")
 
-    documents = citizen.documents.order_by("-created_at")[:20]
+    documents = citizen.documents.select_related("template").order_by("-created_at")[:20]
     notifications = citizen.notifications.all()[:20]
-    staff_msg_count = Message.objects.filter(
-        citizen=citizen, sender__is_staff=True, read_by_citizen=False
-    ).count()
+    staff_msg_count = citizen.unread_staff_messages
     work_items = citizen.work_items.select_related("template").order_by("-created_at")[:20]
     return render(
         request,
@@ -1013,15 +1124,12 @@ def citizen_dashboard(request):
 
 @login_required
 def citizen_self_edit(request):
-    citizen = getattr(request.user, "citizen_profile", None)
+    citizen = request.citizen
     if not citizen:
         messages.error(request, "Nu exista un profil de cetatean asociat.")
         return redirect("home")
 
-    initial_extra = [
-        {"field_name": val.field_def.name, "field_value": val.value}
-        for val in citizen.extra_values.select_related("field_def")
-    ]
+    initial_extra = [{"field_name": name, "field_value": value} for name, value in citizen.get_extras().items()]
     form = CitizenSelfForm(request.POST or None, instance=citizen)
     formset = ExtraFieldFormSet(
         request.POST or None, prefix="extra", initial=initial_extra
@@ -1083,68 +1191,133 @@ def citizen_self_edit(request):
 
 # ---- Template-uri -------------------------------------------------------
 
-def _available_template_fields():
-    exclude_citizen = {"id", "data", "user", "created_at", "updated_at", "municipality"}
-    citizen_fields = [
-        {"name": f.name, "placeholder": "{{ " + f.name + " }}"}
-        for f in Citizen._meta.get_fields()
-        if getattr(f, "concrete", False) and f.name not in exclude_citizen
-    ]
-    extra_defs = ExtraFieldDefinition.objects.all()
-    extra_fields = [
-        {"name": d.name, "placeholder": "{{ " + d.name + " }}"} for d in extra_defs
-    ]
-    exclude_muni = {
-        "id",
-        "slug",
-        "created_at",
-        "templates",
-        "citizens",
-        "admins",
+def _template_saved_message(prefix: str, tmpl: DocumentTemplate):
+    revision = tmpl.current_revision
+    if not revision or revision.size_reduction <= 0:
+        return prefix
+    return f"{prefix} Revizia {revision.number}: HTML pentru randare redus cu {revision.size_reduction}%."
+
+
+PDF_PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+def _sample_citizen():
+    # cetatean exemplu cu valori de lungime realista pentru toate campurile
+    today = timezone.now().date()
+    return Citizen(
+        full_name="Popescu Ion-Alexandru",
+        identifier="ID-0012345",
+        nume="Popescu",
+        prenume="Ion-Alexandru",
+        cnp="1900101223344",
+        strada="Strada Mihai Eminescu",
+        nr="12A",
+        localitate="Iasi",
+        judet="Iasi",
+        telefon="0712345678",
+        beneficiar="Popescu Ion-Alexandru",
+        emitent="Primaria Municipiului Iasi",
+        tip_document="Adeverinta",
+        numar_document_extern="1234/2024",
+        data_emitere=today,
+    )
+
+
+def _template_preflight(tmpl: DocumentTemplate):
+    """
+    Randeaza template-ul (inca nesalvat) pe un cetatean exemplu si masoara timpul,
+    numarul de pagini si dimensiunea documentului rezultat. Se masoara corpul revizie care va fi
+    salvata (HTML normalizat si minificat), adica exact ce se randeaza in productie.
+    Orice eroare de randare sau conversie devine {"error": ...}, nu 500.
+    """
+    body, _placeholders, content_hash = template_revision_payload(tmpl.body_html, tmpl.dynamic_fields)
+    probe = DocumentTemplateRevision(
+        body_html=body, dynamic_fields=tmpl.dynamic_fields or [], content_hash=content_hash
+    )
+    dyn_values = {}
+    for item in probe.dynamic_fields:
+        try:
+            length = int(item.get("length", 10))
+        except (TypeError, ValueError):
+            length = 10
+        if item.get("key"):
+            dyn_values[item["key"]] = "X" * max(length, 1)
+    started = time.perf_counter()
+    try:
+        safe_ctx, _ = _build_document_context(_sample_citizen(), probe, dynamic_values=dyn_values)
+        html_content = _render_document_html(probe, safe_ctx)
+    except TemplateSyntaxError as exc:
+        return {"error": f"Template invalid: {exc}"}
+    except Exception as exc:
+        return {"error": f"Template-ul nu poate fi randat: {exc}"}
+    pages = 0
+    if tmpl.output_type == "pdf":
+        result = io.BytesIO()
+        try:
+            failed = pisa.CreatePDF(html_content, dest=result).err
+        except Exception:
+            failed = True
+        if failed:
+            return {"error": "Template-ul nu poate fi convertit in PDF."}
+        payload = result.getvalue()
+        pages = len(PDF_PAGE_RE.findall(payload))
+    else:
+        payload = html_content.encode("utf-8")
+    return {
+        "render_ms": int((time.perf_counter() - started) * 1000),
+        "pages": pages,
+        "output_bytes": len(payload),
     }
-    muni_fields = [
-        {"name": "municipality_name", "placeholder": "{{ municipality_name }}"},
-        {"name": "municipality_cif", "placeholder": "{{ municipality_cif }}"},
-        {"name": "municipality_email", "placeholder": "{{ municipality_email }}"},
-        {"name": "municipality_phone", "placeholder": "{{ municipality_phone }}"},
-        {"name": "municipality_mayor", "placeholder": "{{ municipality_mayor }}"},
-        {"name": "municipality_address", "placeholder": "{{ municipality_address }}"},
-        {"name": "municipality_header_logo", "placeholder": "{{ municipality_header_logo }}"},
-        {"name": "municipality_header_banner", "placeholder": "{{ municipality_header_banner }}"},
-    ]
-    # includem si campuri brute din model pentru completare avansata
-    muni_model_fields = [
-        {"name": f.name, "placeholder": "{{ " + f.name + " }}"}
-        for f in Municipality._meta.get_fields()
-        if getattr(f, "concrete", False) and f.name not in exclude_muni
-    ]
-    muni_fields.extend(muni_model_fields)
-    # campuri dinamice implicite (prefill)
-    default_dynamic = [
-        {"name": "data", "placeholder": "{{ data }}", "label": "Data", "type": "date"},
-        {"name": "ora", "placeholder": "{{ ora }}", "label": "Ora", "type": "time"},
-        {"name": "data_si_ora", "placeholder": "{{ data_si_ora }}", "label": "Data si ora", "type": "datetime"},
-    ]
-    return citizen_fields + extra_fields + default_dynamic, muni_fields
+
+
+def _preflight_problems(cost: dict, budget: dict):
+    problems = []
+    if cost["render_ms"] > budget["render_ms"]:
+        problems.append(f"randare {cost['render_ms']} ms (buget {budget['render_ms']} ms)")
+    if cost["pages"] > budget["pages"]:
+        problems.append(f"{cost['pages']} pagini (buget {budget['pages']})")
+    if cost["output_bytes"] > budget["output_kb"] * 1024:
+        problems.append(f"{cost['output_bytes'] // 1024} KB (buget {budget['output_kb']} KB)")
+    return problems
+
+
+def _check_template_cost(tmpl: DocumentTemplate):
+    """Intoarce (cost, eroare, avertisment); eroarea inseamna ca template-ul nu trebuie salvat."""
+    cost = _template_preflight(tmpl)
+    if "error" in cost:
+        return None, cost["error"], None
+    over_limit = _preflight_problems(cost, settings.TEMPLATE_PREFLIGHT_LIMIT)
+    if over_limit:
+        return cost, "Template-ul depaseste limitele de cost: " + ", ".join(over_limit) + ".", None
+    over_warn = _preflight_problems(cost, settings.TEMPLATE_PREFLIGHT_WARN)
+    warning = ("Template costisitor: " + ", ".join(over_warn) + ".") if over_warn else None
+    return cost, None, warning
+
+
+def _store_template_cost(tmpl: DocumentTemplate, cost: dict | None):
+    if not cost or not tmpl.current_revision_id:
+        return
+    DocumentTemplateRevision.objects.filter(pk=tmpl.current_revision_id).update(
+        preflight_ms=cost["render_ms"],
+        preflight_pages=cost["pages"],
+        preflight_bytes=cost["output_bytes"],
+    )
 
 
 @user_passes_test(lambda u: u.is_staff)
 def template_list(request):
-    muni = _user_municipality(request.user)
-    templates = DocumentTemplate.objects.all()
-    if muni:
-        templates = templates.filter(models.Q(municipalities=muni) | models.Q(municipalities__isnull=True)).distinct()
+    muni = request.municipality
+    templates = visible_templates(muni)
     return render(request, "core/template_list.html", {"templates": templates})
 
 
 @user_passes_test(lambda u: u.is_staff)
 def template_create(request):
     form = DocumentTemplateForm(request.POST or None, user=request.user)
-    citizen_fields, muni_fields = _available_template_fields()
-    dyn_library = DynamicFieldLibrary.objects.all().order_by("key")
+    catalog = field_catalog()
     header_logo_url = ""
     header_banner_url = ""
-    user_muni = _user_municipality(request.user)
+    user_muni = request.municipality
     if user_muni:
         if user_muni.header_logo:
             header_logo_url = _absolute_url(user_muni.header_logo.url)
@@ -1155,39 +1328,44 @@ def template_create(request):
         obj = form.save(commit=False)
         obj.created_by = request.user if request.user.is_authenticated else None
         obj.dynamic_fields = form.cleaned_data.get("dynamic_fields", [])
-        obj.save()
-        _sync_dynamic_library(obj.dynamic_fields)
-        if request.user.is_superuser:
-            form.save_m2m()
+        cost, cost_error, cost_warning = _check_template_cost(obj)
+        if cost_error:
+            form.add_error(None, cost_error)
         else:
-            muni = _user_municipality(request.user)
-            if muni:
-                obj.municipalities.set([muni])
-        return redirect("template_list")
+            if cost_warning:
+                messages.warning(request, cost_warning)
+            obj.save(revision_user=obj.created_by)
+            _store_template_cost(obj, cost)
+            _sync_dynamic_library(obj.dynamic_fields)
+            if request.user.is_superuser:
+                form.save_m2m()
+            else:
+                muni = request.municipality
+                if muni:
+                    obj.municipalities.set([muni])
+            messages.success(request, _template_saved_message("Template creat.", obj))
+            return redirect("template_list")
 
     return render(
         request,
         "core/template_form.html",
         {
             "form": form,
-            "fields_citizen": citizen_fields,
-            "fields_muni": muni_fields,
+            "field_catalog_version": catalog["version"],
             "tmpl": None,
             "header_logo_url": header_logo_url,
             "header_banner_url": header_banner_url,
-            "dynamic_library": dyn_library,
         },
     )
 
 
 def template_edit(request, slug):
     tmpl = get_object_or_404(DocumentTemplate, slug=slug)
-    muni = _user_municipality(request.user)
-    if muni and not (tmpl.municipalities.filter(id=muni.id).exists() or tmpl.municipalities.count() == 0):
+    muni = request.municipality
+    if muni and not template_visible_to(tmpl, muni):
         return HttpResponse(status=403)
     form = DocumentTemplateForm(request.POST or None, instance=tmpl, user=request.user)
-    citizen_fields, muni_fields = _available_template_fields()
-    dyn_library = DynamicFieldLibrary.objects.all().order_by("key")
+    catalog = field_catalog()
     header_logo_url = ""
     header_banner_url = ""
     if muni:
@@ -1199,15 +1377,22 @@ def template_edit(request, slug):
     if request.method == "POST" and form.is_valid():
         tmpl = form.save(commit=False)
         tmpl.dynamic_fields = form.cleaned_data.get("dynamic_fields", [])
-        tmpl.save()
-        _sync_dynamic_library(tmpl.dynamic_fields)
-        if request.user.is_superuser:
-            form.save_m2m()
+        cost, cost_error, cost_warning = _check_template_cost(tmpl)
+        if cost_error:
+            form.add_error(None, cost_error)
         else:
-            if muni:
-                tmpl.municipalities.set([muni])
-        messages.success(request, "Template actualizat.")
-        return redirect("template_list")
+            if cost_warning:
+                messages.warning(request, cost_warning)
+            tmpl.save(revision_user=request.user if request.user.is_authenticated else None)
+            _store_template_cost(tmpl, cost)
+            _sync_dynamic_library(tmpl.dynamic_fields)
+            if request.user.is_superuser:
+                form.save_m2m()
+            else:
+                if muni:
+                    tmpl.municipalities.set([muni])
+            messages.success(request, _template_saved_message("Template actualizat.", tmpl))
+            return redirect("template_list")
 
     return render(
         request,
@@ -1215,19 +1400,17 @@ def template_edit(request, slug):
         {
             "form": form,
             "tmpl": tmpl,
-            "fields_citizen": citizen_fields,
-            "fields_muni": muni_fields,
+            "field_catalog_version": catalog["version"],
             "header_logo_url": header_logo_url,
             "header_banner_url": header_banner_url,
-            "dynamic_library": dyn_library,
         },
     )
 
 
 def template_delete(request, slug):
     tmpl = get_object_or_404(DocumentTemplate, slug=slug)
-    muni = _user_municipality(request.user)
-    if muni and not (tmpl.municipalities.filter(id=muni.id).exists() or tmpl.municipalities.count() == 0):
+    muni = request.municipality
+    if muni and not template_visible_to(tmpl, muni):
         return HttpResponse(status=403)
     if request.method == "POST":
         tmpl.delete()
@@ -1236,6 +1419,27 @@ def template_delete(request, slug):
     return render(request, "core/confirm_delete.html", {"object": tmpl})
 
 
+@user_passes_test(lambda u: u.is_staff)
+def template_field_catalog(request):
+    """
+    Catalogul de campuri pentru editor, ca JSON. Pagina cere `?v=<versiune>`; cat timp versiunea
+    ceruta este cea curenta, browserul poate pastra raspunsul nelimitat.
+    """
+    catalog = field_catalog()
+    etag = f'"{catalog["version"]}"'
+    if request.headers.get("If-None-Match") == etag:
+        resp = HttpResponse(status=304)
+    else:
+        resp = JsonResponse(catalog)
+    resp["ETag"] = etag
+    if request.GET.get("v") == catalog["version"]:
+        resp["Cache-Control"] = "private, max-age=31536000, immutable"
+    else:
+        resp["Cache-Control"] = "private, no-cache"
+    resp.client_cacheable = True
+    return resp
+
+
 @user_passes_test(lambda u: u.is_superuser)
 def dynamic_field_delete(request, pk):
     field = get_object_or_404(DynamicFieldLibrary, pk=pk)
@@ -1249,222 +1453,581 @@ def dynamic_field_delete(request, pk):
 
 @user_passes_test(lambda u: u.is_staff)
 def export_citizens(request):
-    muni = _user_municipality(request.user)
+    muni = request.municipality
     qs = Citizen.objects.all()
     if muni:
         qs = qs.filter(municipality=muni)
-    def row_iter():
-        header = ["full_name","identifier","nume","prenume","cnp","strada","nr","localitate","judet","telefon","email_recuperare","beneficiar","emitent","tip_document","numar_document_extern","data_emitere"]
-        yield ",".join(header) + "\n"
-        for c in qs:
-            vals = [
-                c.full_name or "",
-                c.identifier or "",
-                c.nume or "",
-                c.prenume or "",
-                c.cnp or "",
-                c.strada or "",
-                c.nr or "",
-                c.localitate or "",
-                c.judet or "",
-                c.telefon or "",
-                c.email_recuperare or "",
-                c.beneficiar or "",
-                c.emitent or "",
-                c.tip_document or "",
-                c.numar_document_extern or "",
-                c.data_emitere.isoformat() if c.data_emitere else "",
-            ]
-            yield ",".join([v.replace(",", " ") for v in vals]) + "\n"
-    resp = StreamingHttpResponse(row_iter(), content_type="text/csv")
-    resp["Content-Disposition"] = 'attachment; filename="citizens.csv"'
+    if request.GET.get("format") == "ndjson":
+        chunks, content_type, filename = iter_citizens_ndjson(qs), "application/x-ndjson", "citizens.ndjson"
+    else:
+        chunks, content_type, filename = iter_citizens_csv(qs), "text/csv", "citizens.csv"
+    if request.GET.get("gzip") == "1":
+        chunks, content_type, filename = gzip_stream(chunks), "application/gzip", filename + ".gz"
+    resp = StreamingHttpResponse(chunks, content_type=content_type)
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
     return resp
 
 
 @user_passes_test(lambda u: u.is_staff)
 def import_citizens(request):
     form = ImportCitizensForm(request.POST or None, request.FILES or None, user=request.user)
-    session_key = "import_citizens_data"
-
-    # Daca suntem in pasul de confirmare (choice doar), refolosim continutul din sesiune
-    if request.method == "POST" and not request.FILES and request.POST.get("choice") and request.session.get(session_key):
-        cached = request.session.get(session_key)
-        decoded = cached.get("csv_text", "")
-        muni_id = cached.get("muni_id")
-        choice = request.POST.get("choice")
-        skip = choice == "skip"
-        overwrite = choice == "overwrite"
-        muni = _user_municipality(request.user)
-        if request.user.is_superuser and muni_id:
-            muni = Municipality.objects.filter(pk=muni_id).first() or muni
-        reader = list(csv.DictReader(decoded.splitlines()))
-        count = 0
-        for row in reader:
-            cnp = row.get("cnp") or None
-            if cnp and Citizen.objects.filter(cnp=cnp).exists() and skip:
-                continue
-            date_emitere = row.get("data_emitere") or None
-            if date_emitere:
-                try:
-                    date_emitere = timezone.datetime.fromisoformat(date_emitere).date()
-                except Exception:
-                    date_emitere = None
-            Citizen.objects.update_or_create(
-                cnp=cnp,
-                defaults={
-                    "full_name": row.get("full_name",""),
-                    "identifier": row.get("identifier",""),
-                    "nume": row.get("nume",""),
-                    "prenume": row.get("prenume",""),
-                    "strada": row.get("strada",""),
-                    "nr": row.get("nr",""),
-                    "localitate": row.get("localitate",""),
-                    "judet": row.get("judet",""),
-                    "telefon": row.get("telefon",""),
-                    "email_recuperare": row.get("email_recuperare",""),
-                    "beneficiar": row.get("beneficiar",""),
-                    "emitent": row.get("emitent",""),
-                    "tip_document": row.get("tip_document",""),
-                    "numar_document_extern": row.get("numar_document_extern",""),
-                    "data_emitere": date_emitere,
-                    "municipality": muni,
-                },
-            )
-            count += 1
-        messages.success(request, f"Importat {count} cetateni.")
-        request.session.pop(session_key, None)
-        return redirect("citizen_list")
-
     if request.method == "POST" and form.is_valid():
         file = form.cleaned_data["file"]
-        muni = _user_municipality(request.user)
+        muni = request.municipality
         if request.user.is_superuser:
             muni = form.cleaned_data.get("municipality") or muni
-        decoded_text = file.read().decode("utf-8")
-        reader = list(csv.DictReader(decoded_text.splitlines()))
-        existing_cnps = []
-        for row in reader:
-            cnp_val = (row.get("cnp") or "").strip()
-            if cnp_val and Citizen.objects.filter(cnp=cnp_val).exists():
-                existing_cnps.append(cnp_val)
-        overwrite = request.POST.get("overwrite")
-        skip = request.POST.get("skip")
-        if existing_cnps and not overwrite and not skip:
-            request.session[session_key] = {"csv_text": decoded_text, "muni_id": muni.id if muni else None}
-            return render(
-                request,
-                "core/import_citizens_confirm.html",
-                {
-                    "form": form,
-                    "duplicates": existing_cnps,
-                    "file_name": file.name,
-                },
-            )
+        if form.cleaned_data.get("sync"):
+            mode = "sync"
+        else:
+            mode = "overwrite" if request.POST.get("overwrite") else "skip" if request.POST.get("skip") else ""
+        job = create_import_job(file, muni, request.user, mode=mode, dry_run=form.cleaned_data.get("dry_run", False))
+        start_import_job(job)
+        return redirect("citizen_import_job", pk=job.pk)
+    return render(request, "core/import_citizens.html", {"form": form})
+
+
+def _citizen_import_job_for(request, pk):
+    job = get_object_or_404(CitizenImportJob, pk=pk)
+    if not request.user.is_superuser and job.created_by_id != request.user.id:
+        return None
+    return job
+
+
+def _citizen_import_job_state(job: CitizenImportJob):
+    return {
+        "id": job.pk,
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "finished": job.is_finished,
+        "file_name": job.file_name,
+        "mode": job.mode,
+        "rows_done": job.rows_done,
+        "inserted": job.created_count,
+        "updated": job.updated_count,
+        "skipped": job.skipped_count,
+        "unchanged": job.unchanged_count,
+        "dry_run": job.dry_run,
+        "error_count": job.error_count,
+        "errors": job.errors,
+        "duplicate_count": job.duplicate_count,
+        "failure": job.failure,
+    }
+
+
+@user_passes_test(lambda u: u.is_staff)
+def citizen_import_job(request, pk):
+    job = _citizen_import_job_for(request, pk)
+    if job is None:
+        return HttpResponse(status=403)
+    if request.method == "POST":
+        choice = request.POST.get("choice")
+        if choice in {"overwrite", "skip"} and confirm_import_job(job, choice):
+            start_import_job(job)
+        elif choice == "cancel" and cancel_import_job(job):
+            messages.info(request, "Import anulat.")
+            return redirect("import_citizens")
+        return redirect("citizen_import_job", pk=job.pk)
+    return render(request, "core/import_citizens_job.html", {"job": job})
+
+
+@user_passes_test(lambda u: u.is_staff)
+def citizen_import_job_progress(request, pk):
+    job = _citizen_import_job_for(request, pk)
+    if job is None:
+        return JsonResponse({"error": "forbidden"}, status=403)
+    if job.status in {"pending", "queued", "running"} and claimable_jobs().filter(pk=job.pk).exists():
+        # job nou ramas fara worker sau intrerupt (ex: restart): il reluam de la checkpoint
+        start_import_job(job)
+    return JsonResponse(_citizen_import_job_state(job))
+
+
+TEMPLATE_BUNDLE_FORMAT = "citizen-doc-templates"
+TEMPLATE_BUNDLE_VERSION = 1
+TEMPLATE_BUNDLE_FIELDS = ("name", "slug", "description", "template_type", "output_type", "dynamic_fields", "is_global")
+# la import se scriu doar imagini din folderul antetelor (sigla, banner), verificate cu Pillow
+TEMPLATE_BUNDLE_MEDIA_PREFIXES = ("municipality_headers/",)
+TEMPLATE_BUNDLE_MEDIA_FORMATS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG", ".gif": "GIF", ".webp": "WEBP"}
+TEMPLATE_BUNDLE_MEDIA_MAX_BYTES = 5 * 1024 * 1024
+# corpul unui template din arhiva; dimensiunea declarata se verifica inainte de dezarhivare
+TEMPLATE_BUNDLE_BODY_MAX_BYTES = 2 * 1024 * 1024
+MEDIA_REF_RE = re.compile(r"""\b(?:src|href)\s*=\s*["']([^"']+)["']""", re.IGNORECASE)
+
+
+class _CsvLineBuffer:
+    def write(self, value):
+        return value
+
+
+def _template_media_refs(body_html: str):
+    """Imaginile de antet din MEDIA_ROOT referite in HTML (sigla, banner); restul link-urilor raman ca atare."""
+    refs = set()
+    prefixes = [settings.MEDIA_URL]
+    if settings.SITE_BASE_URL:
+        prefixes.append(settings.SITE_BASE_URL + settings.MEDIA_URL)
+    for url in MEDIA_REF_RE.findall(body_html or ""):
+        if "{" in url:
+            continue
+        url = url.split("?", 1)[0].split("#", 1)[0]
+        for prefix in prefixes:
+            if url.startswith(prefix):
+                path = _safe_media_path(unquote(url[len(prefix):]))
+                if path:
+                    refs.add(path)
+                break
+    return refs
+
+
+def _safe_media_path(path: str):
+    path = posixpath.normpath(path or "").lstrip("/")
+    if not path.startswith(TEMPLATE_BUNDLE_MEDIA_PREFIXES) or ".." in path.split("/"):
+        return None
+    if posixpath.splitext(path)[1].lower() not in TEMPLATE_BUNDLE_MEDIA_FORMATS:
+        return None
+    return path
+
+
+def _template_bundle_record(tmpl: DocumentTemplate, muni=None):
+    record = {field: getattr(tmpl, field) for field in TEMPLATE_BUNDLE_FIELDS}
+    record["dynamic_fields"] = record["dynamic_fields"] or []
+    # primariile se exporta dupa slug; un administrator de primarie vede doar propria primarie
+    record["municipalities"] = sorted(m.slug for m in tmpl.municipalities.all() if muni is None or m.pk == muni.pk)
+    return record
+
 
-        count = 0
-        for row in reader:
-            cnp = row.get("cnp") or None
-            if cnp and Citizen.objects.filter(cnp=cnp).exists() and skip:
+def _template_bundle_manifest():
+    return {
+        "format": TEMPLATE_BUNDLE_FORMAT,
+        "version": TEMPLATE_BUNDLE_VERSION,
+        "exported_at": timezone.now().isoformat(),
+    }
+
+
+def _template_bundle_library(keys: set):
+    return [
+        {"key": f.key, "label": f.label, "length": f.length}
+        for f in DynamicFieldLibrary.objects.filter(key__in=keys).order_by("key")
+    ]
+
+
+def _jsonl_templates_iter(qs, muni=None):
+    yield json.dumps({"type": "manifest", **_template_bundle_manifest()}) + "\n"
+    keys, media = set(), set()
+    for tmpl in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        record = _template_bundle_record(tmpl, muni)
+        record["body_html"] = tmpl.body_html
+        keys.update(d.get("key") for d in record["dynamic_fields"] if d.get("key"))
+        media |= _template_media_refs(tmpl.body_html)
+        yield json.dumps({"type": "template", **record}, ensure_ascii=False) + "\n"
+    for item in _template_bundle_library(keys):
+        yield json.dumps({"type": "dynamic_field", **item}, ensure_ascii=False) + "\n"
+    for path in sorted(media):
+        if not default_storage.exists(path):
+            continue
+        with default_storage.open(path, "rb") as fh:
+            content = base64.b64encode(fh.read()).decode("ascii")
+        yield json.dumps({"type": "media", "path": path, "content": content}) + "\n"
+
+
+def _zip_templates_iter(qs, muni=None):
+    # un fisier .html per template + manifest.json (scris la final, cand stim tot continutul)
+    buffer = _ZipStreamBuffer()
+    manifest = {**_template_bundle_manifest(), "templates": [], "dynamic_fields": [], "media": []}
+    keys, media = set(), set()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, tmpl in enumerate(qs.iterator(chunk_size=EXPORT_CHUNK_SIZE), start=1):
+            record = _template_bundle_record(tmpl, muni)
+            record["body"] = f"templates/{index:05d}-{tmpl.slug or 'template'}.html"
+            archive.writestr(record["body"], tmpl.body_html or "")
+            manifest["templates"].append(record)
+            keys.update(d.get("key") for d in record["dynamic_fields"] if d.get("key"))
+            media |= _template_media_refs(tmpl.body_html)
+            yield buffer.drain()
+        for path in sorted(media):
+            try:
+                src = default_storage.open(path, "rb")
+            except OSError:
                 continue
-            date_emitere = row.get("data_emitere") or None
-            if date_emitere:
-                try:
-                    date_emitere = timezone.datetime.fromisoformat(date_emitere).date()
-                except Exception:
-                    date_emitere = None
-            Citizen.objects.update_or_create(
-                cnp=cnp,
-                defaults={
-                    "full_name": row.get("full_name",""),
-                    "identifier": row.get("identifier",""),
-                    "nume": row.get("nume",""),
-                    "prenume": row.get("prenume",""),
-                    "strada": row.get("strada",""),
-                    "nr": row.get("nr",""),
-                    "localitate": row.get("localitate",""),
-                    "judet": row.get("judet",""),
-                    "telefon": row.get("telefon",""),
-                    "email_recuperare": row.get("email_recuperare",""),
-                    "beneficiar": row.get("beneficiar",""),
-                    "emitent": row.get("emitent",""),
-                    "tip_document": row.get("tip_document",""),
-                    "numar_document_extern": row.get("numar_document_extern",""),
-                    "data_emitere": date_emitere,
-                    "municipality": muni,
-                },
-            )
-            count += 1
-        messages.success(request, f"Importat {count} cetateni.")
-        return redirect("citizen_list")
-    return render(request, "core/import_citizens.html", {"form": form})
+            with src, archive.open(f"media/{path}", mode="w", force_zip64=True) as dst:
+                for chunk in src.chunks():
+                    dst.write(chunk)
+                    yield buffer.drain()
+            manifest["media"].append(path)
+        manifest["dynamic_fields"] = _template_bundle_library(keys)
+        archive.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=1))
+    yield buffer.drain()
+
+
+def _csv_templates_iter(qs):
+    writer = csv.writer(_CsvLineBuffer())
+    yield writer.writerow(["name", "description", "template_type", "output_type", "body_html", "dynamic_fields"])
+    for t in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        dyn = ";".join(
+            f"{d.get('key','')}|{d.get('label','')}|{d.get('length',10)}|{d.get('type','text')}|{d.get('options','')}"
+            for d in t.dynamic_fields or []
+        )
+        yield writer.writerow([t.name, t.description or "", t.template_type, t.output_type, t.body_html or "", dyn])
 
 
 @user_passes_test(lambda u: u.is_staff)
 def export_templates(request):
-    muni = _user_municipality(request.user)
-    qs = DocumentTemplate.objects.all()
-    if muni:
-        qs = qs.filter(models.Q(municipalities=muni) | models.Q(municipalities__isnull=True)).distinct()
-    def row_iter():
-        header = ["name","description","template_type","output_type","body_html","dynamic_fields"]
-        yield ",".join(header) + "\n"
-        for t in qs:
-            dyn = ""
-            if t.dynamic_fields:
-                dyn = ";".join([
-                    f"{d.get('key','')}|{d.get('label','')}|{d.get('length',10)}|{d.get('type','text')}|{d.get('options','')}"
-                    for d in t.dynamic_fields
-                ])
-            vals = [
-                t.name.replace(",", " "),
-                (t.description or "").replace(",", " "),
-                t.template_type,
-                t.output_type,
-                (t.body_html or "").replace("\\n"," ").replace(","," "),
-                dyn,
-            ]
-            yield ",".join(vals) + "\n"
-    resp = StreamingHttpResponse(row_iter(), content_type="text/csv")
-    resp["Content-Disposition"] = 'attachment; filename="templates.csv"'
+    muni = request.municipality
+    qs = visible_templates(muni).order_by("name", "id")
+    fmt = request.GET.get("format", "csv")
+    scope = None if request.user.is_superuser else muni
+    if fmt in ("zip", "jsonl"):
+        qs = qs.prefetch_related("municipalities")
+    if fmt == "zip":
+        resp = StreamingHttpResponse(_zip_templates_iter(qs, scope), content_type="application/zip")
+        resp["Content-Disposition"] = 'attachment; filename="templates.zip"'
+    elif fmt == "jsonl":
+        resp = StreamingHttpResponse(_jsonl_templates_iter(qs, scope), content_type="application/x-ndjson")
+        resp["Content-Disposition"] = 'attachment; filename="templates.jsonl"'
+    else:
+        resp = StreamingHttpResponse(_csv_templates_iter(qs), content_type="text/csv")
+        resp["Content-Disposition"] = 'attachment; filename="templates.csv"'
     return resp
 
 
+def _bundle_media_file(path: str, content: bytes):
+    """
+    Valideaza un fisier din pachet: doar imagini de antet (prefix + extensie permise), iar continutul
+    trebuie sa fie chiar imaginea anuntata de extensie. Intoarce (cale, continut) sau None.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    path = _safe_media_path(path)
+    if not path or not content or len(content) > TEMPLATE_BUNDLE_MEDIA_MAX_BYTES:
+        return None
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image_format = image.format
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        return None
+    if image_format != TEMPLATE_BUNDLE_MEDIA_FORMATS[posixpath.splitext(path)[1].lower()]:
+        return None
+    return path, content
+
+
+def _restore_bundle_media(media: list):
+    """
+    Pune in storage imaginile din pachet, dupa commit-ul importului. Un fisier existent cu acelasi nume
+    nu este suprascris (ex: sigla actuala a primariei); HTML-ul importat ramane neschimbat.
+    """
+    for path, content in media:
+        if not default_storage.exists(path):
+            default_storage.save(path, ContentFile(content))
+
+
+def _bundle_template_row(record: dict):
+    dynamic_fields = record.get("dynamic_fields") or []
+    if not isinstance(dynamic_fields, list):
+        raise ValueError(f"dynamic_fields invalid pentru {record.get('name')!r}")
+    municipalities = record.get("municipalities")
+    if municipalities is not None and not isinstance(municipalities, list):
+        raise ValueError(f"municipalities invalid pentru {record.get('name')!r}")
+    return {
+        "name": record.get("name") or "",
+        "slug": record.get("slug") or "",
+        "description": record.get("description") or "",
+        "output_type": record.get("output_type") or "pdf",
+        "template_type": record.get("template_type") or "generate",
+        "body_html": record.get("body_html") or "",
+        "dynamic_fields": dynamic_fields,
+        # None = export vechi, fara atribuiri: vizibilitatea template-ului nu se schimba
+        "municipalities": None if municipalities is None else [str(slug) for slug in municipalities],
+        "is_global": bool(record.get("is_global", not municipalities)),
+    }
+
+
+def _check_bundle_manifest(manifest: dict):
+    if manifest.get("format") != TEMPLATE_BUNDLE_FORMAT:
+        raise ValueError("fisierul nu este un export de template-uri")
+    if manifest.get("version", 0) > TEMPLATE_BUNDLE_VERSION:
+        raise ValueError(f"versiune de export nesuportata: {manifest.get('version')}")
+
+
+def _template_jsonl_rows(file, library: list, media: list):
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        for line in text:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            kind = record.pop("type", None)
+            if kind == "manifest":
+                _check_bundle_manifest(record)
+            elif kind == "template":
+                yield _bundle_template_row(record)
+            elif kind == "dynamic_field":
+                library.append(record)
+            elif kind == "media" and _safe_media_path(record.get("path")):
+                item = _bundle_media_file(record["path"], base64.b64decode(record.get("content") or ""))
+                if item:
+                    media.append(item)
+    finally:
+        text.detach()
+
+
+def _template_zip_rows(file, library: list, media: list):
+    with zipfile.ZipFile(file) as archive:
+        try:
+            manifest = json.loads(archive.read("manifest.json"))
+        except KeyError:
+            raise ValueError("arhiva nu contine manifest.json")
+        _check_bundle_manifest(manifest)
+        for path in manifest.get("media", []):
+            if not _safe_media_path(path):
+                continue
+            info = archive.getinfo(f"media/{path}")
+            if info.file_size <= TEMPLATE_BUNDLE_MEDIA_MAX_BYTES:
+                item = _bundle_media_file(path, archive.read(info))
+                if item:
+                    media.append(item)
+        library.extend(manifest.get("dynamic_fields", []))
+        for record in manifest.get("templates", []):
+            info = archive.getinfo(record["body"])
+            if info.file_size > TEMPLATE_BUNDLE_BODY_MAX_BYTES:
+                raise ValueError(
+                    f"corpul template-ului {record.get('name')!r} depaseste "
+                    f"{TEMPLATE_BUNDLE_BODY_MAX_BYTES // (1024 * 1024)} MB"
+                )
+            record = dict(record, body_html=archive.read(info).decode("utf-8"))
+            yield _bundle_template_row(record)
+
+
+TEMPLATE_IMPORT_CHUNK_SIZE = 200
+
+
+def _template_import_rows(file):
+    # citim CSV-ul pe masura ce il parcurgem, fara sa tinem tot fisierul decodat in memorie
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        for row in csv.DictReader(text):
+            dyn_raw = row.get("dynamic_fields") or ""
+            # dynamic stored as ; separated of key|label|length
+            yield {
+                "name": row.get("name") or "",
+                "description": row.get("description") or "",
+                "output_type": row.get("output_type") or "pdf",
+                "template_type": row.get("template_type") or "generate",
+                "body_html": row.get("body_html") or "",
+                "dynamic_fields": parse_dynamic_fields("\n".join(dyn_raw.split(";"))) if dyn_raw else [],
+            }
+    finally:
+        text.detach()
+
+
+def _unique_template_slugs(preferred: dict):
+    # preferred: nume -> slug dorit (din export) sau "" pentru slug generat din nume
+    bases = {name: slugify(slug or name) or "template" for name, slug in preferred.items()}
+    taken = set(DocumentTemplate.objects.filter(slug__in=bases.values()).values_list("slug", flat=True))
+    slugs = {}
+    for name, base in bases.items():
+        slug = base
+        while slug in taken:
+            slug = f"{base}-{secrets.token_hex(3)}"
+        taken.add(slug)
+        slugs[name] = slug
+    return slugs
+
+
+def _preflight_template_chunk(rows: list[dict], stats: dict):
+    """Pre-flight pe randurile unei bucati, fara scrieri in baza; intoarce {nume: (rand, cost)} acceptate."""
+    accepted = {}
+    for data in rows:
+        stats["rows"] += 1
+        cost, cost_error, cost_warning = _check_template_cost(
+            DocumentTemplate(
+                name=data["name"],
+                body_html=data["body_html"],
+                output_type=data["output_type"],
+                dynamic_fields=data["dynamic_fields"],
+            )
+        )
+        if cost_error:
+            stats["rejected"].append(f"{data['name']}: {cost_error}")
+            continue
+        if cost_warning:
+            stats["warned"].append(f"{data['name']}: {cost_warning}")
+        # acelasi nume de doua ori in fisier: ultimul rand castiga, ca la importul rand cu rand
+        accepted.pop(data["name"], None)
+        accepted[data["name"]] = (data, cost)
+    return accepted
+
+
+def _bundle_municipality_ids(chunks: list[dict], stats: dict):
+    """
+    Rezolva primariile exportate (dupa slug) pentru un import fara primarie tinta. Un template
+    atribuit doar unor primarii care nu exista aici este respins, ca sa nu devina global.
+    """
+    slugs = {slug for accepted in chunks for data, _cost in accepted.values() for slug in data.get("municipalities") or []}
+    ids = dict(Municipality.objects.filter(slug__in=slugs).values_list("slug", "pk")) if slugs else {}
+    for accepted in chunks:
+        for name, (data, _cost) in list(accepted.items()):
+            if data.get("municipalities") is None:
+                continue
+            missing = [slug for slug in data["municipalities"] if slug not in ids]
+            data["municipality_ids"] = [ids[slug] for slug in data["municipalities"] if slug in ids]
+            if not data["is_global"] and not data["municipality_ids"]:
+                stats["rejected"].append(f"{name}: primariile {', '.join(missing)} nu exista")
+                del accepted[name]
+            elif missing:
+                stats["warned"].append(f"{name}: primariile {', '.join(missing)} nu exista, atribuirea lor a fost omisa")
+
+
+def _import_template_chunk(accepted: dict, muni, user, stats: dict):
+    if not accepted:
+        return
+
+    _sync_dynamic_library([item for data, _cost in accepted.values() for item in data["dynamic_fields"]])
+
+    existing = {}
+    for tmpl in DocumentTemplate.objects.filter(name__in=accepted).select_related("current_revision"):
+        existing.setdefault(tmpl.name, tmpl)
+    new_slugs = {name: data.get("slug", "") for name, (data, _cost) in accepted.items() if name not in existing}
+    slugs = _unique_template_slugs(new_slugs) if new_slugs else {}
+    now = timezone.now()
+    templates, to_create, assignments = [], [], {}
+    for name, (data, _cost) in accepted.items():
+        tmpl = existing.get(name)
+        if tmpl is None:
+            tmpl = DocumentTemplate(name=name, slug=slugs[name], created_by=user)
+            to_create.append(tmpl)
+        for field in ("description", "output_type", "template_type", "body_html", "dynamic_fields"):
+            setattr(tmpl, field, data[field])
+        tmpl.updated_at = now
+        if muni:
+            tmpl.is_global = False
+            assignments[name] = [muni.pk]
+        elif data.get("municipality_ids") is not None:
+            tmpl.is_global = not data["municipality_ids"]
+            assignments[name] = data["municipality_ids"]
+        templates.append(tmpl)
+    DocumentTemplate.objects.bulk_create(to_create)
+    stats["created"] += len(to_create)
+    stats["updated"] += len(templates) - len(to_create)
+
+    # bulk_create/bulk_update nu trec prin save(): reviziile se creeaza aici, la fel ca snapshot_revision()
+    last_numbers = dict(
+        DocumentTemplateRevision.objects.filter(template__in=[t for t in templates if t.name in existing])
+        .values("template_id")
+        .annotate(n=models.Max("number"))
+        .values_list("template_id", "n")
+    )
+    revisions = []
+    for tmpl in templates:
+        body, placeholders, content_hash = template_revision_payload(tmpl.body_html, tmpl.dynamic_fields)
+        current = tmpl.current_revision if tmpl.current_revision_id else None
+        if current and current.content_hash == content_hash:
+            continue
+        cost = accepted[tmpl.name][1] or {}
+        revisions.append(
+            DocumentTemplateRevision(
+                template=tmpl,
+                number=last_numbers.get(tmpl.pk, 0) + 1,
+                body_html=body,
+                dynamic_fields=tmpl.dynamic_fields or [],
+                placeholders=placeholders,
+                content_hash=content_hash,
+                source_size=len(tmpl.body_html or ""),
+                created_by=user,
+                preflight_ms=cost.get("render_ms"),
+                preflight_pages=cost.get("pages"),
+                preflight_bytes=cost.get("output_bytes"),
+            )
+        )
+    DocumentTemplateRevision.objects.bulk_create(revisions)
+    for revision in revisions:
+        revision.template.current_revision = revision
+    DocumentTemplate.objects.bulk_update(
+        templates,
+        ["description", "output_type", "template_type", "body_html", "dynamic_fields",
+         "is_global", "current_revision", "updated_at"],
+    )
+
+    if assignments:
+        # echivalentul municipalities.set(...) pentru tot chunk-ul; is_global a fost setat mai sus
+        through = DocumentTemplate.municipalities.through
+        pairs = {(t.pk, muni_id) for t in templates for muni_id in assignments.get(t.name, ())}
+        stale = [
+            pk
+            for pk, template_id, muni_id in through.objects.filter(
+                documenttemplate_id__in=[t.pk for t in templates if t.name in assignments]
+            ).values_list("pk", "documenttemplate_id", "municipality_id")
+            if (template_id, muni_id) not in pairs
+        ]
+        through.objects.filter(pk__in=stale).delete()
+        through.objects.bulk_create(
+            [through(documenttemplate_id=pk, municipality_id=muni_id) for pk, muni_id in sorted(pairs)],
+            ignore_conflicts=True,
+        )
+
+
+def _bulk_import_templates(rows, muni=None, user=None, library=None, media=None):
+    """
+    Importa template-uri in bucati de TEMPLATE_IMPORT_CHUNK_SIZE. Pre-flight-ul (randare + PDF) ruleaza
+    pe toate randurile inainte de tranzactie, ca blocarea de scriere sa nu fie tinuta pe durata
+    randarilor; apoi, intr-o singura tranzactie: o interogare de existenta pe bucata si insert/update
+    in bloc pentru template-uri, revizii, primarii si biblioteca de campuri dinamice. `library`
+    (definitiile exportate ale campurilor dinamice) se aplica la final, dupa ce `rows` a fost consumat;
+    imaginile din `media` se scriu in storage doar dupa commit. Fara `muni`, atribuirile exportate
+    (is_global + primariile dupa slug) se refac; cu `muni`, template-urile ajung doar la acea primarie.
+    """
+    stats = {"rows": 0, "created": 0, "updated": 0, "warned": [], "rejected": []}
+    started = time.perf_counter()
+    # un fisier invalid (eroare la citirea randurilor) opreste importul aici, inainte de orice scriere
+    chunks = [_preflight_template_chunk(chunk, stats) for chunk in iter_chunks(rows, TEMPLATE_IMPORT_CHUNK_SIZE)]
+    if muni is None:
+        _bundle_municipality_ids(chunks, stats)
+    stats["preflight_seconds"] = time.perf_counter() - started
+    written = time.perf_counter()
+    with transaction.atomic():
+        for accepted in chunks:
+            _import_template_chunk(accepted, muni, user, stats)
+        if library:
+            _sync_dynamic_library(library)
+        if media:
+            transaction.on_commit(lambda: _restore_bundle_media(media))
+    stats["write_seconds"] = time.perf_counter() - written
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
 @user_passes_test(lambda u: u.is_staff)
 def import_templates(request):
     form = ImportTemplatesForm(request.POST or None, request.FILES or None, user=request.user)
     if request.method == "POST" and form.is_valid():
         file = form.cleaned_data["file"]
-        muni = _user_municipality(request.user)
+        muni = request.municipality
         if request.user.is_superuser:
             muni = form.cleaned_data.get("municipality") or muni
-        decoded = file.read().decode("utf-8").splitlines()
-        reader = csv.DictReader(decoded)
-        count = 0
-        for row in reader:
-            name = row.get("name","")
-            body = row.get("body_html","")
-            dyn_raw = row.get("dynamic_fields","")
-            template_type = row.get("template_type","generate") or "generate"
-            dyn = []
-            if dyn_raw:
-                # dynamic stored as ; separated of key|label|length
-                lines = dyn_raw.split(";")
-                dyn = parse_dynamic_fields("\\n".join(lines))
-            _sync_dynamic_library(dyn)
-            tmpl, _ = DocumentTemplate.objects.update_or_create(
-                name=name,
-                defaults={
-                    "description": row.get("description",""),
-                    "output_type": row.get("output_type","pdf"),
-                    "template_type": template_type,
-                    "body_html": body,
-                    "dynamic_fields": dyn,
-                },
-            )
-            if muni:
-                tmpl.municipalities.set([muni])
-            count += 1
-        messages.success(request, f"Importat {count} template-uri.")
+        file.seek(0)
+        library, media = [], []
+        filename = (file.name or "").lower()
+        if filename.endswith(".zip"):
+            rows = _template_zip_rows(file.file, library, media)
+        elif filename.endswith((".jsonl", ".ndjson")):
+            rows = _template_jsonl_rows(file.file, library, media)
+        else:
+            rows = _template_import_rows(file.file)
+        try:
+            stats = _bulk_import_templates(rows, muni=muni, user=request.user, library=library, media=media)
+        except (UnicodeDecodeError, csv.Error, ValueError, KeyError, zipfile.BadZipFile) as exc:
+            messages.error(request, f"Fisier invalid, nimic nu a fost importat: {exc}")
+            return redirect("import_templates")
+        count = stats["created"] + stats["updated"]
+        rate = stats["rows"] / stats["write_seconds"] if stats["write_seconds"] else stats["rows"]
+        messages.success(
+            request,
+            f"Importat {count} template-uri ({stats['created']} noi, {stats['updated']} actualizate) "
+            f"in {stats['seconds']:.2f}s: pre-flight {stats['preflight_seconds']:.2f}s, "
+            f"scriere {stats['write_seconds']:.2f}s ({rate:.0f} randuri/s).",
+        )
+        for msg in stats["warned"]:
+            messages.warning(request, msg)
+        for msg in stats["rejected"]:
+            messages.error(request, f"Neimportat - {msg}")
         return redirect("template_list")
     return render(request, "core/import_templates.html", {"form": form})
 
@@ -1473,7 +2036,7 @@ def generate_select(request):
     if not request.user.is_staff:
         return redirect("citizen_request_document")
 
-    base_muni = _user_municipality(request.user)
+    base_muni = request.municipality
     selected_muni = base_muni
     municipalities = None
     if request.user.is_superuser:
@@ -1483,16 +2046,15 @@ def generate_select(request):
             selected_muni = Municipality.objects.filter(pk=selected_muni_id).first()
 
     # superadmin vede tot; staff este limitat la propria primarie
-    citizens = Citizen.objects.all()
+    citizens = _generate_citizens(request.user, selected_muni)
     templates = DocumentTemplate.objects.all()
     if not request.user.is_superuser and selected_muni:
-        citizens = citizens.filter(municipality=selected_muni)
-        templates = templates.filter(models.Q(municipalities=selected_muni) | models.Q(municipalities__isnull=True)).distinct()
+        templates = visible_templates(selected_muni)
 
     if request.method == "POST":
         citizen_id = request.POST.get("citizen_id")
         template_slug = request.POST.get("template_slug")
-        target = get_object_or_404(Citizen, id=citizen_id)
+        target = get_object_or_404(citizens, id=citizen_id)
         tmpl = DocumentTemplate.objects.filter(slug=template_slug).first()
         if not tmpl:
             messages.error(request, "Template inexistent.")
@@ -1501,10 +2063,9 @@ def generate_select(request):
         # verificam accesul pe institutia curenta doar pentru staff (non-superadmin)
         if not request.user.is_superuser:
             user_muni = selected_muni or base_muni or target.municipality
-            if tmpl.municipalities.exists():
-                if not user_muni or not tmpl.municipalities.filter(pk=user_muni.pk).exists():
-                    messages.error(request, "Template-ul nu este disponibil pentru institutia ta.")
-                    return redirect("generate_select")
+            if not template_visible_to(tmpl, user_muni):
+                messages.error(request, "Template-ul nu este disponibil pentru institutia ta.")
+                return redirect("generate_select")
 
         if target.profile_status == "pending_validation":
             messages.error(request, "Profilul acestui cetatean asteapta validare. Nu se pot genera documente.")
@@ -1524,6 +2085,7 @@ def generate_select(request):
             work_item = WorkItem.objects.create(
                 citizen=target,
                 template=tmpl,
+                revision_id=tmpl.current_revision_id,
                 municipality=muni_target,
                 created_by=request.user,
                 output_type=tmpl.output_type,
@@ -1540,11 +2102,11 @@ def generate_select(request):
         if request.user.is_superuser and selected_muni:
             url = f"{url}?municipality_id={selected_muni.id}"
         return redirect(url)
+    # cetatenii se incarca la cerere prin citizen_lookup, nu toti in pagina
     return render(
         request,
         "core/generate_select.html",
         {
-            "citizens": citizens,
             "templates": templates,
             "municipalities": municipalities,
             "selected_muni": selected_muni,
@@ -1552,17 +2114,63 @@ def generate_select(request):
     )
 
 
+CITIZEN_LOOKUP_LIMIT = 20
+CITIZEN_LOOKUP_MAX_LIMIT = 50
+
+
+def _generate_citizens(user, muni):
+    citizens = Citizen.objects.all()
+    if not user.is_superuser and muni:
+        citizens = citizens.filter(municipality=muni)
+    return citizens
+
+
+@user_passes_test(lambda u: u.is_staff)
+def citizen_lookup(request):
+    """
+    Typeahead pentru alegerea cetateanului: primele N potriviri din indexul de cautare (sau alfabetic,
+    fara text), in limitele primariei utilizatorului.
+    """
+    citizens = _generate_citizens(request.user, request.municipality)
+    try:
+        limit = int(request.GET.get("limit") or CITIZEN_LOOKUP_LIMIT)
+    except ValueError:
+        limit = CITIZEN_LOOKUP_LIMIT
+    limit = min(max(limit, 1), CITIZEN_LOOKUP_MAX_LIMIT)
+    if request.GET.get("leave"):
+        # alegerea angajatului din pagina de concedii
+        citizens = citizens.filter(leave_enabled=True)
+    q = request.GET.get("q", "").strip()
+    order = ["full_name", "id"]
+    if q:
+        citizens, ranked = search_citizens(citizens, q)
+        if ranked:
+            order = ["search_rank", "full_name", "id"]
+    rows = list(citizens.order_by(*order).only("id", "full_name", "identifier", "profile_status")[: limit + 1])
+    return JsonResponse(
+        {
+            "results": [
+                {
+                    "id": c.pk,
+                    "label": f"{c.full_name} ({c.identifier})" if c.identifier else c.full_name,
+                    "pending": c.profile_status == "pending_validation",
+                }
+                for c in rows[:limit]
+            ],
+            "more": len(rows) > limit,
+        }
+    )
+
+
 @login_required
 def citizen_request_document(request):
-    citizen = getattr(request.user, "citizen_profile", None)
+    citizen = request.citizen
     if not citizen:
         return redirect("home")
     if citizen.profile_status == "pending_validation":
         messages.error(request, "Profilul tau asteapta validarea administratorului. Nu poti genera documente acum.")
         return redirect("citizen_dashboard")
-    templates = DocumentTemplate.objects.all()
-    if citizen.municipality:
-        templates = templates.filter(models.Q(municipalities=citizen.municipality) | models.Q(municipalities__isnull=True)).distinct()
+    templates = visible_templates(citizen.municipality)
     if request.method == "POST":
         template_slug = request.POST.get("template_slug")
         tmpl = get_object_or_404(templates, slug=template_slug)
@@ -1579,6 +2187,7 @@ def citizen_request_document(request):
             work_item = WorkItem.objects.create(
                 citizen=citizen,
                 template=tmpl,
+                revision_id=tmpl.current_revision_id,
                 municipality=citizen.municipality,
                 created_by=request.user,
                 output_type=tmpl.output_type,
@@ -1606,7 +2215,7 @@ def generate_document(request, citizen_id, template_slug):
 
     # restrict cetateanul sa genereze doar pentru el insusi
     if request.user.is_authenticated and not request.user.is_staff:
-        prof = getattr(request.user, "citizen_profile", None)
+        prof = request.citizen
         if not prof or prof.id != citizen.id:
             return HttpResponse(status=403)
         if citizen.profile_status == "pending_validation":
@@ -1614,7 +2223,7 @@ def generate_document(request, citizen_id, template_slug):
             return redirect("citizen_dashboard")
 
     # restrict adminul de primarie la cetatenii proprii
-    muni = _user_municipality(request.user)
+    muni = request.municipality
     if muni and citizen.municipality != muni:
         return HttpResponse(status=403)
 
@@ -1625,7 +2234,7 @@ def generate_document(request, citizen_id, template_slug):
                 request,
                 "core/template_fill.html",
                 {
-                    "dynamic_fields": dyn_fields,
+                    "dynamic_fields": [{**item, "choices": _dynamic_field_choices(item)} for item in dyn_fields],
                     "citizen": citizen,
                     "template": tmpl,
                     "municipality_id": request.GET.get("municipality_id"),
@@ -1653,31 +2262,48 @@ def generate_document(request, citizen_id, template_slug):
 
 @login_required
 def document_preview(request, doc_id):
-    doc = get_object_or_404(GeneratedDocument, id=doc_id)
+    # template: numele fisierului descarcat (slug)
+    doc = get_object_or_404(GeneratedDocument.objects.select_related("template"), id=doc_id)
     # permisiuni
     if request.user.is_staff:
-        muni = _user_municipality(request.user)
+        muni = request.municipality
         if muni and doc.citizen.municipality != muni:
             return HttpResponse(status=403)
     else:
-        citizen = getattr(request.user, "citizen_profile", None)
+        citizen = request.citizen
         if not citizen or citizen.id != doc.citizen_id:
             return HttpResponse(status=403)
     if not doc.file:
         return HttpResponse("Fisier indisponibil", status=404)
-    doc.file.open("rb")
-    data = doc.file.read()
-    doc.file.close()
-    content_type = "application/pdf" if doc.output_type == "pdf" else "application/msword"
-    ext = "pdf" if doc.output_type == "pdf" else "doc"
-    resp = HttpResponse(data, content_type=content_type)
-    resp["Content-Disposition"] = f'inline; filename="{doc.template.slug}.{ext}"'
+    # autorizarea ramane aici; octetii sunt livrati prin link semnat (nginx cand e configurat)
+    return redirect(doc.signed_file_url(disposition="inline"))
+
+
+def signed_media(request, path):
+    expires = request.GET.get("exp", "")
+    disposition = request.GET.get("d", "attachment")
+    signed_type = request.GET.get("ct", "")
+    filename = request.GET.get("fn", "")
+    if not verify_media_signature(path, expires, disposition, request.GET.get("sig", ""), signed_type, filename):
+        return HttpResponse("Link invalid sau expirat.", status=403)
+    content_type = signed_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX
+    if prefix:
+        resp = HttpResponse(content_type=content_type)
+        resp["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(path)
+    else:
+        if not default_storage.exists(path):
+            return HttpResponse("Fisier indisponibil", status=404)
+        resp = FileResponse(default_storage.open(path, "rb"), content_type=content_type)
+    resp["Content-Disposition"] = content_disposition_header(
+        disposition == "attachment", filename or os.path.basename(path)
+    )
     return resp
 
 
 @user_passes_test(lambda u: u.is_staff)
 def work_item_list(request):
-    muni = _user_municipality(request.user)
+    muni = request.municipality
     qs = WorkItem.objects.select_related("citizen", "template", "municipality")
     if muni:
         qs = qs.filter(municipality=muni)
@@ -1699,22 +2325,24 @@ def work_item_list(request):
 @user_passes_test(lambda u: u.is_staff)
 def work_item_detail(request, pk):
     work = get_object_or_404(
-        WorkItem.objects.select_related("citizen", "template", "municipality"), pk=pk
+        WorkItem.objects.select_related("citizen", "template", "revision", "municipality"), pk=pk
     )
-    muni = _user_municipality(request.user)
+    muni = request.municipality
     if muni and work.municipality and work.municipality != muni:
         return HttpResponse(status=403)
 
     tmpl = work.template
+    # randam cu revizia fixata la crearea lucrarii (fallback: template-ul curent)
+    source = work.revision or tmpl
     citizen = work.citizen
-    dyn_fields_raw = tmpl.dynamic_fields or []
+    dyn_fields_raw = source.dynamic_fields or []
     signature_data = work.signature or {}
     dyn_values = work.dynamic_values or {}
     signature_image_url = _absolute_url(work.signature_image.url, request=request) if work.signature_image else ""
     is_readonly = work.status == "completed"
 
     # marcheaza notificarile staff ca citite
-    StaffNotification.objects.filter(user=request.user, work_item=work, is_read=False).update(is_read=True)
+    unread.mark_staff_notifications_read(request.user, work_item=work)
 
     if request.method == "POST":
         action = request.POST.get("action", "save")
@@ -1728,7 +2356,7 @@ def work_item_detail(request, pk):
         if is_readonly:
             messages.error(request, "Documentul este finalizat si nu mai poate fi editat.")
             return redirect("work_item_detail", pk=work.pk)
-        dyn_values = _extract_dynamic_values(tmpl, request.POST)
+        dyn_values = _extract_dynamic_values(source, request.POST)
         signature_data = {
             "text": request.POST.get("signature_text", "").strip() or signature_data.get("text", ""),
             "top": request.POST.get("signature_top", signature_data.get("top", 70)),
@@ -1746,14 +2374,14 @@ def work_item_detail(request, pk):
             signature_data["image_url"] = signature_image_url
         safe_ctx, dyn_prepared = _build_document_context(
             citizen,
-            tmpl,
+            source,
             request=request,
             dynamic_values=dyn_values,
             override_muni_id=work.municipality_id,
             force_override=True,
         )
-        base_html = _render_document_html(tmpl, safe_ctx)
-        preview_html = _render_document_html(tmpl, safe_ctx, signature=signature_data, base_html_override=base_html)
+        base_html = _render_document_html(source, safe_ctx)
+        preview_html = _render_document_html(source, safe_ctx, signature=signature_data, base_html_override=base_html)
         work.dynamic_values = dyn_values
         work.signature = signature_data
         work.rendered_html = base_html
@@ -1778,14 +2406,14 @@ def work_item_detail(request, pk):
 
     safe_ctx, dyn_prepared = _build_document_context(
         citizen,
-        tmpl,
+        source,
         request=request,
         dynamic_values=dyn_values,
         override_muni_id=work.municipality_id,
         force_override=True,
     )
-    base_html = _render_document_html(tmpl, safe_ctx)
-    preview_html = _render_document_html(tmpl, safe_ctx, signature=signature_data, base_html_override=base_html)
+    base_html = _render_document_html(source, safe_ctx)
+    preview_html = _render_document_html(source, safe_ctx, signature=signature_data, base_html_override=base_html)
     dyn_fields_render = []
     for item in dyn_fields_raw:
         tmp = item.copy()
@@ -1813,7 +2441,7 @@ def work_item_delete(request, pk):
     work = get_object_or_404(
         WorkItem.objects.select_related("citizen", "municipality"), pk=pk
     )
-    muni = _user_municipality(request.user)
+    muni = request.municipality
     if muni and work.municipality and work.municipality != muni:
         return HttpResponse(status=403)
     if request.method == "POST":
@@ -1837,11 +2465,11 @@ def generate_preview(request):
 
     # permisiuni: staff doar pe cetatenii proprii; cetateanul doar pe contul lui
     if request.user.is_staff:
-        muni = _user_municipality(request.user)
+        muni = request.municipality
         if muni and citizen.municipality != muni:
             return JsonResponse({"error": "Cetateanul apartine altei institutii."}, status=403)
     else:
-        prof = getattr(request.user, "citizen_profile", None)
+        prof = request.citizen
         if not prof or prof.id != citizen.id:
             return JsonResponse({"error": "Nu ai acces la acest cetatean."}, status=403)
         if citizen.profile_status == "pending_validation":
@@ -1876,14 +2504,10 @@ def generate_preview(request):
 
 @user_passes_test(lambda u: u.is_staff)
 def leave_dashboard(request):
-    muni = _user_municipality(request.user)
-    citizens_qs = Citizen.objects.filter(leave_enabled=True).order_by("full_name")
+    muni = request.municipality
+    citizens_qs = Citizen.objects.filter(leave_enabled=True)
     if muni:
         citizens_qs = citizens_qs.filter(municipality=muni)
-    citizens = list(citizens_qs)
-    if not citizens:
-        messages.error(request, "Nu exista cetateni/angajati in aceasta primarie.")
-        return redirect("home")
 
     selected_id = request.GET.get("citizen") or request.POST.get("citizen_id") or ""
     selected_year = request.GET.get("year") or request.POST.get("year") or timezone.now().year
@@ -1891,14 +2515,18 @@ def leave_dashboard(request):
         selected_year = int(selected_year)
     except ValueError:
         selected_year = timezone.now().year
+    # cetateanul se alege din typeahead (citizen_lookup); fara selectie, primul alfabetic
     selected_citizen = None
-    if selected_id:
-        selected_citizen = next((c for c in citizens if str(c.id) == str(selected_id)), None)
+    if str(selected_id).isdigit():
+        selected_citizen = citizens_qs.filter(pk=selected_id).first()
+    if not selected_citizen:
+        selected_citizen = citizens_qs.order_by("full_name", "id").first()
     if not selected_citizen:
-        selected_citizen = citizens[0]
+        messages.error(request, "Nu exista cetateni/angajati in aceasta primarie.")
+        return redirect("home")
 
     # mark staff notifications as read when viewing concedii
-    StaffNotification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    unread.mark_staff_notifications_read(request.user)
 
     if request.method == "POST":
         action = request.POST.get("action")
@@ -2059,7 +2687,6 @@ def leave_dashboard(request):
         request,
         "core/leave_dashboard.html",
         {
-            "citizens": citizens,
             "selected_citizen": selected_citizen,
             "stats": stats,
             "requests": requests,
@@ -2076,7 +2703,7 @@ def leave_dashboard(request):
 
 @login_required
 def leave_citizen(request):
-    citizen = getattr(request.user, "citizen_profile", None)
+    citizen = request.citizen
     if not citizen:
         return HttpResponse(status=403)
     muni = citizen.municipality
@@ -2088,7 +2715,7 @@ def leave_citizen(request):
     holidays = _holiday_dates(muni)
     stats = _compute_leave_stats(citizen, target_year=selected_year)
     # mark citizen notifications as read on concedii page
-    Notification.objects.filter(citizen=citizen, is_read=False).update(is_read=True)
+    unread.mark_notifications_read(citizen)
     if request.method == "POST":
         action = request.POST.get("action", "create")
         if action == "create":
@@ -2229,30 +2856,39 @@ def leave_citizen(request):
 # ---- Extra helpers ------------------------------------------------------
 
 def _process_extra_fields(citizen: Citizen, formset: ExtraFieldFormSet):
-    seen_ids = []
+    """
+    Aplica extra-urile din formset: rescrie coloana `extra` si cache-ul `data` intr-un singur UPDATE.
+    Numarul de interogari nu depinde de cate campuri are cetateanul.
+    """
+    wanted = {}
     for form in formset:
         if not form.cleaned_data or form.cleaned_data.get("DELETE"):
             continue
         name = form.cleaned_data["field_name"].strip()
-        value = form.cleaned_data.get("field_value", "")
-        if not name:
-            continue
-        field_def, _ = ExtraFieldDefinition.objects.get_or_create(
-            name=name, defaults={"label": name}
-        )
-        val_obj, _ = ExtraFieldValue.objects.update_or_create(
-            citizen=citizen, field_def=field_def, defaults={"value": value}
-        )
-        seen_ids.append(val_obj.field_def_id)
+        if name:
+            wanted[name] = form.cleaned_data.get("field_value", "")
+
+    with transaction.atomic():
+        # fiecare cheie din `extra` are definitie (filtrarea dupa extra accepta doar chei definite)
+        defined = set(ExtraFieldDefinition.objects.filter(name__in=wanted).values_list("name", flat=True))
+        missing = [name for name in wanted if name not in defined]
+        if missing:
+            ExtraFieldDefinition.objects.bulk_create(
+                [ExtraFieldDefinition(name=name, label=name) for name in missing], ignore_conflicts=True
+            )
+            # bulk_create nu emite post_save
+            invalidate_field_catalog()
 
-    ExtraFieldValue.objects.filter(citizen=citizen).exclude(
-        field_def_id__in=seen_ids
-    ).delete()
-    citizen.refresh_data_cache()
+        # extra-urile si cache-ul `data` stau pe acelasi rand: un singur UPDATE
+        citizen.extra = wanted
+        citizen.data = {**citizen.build_data_payload(include_extra=False), **wanted}
+        Citizen.objects.filter(pk=citizen.pk).update(extra=citizen.extra, data=citizen.data)
 
 
 def _notify_citizen(citizen: Citizen, title: str, message: str):
-    Notification.objects.create(citizen=citizen, title=title, message=message)
+    with transaction.atomic():
+        # contorul cetateanului se actualizeaza din post_save, in aceeasi tranzactie
+        Notification.objects.create(citizen=citizen, title=title, message=message)
     if citizen.user and citizen.user.email:
         send_mail(
             title,
@@ -2270,7 +2906,7 @@ def _absolute_url(path: str, request=None):
     return path
 
 
-def _extract_dynamic_values(tmpl: DocumentTemplate, data):
+def _extract_dynamic_values(tmpl: DocumentTemplate | DocumentTemplateRevision, data):
     dyn_values = {}
     dyn_fields = getattr(tmpl, "dynamic_fields", []) or []
     for item in dyn_fields:
@@ -2281,44 +2917,103 @@ def _extract_dynamic_values(tmpl: DocumentTemplate, data):
 
 
 def _sync_dynamic_library(dynamic_fields: list[dict]):
+    # o interogare pentru cheile existente, apoi insert/update in bloc
+    wanted = {}
     for item in dynamic_fields or []:
         key = item.get("key")
-        label = item.get("label") or key
+        if not key:
+            continue
         length = item.get("length", 10)
-        if key:
-            DynamicFieldLibrary.objects.update_or_create(
-                key=key,
-                defaults={
-                    "label": label,
-                    "length": length if isinstance(length, int) else 10,
-                },
-            )
+        wanted[key] = (item.get("label") or key, length if isinstance(length, int) else 10)
+    if not wanted:
+        return
+    existing = {f.key: f for f in DynamicFieldLibrary.objects.filter(key__in=wanted)}
+    to_create, to_update = [], []
+    for key, (label, length) in wanted.items():
+        field = existing.get(key)
+        if field is None:
+            to_create.append(DynamicFieldLibrary(key=key, label=label, length=length))
+        elif (field.label, field.length) != (label, length):
+            field.label, field.length = label, length
+            to_update.append(field)
+    if to_create:
+        DynamicFieldLibrary.objects.bulk_create(to_create)
+    if to_update:
+        DynamicFieldLibrary.objects.bulk_update(to_update, ["label", "length"])
+    if to_create or to_update:
+        # bulk_create/bulk_update nu emit semnale
+        invalidate_field_catalog()
+
+
+EXPORT_CHUNK_SIZE = 200
+
+
+class _ZipStreamBuffer:
+    # fisier "write-only" fara seek: zipfile scrie cu data descriptor, iar noi golim bufferul dupa fiecare bucata
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _zip_documents_iter(qs):
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for doc in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            if not doc.file:
+                continue
+            entry_name = f"{doc.id:08d}_{os.path.basename(doc.file.name)}"
+            try:
+                src = doc.file.open("rb")
+            except OSError:
+                # fisier lipsa din storage: sarim peste el
+                continue
+            with src, archive.open(entry_name, mode="w", force_zip64=True) as dst:
+                for chunk in src.chunks():
+                    dst.write(chunk)
+                    yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
 
 
 def _notify_staff_workitem(work_item: WorkItem):
     if not work_item.municipality:
         return
-    admins = work_item.municipality.admins.select_related("user")
-    for adm in admins:
-        StaffNotification.objects.create(
-            user=adm.user,
+    notifications = [
+        StaffNotification(
+            user_id=user_id,
             work_item=work_item,
             title="Document nou in lucru",
             message=f"{work_item.citizen.full_name} - {work_item.template.name}",
         )
+        for user_id in work_item.municipality.admins.values_list("user_id", flat=True)
+    ]
+    with transaction.atomic():
+        StaffNotification.objects.bulk_create(notifications)
+        unread.staff_notifications_added(notifications)
 
 
 def _notify_staff_leave(leave_req: LeaveRequest, title: str, message: str):
     muni = leave_req.municipality
     if not muni:
         return
-    for adm in muni.admins.select_related("user"):
-        StaffNotification.objects.create(
-            user=adm.user,
-            work_item=None,
-            title=title,
-            message=message,
-        )
+    notifications = [
+        StaffNotification(user_id=user_id, work_item=None, title=title, message=message)
+        for user_id in muni.admins.values_list("user_id", flat=True)
+    ]
+    with transaction.atomic():
+        StaffNotification.objects.bulk_create(notifications)
+        unread.staff_notifications_added(notifications)
 def _holiday_dates(muni: Municipality | None):
     qs = LegalHoliday.objects.filter(municipality__isnull=True)
     if muni:
@@ -2384,7 +3079,7 @@ def _compute_leave_stats(citizen: Citizen, target_year: int | None = None):
 
 def _build_document_context(
     citizen: Citizen,
-    tmpl: DocumentTemplate,
+    tmpl: DocumentTemplate | DocumentTemplateRevision,
     request=None,
     dynamic_values=None,
     override_muni_id=None,
@@ -2448,21 +3143,47 @@ def _build_document_context(
                 "underline": underline,
                 "type": item.get("type", "text"),
                 "options": item.get("options", ""),
+                "choices": _dynamic_field_choices(item),
             }
         )
 
     return safe_context, prepared_dyn_fields
 
 
-def _render_document_html(tmpl: DocumentTemplate, safe_context: dict, signature: dict | None = None, base_html_override: str | None = None):
+def _dynamic_field_choices(item: dict):
+    # optiunile unui camp "select" sunt salvate ca text separat prin virgula
+    return [o.strip() for o in (item.get("options") or "").split(",") if o.strip()]
+
+
+_COMPILED_TEMPLATES: dict[str, Template] = {}
+COMPILED_TEMPLATES_MAX = 256
+
+
+def _compiled_template(tmpl: DocumentTemplate | DocumentTemplateRevision):
+    # cheia este hash-ul continutului, deci un template compilat nu se invalideaza niciodata: reviziile
+    # au content_hash, iar pentru template citim corpul sursa (fara interogare pe current_revision);
+    # normalizarea este determinista, deci acelasi corp sursa da acelasi corp randat ca revizia curenta
+    if isinstance(tmpl, DocumentTemplateRevision):
+        key, body = f"rev:{tmpl.content_hash}", None
+    else:
+        source = tmpl.body_html or ""
+        key, body = f"src:{hashlib.sha256(source.encode('utf-8')).hexdigest()}", source
+    template = _COMPILED_TEMPLATES.get(key)
+    if template is None:
+        html = tmpl.body_html if body is None else normalize_template_body(body)
+        if len(_COMPILED_TEMPLATES) >= COMPILED_TEMPLATES_MAX:
+            _COMPILED_TEMPLATES.clear()
+        template = _COMPILED_TEMPLATES[key] = Template(html)
+    return template
+
+
+def _render_document_html(tmpl: DocumentTemplate | DocumentTemplateRevision, safe_context: dict, signature: dict | None = None, base_html_override: str | None = None):
     if base_html_override is not None:
         # cand primim override inseamna ca body-ul este deja cu antet/continut complet, nu mai adaugam header-ul din nou
         html_content = base_html_override
         add_header = False
     else:
-        # inlocuieste eventualele placeholdere scapati cu backslash
-        body = tmpl.body_html.replace("\\{\\{", "{{").replace("\\}\\}", "}}")
-        template = Template(body)
+        template = _compiled_template(tmpl)
         html_content = template.render(Context(safe_context))
         add_header = True
 